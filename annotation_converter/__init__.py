@@ -0,0 +1,12 @@
+"""
+Library of the annotation converters: the pairwise scripts and convert.py
+at the top of the repository are command lines over these modules.
+
+    from annotation_converter import convert
+    convert.convert('yolo', ['coco'], imagefolder_path='images', label_path='obj.names')
+
+    python -m annotation_converter --from yolo --to coco -p images -l obj.names
+
+The submodules are not imported here, so importing one of them only loads
+what it needs.
+"""
@@ -0,0 +1,4 @@
+from .convert import main
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,104 @@
+"""
+Tar and zip archives as conversion inputs and outputs, for datasets stored
+as shards (WebDataset style) instead of loose files. Members are streamed
+in archive order, the files of one sample share the member name without
+extension (its key), e.g. 000123.jpg, 000123.txt and 000123.xml.
+"""
+import io
+import os
+import time
+import tarfile
+import zipfile
+from .instrument import stage, count
+
+TAR_EXTS = ('.tar', '.tar.gz', '.tgz', '.tar.bz2', '.tar.xz')
+ZIP_EXTS = ('.zip',)
+ARCHIVE_EXTS = TAR_EXTS + ZIP_EXTS
+
+def is_archive(path):
+    return path is not None and path.lower().endswith(ARCHIVE_EXTS)
+
+def archive_stem(path):
+    """
+        Archive path without its extension (shard.tar.gz -> shard).
+    """
+    for ext in sorted(ARCHIVE_EXTS, key=len, reverse=True):
+        if path.lower().endswith(ext):
+            return path[:-len(ext)]
+    return path
+
+def member_key(name):
+    return os.path.splitext(name)[0]
+
+def iter_members(archive_path, exts=None):
+    """
+        Yield (member name, content) for the regular files of a tar or zip
+        archive in archive order, only the names ending with exts when given.
+        Tar archives (compressed or not) are read as a stream.
+    """
+    if archive_path.lower().endswith(ZIP_EXTS):
+        with zipfile.ZipFile(archive_path) as archive:
+            for info in archive.infolist():
+                if info.is_dir() or (exts and not info.filename.lower().endswith(exts)):
+                    continue
+                with stage('read'):
+                    data = archive.read(info)
+                count('bytes_read', len(data))
+                yield info.filename, data
+        return
+
+    with tarfile.open(archive_path, 'r|*') as archive:
+        for info in archive:
+            if not info.isfile() or (exts and not info.name.lower().endswith(exts)):
+                continue
+            with stage('read'):
+                data = archive.extractfile(info).read()
+            count('bytes_read', len(data))
+            yield info.name, data
+
+class ArchiveWriter:
+    """
+        Write members to a new tar or zip archive (the format follows the
+        extension). The archive is written to a temporary file and renamed
+        on close, so an interrupted run never leaves a truncated archive.
+    """
+
+    def __init__(self, archive_path):
+        self.archive_path = archive_path
+        self.tmp_path = archive_path + '.tmp'
+        self.mtime = time.time()
+        if archive_path.lower().endswith(ZIP_EXTS):
+            self.archive = zipfile.ZipFile(self.tmp_path, 'w', zipfile.ZIP_DEFLATED)
+        else:
+            compression = {'.tar': '', '.gz': 'gz', '.tgz': 'gz', '.bz2': 'bz2', '.xz': 'xz'}[os.path.splitext(archive_path.lower())[1]]
+            self.archive = tarfile.open(self.tmp_path, 'w:' + compression)
+
+    def write(self, name, data):
+        """
+            Add a member, str data being encoded as utf-8.
+        """
+        if isinstance(data, str):
+            data = data.encode('utf-8')
+        with stage('write'):
+            if isinstance(self.archive, zipfile.ZipFile):
+                self.archive.writestr(name, data)
+            else:
+                info = tarfile.TarInfo(name)
+                info.size = len(data)
+                info.mtime = self.mtime
+                self.archive.addfile(info, io.BytesIO(data))
+        count('bytes_written', len(data))
+
+    def close(self):
+        self.archive.close()
+        os.replace(self.tmp_path, self.archive_path)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        if exc_type is None:
+            self.close()
+        else:
+            self.archive.close()
+            os.remove(self.tmp_path)
@@ -0,0 +1,131 @@
+"""
+Batched box transforms. Boxes are N x 4 arrays in one of:
+    xyxy  absolute xmin, ymin, xmax, ymax (PascalVOC)
+    coco  absolute xmin, ymin, width, height (COCO)
+    yolo  x_center, y_center, width, height normalised by the image size (YOLO)
+The rounding of each conversion path is the same as the scalar code it
+replaces, so the outputs are unchanged.
+"""
+import numpy as np
+
+def as_boxes(boxes):
+    """
+        Return boxes as an N x 4 array. Integer boxes keep their dtype so
+        they are written back as integers.
+    """
+    boxes = np.asarray(boxes)
+    if boxes.dtype.kind not in 'iuf':
+        boxes = boxes.astype(np.float64)
+    return boxes.reshape(-1, 4)
+
+def round_half_even(values, decimals=2):
+    """
+        Same result as Python round(value, decimals) for every element.
+        np.round scales by 10**decimals first, which can move a value onto
+        a tie, so elements close to a tie are rounded by Python instead.
+    """
+    values = np.asarray(values, dtype=np.float64)
+    rounded = np.round(values, decimals)
+    scaled = values * 10 ** decimals
+    distance = np.abs(np.abs(scaled - np.trunc(scaled)) - 0.5)
+    for index in np.flatnonzero(distance <= 1e-9 * np.maximum(1.0, np.abs(scaled))):
+        rounded.flat[index] = round(float(values.flat[index]), decimals)
+    return rounded
+
+def truncate(values, decimals=0):
+    multiplier = 10 ** decimals
+    return np.trunc(np.asarray(values, dtype=np.float64) * multiplier) / multiplier
+
+def xyxy_to_yolo(boxes, width, height):
+    boxes = as_boxes(boxes).astype(np.float64)
+    yolo = np.empty_like(boxes)
+    yolo[:, 0] = (boxes[:, 0] + boxes[:, 2]) / 2 / width
+    yolo[:, 1] = (boxes[:, 1] + boxes[:, 3]) / 2 / height
+    yolo[:, 2] = (boxes[:, 2] - boxes[:, 0]) / width
+    yolo[:, 3] = (boxes[:, 3] - boxes[:, 1]) / height
+    return yolo
+
+def yolo_to_xyxy(boxes, width, height, decimals=2):
+    """
+        Boxes are clipped to the image before scaling. decimals=None skips
+        the rounding.
+    """
+    boxes = as_boxes(boxes).astype(np.float64)
+    xyxy = np.empty_like(boxes)
+    xyxy[:, 0] = np.maximum(boxes[:, 0] - boxes[:, 2] / 2, 0) * width
+    xyxy[:, 1] = np.maximum(boxes[:, 1] - boxes[:, 3] / 2, 0) * height
+    xyxy[:, 2] = np.minimum(boxes[:, 0] + boxes[:, 2] / 2, 1) * width
+    xyxy[:, 3] = np.minimum(boxes[:, 1] + boxes[:, 3] / 2, 1) * height
+    if decimals is None:
+        return xyxy
+    return round_half_even(xyxy, decimals)
+
+def yolo_clipped(boxes):
+    """
+        Return an N x 4 bool mask of the yolo_to_xyxy coordinates that were
+        clipped to the image border.
+    """
+    boxes = as_boxes(boxes).astype(np.float64)
+    clipped = np.empty(boxes.shape, dtype=bool)
+    clipped[:, 0] = boxes[:, 0] - boxes[:, 2] / 2 < 0
+    clipped[:, 1] = boxes[:, 1] - boxes[:, 3] / 2 < 0
+    clipped[:, 2] = boxes[:, 0] + boxes[:, 2] / 2 > 1
+    clipped[:, 3] = boxes[:, 1] + boxes[:, 3] / 2 > 1
+    return clipped
+
+def yolo_to_coco(boxes, width, height, decimals=2):
+    boxes = as_boxes(boxes).astype(np.float64)
+    box_width = float(width) * boxes[:, 2]
+    box_height = float(height) * boxes[:, 3]
+    coco = np.empty_like(boxes)
+    coco[:, 0] = float(width) * boxes[:, 0] - box_width / 2
+    coco[:, 1] = float(height) * boxes[:, 1] - box_height / 2
+    coco[:, 2] = box_width
+    coco[:, 3] = box_height
+    return round_half_even(coco, decimals)
+
+def coco_to_yolo(boxes, width, height, decimals=7):
+    """
+        Values are truncated (not rounded) to decimals.
+    """
+    return coco_xyxy_to_yolo(coco_to_xyxy(as_boxes(boxes).astype(np.float64)), width, height, decimals)
+
+def coco_xyxy_to_yolo(boxes, width, height, decimals=7):
+    """
+        coco_to_yolo of boxes already converted by coco_to_xyxy, with the
+        same arithmetic (xyxy_to_yolo divides instead of multiplying).
+    """
+    boxes = as_boxes(boxes).astype(np.float64)
+    dw = 1. / width
+    dh = 1. / height
+    yolo = np.empty_like(boxes)
+    yolo[:, 0] = (boxes[:, 0] + boxes[:, 2]) / 2 * dw
+    yolo[:, 1] = (boxes[:, 1] + boxes[:, 3]) / 2 * dh
+    yolo[:, 2] = (boxes[:, 2] - boxes[:, 0]) * dw
+    yolo[:, 3] = (boxes[:, 3] - boxes[:, 1]) * dh
+    return truncate(yolo, decimals)
+
+def xyxy_to_coco(boxes, decimals=2):
+    """
+        Only width and height are rounded, the corner is kept as is.
+    """
+    boxes = as_boxes(boxes).astype(np.float64)
+    coco = boxes.copy()
+    coco[:, 2:] = round_half_even(boxes[:, 2:] - boxes[:, :2], decimals)
+    return coco
+
+def coco_to_xyxy(boxes):
+    boxes = as_boxes(boxes)
+    xyxy = boxes.copy()
+    xyxy[:, 2:] = boxes[:, 2:] + boxes[:, :2]
+    return xyxy
+
+def coco_integral(boxes):
+    """
+        Return an N x 4 bool mask of the coco_to_xyxy coordinates that are
+        integers in the json (xmax is when both x and width are), as a
+        per value conversion writes them.
+    """
+    integral = np.array([[isinstance(value, int) for value in box] for box in boxes], dtype=bool).reshape(-1, 4)
+    integral[:, 2:] &= integral[:, :2]
+    return integral
@@ -0,0 +1,438 @@
+import os
+import re
+import json
+import shutil
+import tempfile
+import numpy as np
+from .manifest import Manifest
+from .instrument import stage, count
+
+def create_image_annotation(file_name, width, height, image_id):
+    file_name = file_name.split('/')[-1]
+    images = {
+        'file_name': file_name,
+        'height': height,
+        'width': width,
+        'id': image_id
+    }
+    return images
+
+def create_annotation_yolo_format(min_x, min_y, width, height, image_id, category_id, annotation_id):
+    bbox = (min_x, min_y, width, height)
+    area = round(width * height,2)
+
+    annotation = {
+        'id': annotation_id,
+        'image_id': image_id,
+        'bbox': bbox,
+        'area': area,
+        'iscrowd': 0,
+        'category_id': category_id,
+        'segmentation': []
+    }
+
+    return annotation
+
+def create_annotations(boxes, image_id, first_id):
+    """
+        Annotations of a records.CocoBoxes, numbered from first_id.
+    """
+    return [create_annotation_yolo_format(min_x, min_y, width, height, image_id, category_id, first_id + index)
+            for index, (category_id, min_x, min_y, width, height) in enumerate(boxes)]
+
+# json.dumps(create_annotation_yolo_format(...)) with finite floats
+ANNOTATION_FORMAT = '{"id": %d, "image_id": %d, "bbox": [%r, %r, %r, %r], "area": %r, "iscrowd": 0, "category_id": %d, "segmentation": []}'
+
+def create_categories(classes):
+    categories = []
+    for index, label in enumerate(classes):
+        ann = {
+            "supercategory": "detection_objects",
+            "id": index + 1,  # Index starts with '1' .
+            "name": label
+        }
+        categories.append(ann)
+    return categories
+
+def create_labelsfile(cats, filename="obj.names"):
+    classes = [cat['name'] for cat in cats]
+    with open(filename, 'w') as f:
+        for cat in classes:
+            f.write("%s\n" % cat)
+    return classes
+
+class CocoJsonWriter:
+    """
+        Write a COCO json file one image/annotation at a time.
+
+        Images are written to the output file as they are added while
+        annotations are spooled to a temporary file next to it and copied
+        behind the categories on close, so memory use does not depend on
+        the size of the dataset. The output is the same as
+        json.dump({"images": ..., "categories": ..., "annotations": ...}).
+        It is written to a temporary file and renamed on close, so a failed
+        run leaves the previous output in place.
+    """
+
+    def __init__(self, output_path, categories):
+        self.output_path = output_path
+        self.tmp_path = output_path + '.tmp'
+        self.categories = categories
+        self.num_images = 0
+        self.num_annotations = 0
+        self.out_file = open(self.tmp_path, 'w')
+        self.out_file.write('{"images": [')
+        self.annotations_file = tempfile.TemporaryFile(
+            'w+', dir=os.path.dirname(os.path.abspath(output_path)))
+
+    def addImage(self, image):
+        with stage('write'):
+            if self.num_images:
+                self.out_file.write(', ')
+            self.out_file.write(json.dumps(image))
+        self.num_images += 1
+
+    def addAnnotation(self, annotation):
+        with stage('write'):
+            if self.num_annotations:
+                self.annotations_file.write(', ')
+            self.annotations_file.write(json.dumps(annotation))
+        self.num_annotations += 1
+
+    def addBoxes(self, image_id, first_id, boxes):
+        """
+            Add the annotations of a records.CocoBoxes, numbered from
+            first_id, formatted with one string operation.
+        """
+        if not len(boxes):
+            return
+        if not np.isfinite(boxes.boxes).all():
+            # NaN and Infinity are only spelled the json way by json.dumps
+            for annotation in create_annotations(boxes, image_id, first_id):
+                self.addAnnotation(annotation)
+            return
+        values = []
+        for index, (category_id, min_x, min_y, width, height) in enumerate(boxes):
+            values += (first_id + index, image_id, min_x, min_y, width, height, round(width * height, 2), category_id)
+        with stage('write'):
+            if self.num_annotations:
+                self.annotations_file.write(', ')
+            self.annotations_file.write(', '.join([ANNOTATION_FORMAT] * len(boxes)) % tuple(values))
+        self.num_annotations += len(boxes)
+
+    def close(self):
+        with stage('write'):
+            self.out_file.write('], "categories": ')
+            self.out_file.write(json.dumps(self.categories))
+            self.out_file.write(', "annotations": [')
+            self.annotations_file.seek(0)
+            shutil.copyfileobj(self.annotations_file, self.out_file)
+            self.out_file.write(']}')
+            self.annotations_file.close()
+            self.out_file.close()
+        os.replace(self.tmp_path, self.output_path)
+        count('bytes_written', os.path.getsize(self.output_path))
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        if exc_type is None:
+            self.close()
+        else:
+            self.annotations_file.close()
+            self.out_file.close()
+            os.remove(self.tmp_path)
+
+WHITESPACE = re.compile(r'[ \t\n\r]*')
+# Characters that can follow a complete json number
+NUMBER_END = ' \t\n\r,]}'
+CHUNK_SIZE = 1 << 20
+# Approximate amount of json kept in memory at once by CocoStreamReader
+BUCKET_BYTES = 64 << 20
+
+class JsonStream:
+    """
+        Incremental json tokenizer over a text file object. Values are
+        decoded one at a time with json.JSONDecoder.raw_decode so a large
+        document can be walked without loading it whole.
+    """
+
+    def __init__(self, f, chunk_size=CHUNK_SIZE):
+        self.f = f
+        self.chunk_size = chunk_size
+        self.decoder = json.JSONDecoder()
+        self.buf = ''
+        self.pos = 0
+        self.eof = False
+        self.text = None
+
+    def read(self, size):
+        # Drop what has already been consumed before growing the buffer
+        if self.pos > self.chunk_size:
+            self.buf = self.buf[self.pos:]
+            self.pos = 0
+        data = self.f.read(size)
+        if not data:
+            self.eof = True
+        self.buf += data
+
+    def peek(self):
+        """
+            Return the next non-whitespace character ('' at the end of file).
+        """
+        while True:
+            self.pos = WHITESPACE.match(self.buf, self.pos).end()
+            if self.pos < len(self.buf):
+                return self.buf[self.pos]
+            if self.eof:
+                return ''
+            self.read(self.chunk_size)
+
+    def expect(self, char):
+        found = self.peek()
+        if found != char:
+            raise ValueError("Expecting '%s' but found '%s' in json stream" % (char, found))
+        self.pos += 1
+
+    def value(self):
+        """
+            Decode the next json value. Its source text is kept in self.text.
+        """
+        self.peek()
+        size = self.chunk_size
+        while True:
+            try:
+                value, end = self.decoder.raw_decode(self.buf, self.pos)
+                # A number cut by the end of the buffer ("1." of "1.5e10") may
+                # decode early, it is complete when a delimiter follows
+                number = isinstance(value, (int, float)) and not isinstance(value, bool)
+                if self.eof or (end < len(self.buf) and (not number or self.buf[end] in NUMBER_END)):
+                    self.text = self.buf[self.pos:end]
+                    self.pos = end
+                    return value
+            except json.JSONDecodeError:
+                if self.eof:
+                    raise
+            self.read(size)
+            size *= 2
+
+    def items(self, streamed_keys=()):
+        """
+            Yield (key, value) for the members of the top level object. The
+            arrays named in streamed_keys are yielded one element at a time.
+        """
+        self.expect('{')
+        if self.peek() == '}':
+            return
+        while True:
+            key = self.value()
+            self.expect(':')
+            if key in streamed_keys and self.peek() == '[':
+                self.expect('[')
+                if self.peek() != ']':
+                    while True:
+                        yield key, self.value()
+                        if self.peek() != ',':
+                            break
+                        self.pos += 1
+                self.expect(']')
+            else:
+                yield key, self.value()
+            if self.peek() != ',':
+                break
+            self.pos += 1
+        self.expect('}')
+
+class CocoStreamReader:
+    """
+        Read a COCO json file incrementally and group annotations per image.
+
+        The file is walked once with JsonStream. Small files are grouped in
+        memory; larger ones have their images spooled in file order and
+        their annotations into temporary bucket files, one per run of
+        consecutive images, so that only one bucket (about bucket_bytes of
+        json) is decoded at a time. Images are yielded in file order either
+        way. categories is available once the reader is constructed.
+    """
+
+    def __init__(self, cocojson_path, bucket_bytes=BUCKET_BYTES):
+        self.cocojson_path = cocojson_path
+        self.categories = []
+        self.num_buckets = 1 + os.path.getsize(cocojson_path) // bucket_bytes
+        self.tempdir = None
+        self.num_images = 0
+        self.images = []
+        self.imgToAnns = {}
+        if self.num_buckets == 1:
+            self.readInMemory()
+        else:
+            try:
+                self.readToBuckets()
+            except BaseException:
+                self.close()
+                raise
+
+    def iterItems(self):
+        with open(self.cocojson_path, 'r', encoding='utf-8') as f:
+            for key, value in JsonStream(f).items(('images', 'annotations')):
+                yield key, value
+
+    def readInMemory(self):
+        for key, value in self.iterItems():
+            if key == 'images':
+                self.images.append(value)
+            elif key == 'annotations':
+                self.imgToAnns.setdefault(value['image_id'], []).append(value)
+            elif key == 'categories':
+                self.categories = value
+
+    def spoolPath(self, name):
+        return os.path.join(self.tempdir, name + '.jsonl')
+
+    def bucket(self, index):
+        """
+            Bucket of the index-th image of the file.
+        """
+        return index * self.num_buckets // self.num_images
+
+    def readToBuckets(self):
+        self.tempdir = tempfile.mkdtemp(prefix='coco_')
+        # repr(image id) -> index of the image in the file
+        image_index = {}
+        # Annotations may come before their image, they are spooled with
+        # their image id and sorted into buckets once every image is known
+        with open(self.spoolPath('images'), 'w', encoding='utf-8', newline='\n') as images_file, \
+             open(self.spoolPath('annotations'), 'w', encoding='utf-8', newline='\n') as annotations_file:
+            with open(self.cocojson_path, 'r', encoding='utf-8') as f:
+                stream = JsonStream(f)
+                for key, value in stream.items(('images', 'annotations')):
+                    # Newlines in the source text can only be whitespace
+                    if key == 'images':
+                        image_index.setdefault(repr(value['id']), self.num_images)
+                        images_file.write(stream.text.replace('\n', ' ') + '\n')
+                        self.num_images += 1
+                    elif key == 'annotations':
+                        annotations_file.write(repr(value['image_id']) + '\t' + stream.text.replace('\n', ' ') + '\n')
+                    elif key == 'categories':
+                        self.categories = value
+        files = []
+        try:
+            for bucket in range(self.num_buckets):
+                files.append(open(self.spoolPath('annotations_%d' % bucket), 'w', encoding='utf-8', newline='\n'))
+            with open(self.spoolPath('annotations'), 'r', encoding='utf-8', newline='\n') as f:
+                for line in f:
+                    image_id, text = line.split('\t', 1)
+                    index = image_index.get(image_id)
+                    # Annotations of a missing image are not yielded
+                    if index is not None:
+                        files[self.bucket(index)].write(text)
+        finally:
+            for bucket_file in files:
+                bucket_file.close()
+        os.remove(self.spoolPath('annotations'))
+
+    def readBucket(self, bucket):
+        imgToAnns = {}
+        with open(self.spoolPath('annotations_%d' % bucket), 'r', encoding='utf-8', newline='\n') as f:
+            for line in f:
+                ann = json.loads(line)
+                imgToAnns.setdefault(ann['image_id'], []).append(ann)
+        return imgToAnns
+
+    def iterImages(self):
+        """
+            Yield (image, annotations) for every image of the file.
+        """
+        if self.tempdir is None:
+            for img in self.images:
+                yield img, self.imgToAnns.get(img['id'], [])
+            return
+        bucket, imgToAnns = None, None
+        with open(self.spoolPath('images'), 'r', encoding='utf-8', newline='\n') as f:
+            for index, line in enumerate(f):
+                if self.bucket(index) != bucket:
+                    bucket = self.bucket(index)
+                    imgToAnns = self.readBucket(bucket)
+                img = json.loads(line)
+                yield img, imgToAnns.get(img['id'], [])
+
+    def close(self):
+        if self.tempdir is not None:
+            shutil.rmtree(self.tempdir, ignore_errors=True)
+            self.tempdir = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
+
+def update_cocojson(output_path, categories, sources, dependencies, read_sources, manifest_path):
+    """
+        Update the COCO json output_path from sources instead of rebuilding
+        it. The Manifest at manifest_path records the image of every source
+        (dependencies(source) gives its Manifest.isCurrent arguments) and
+        only the sources changed since the last update are read, with
+        read_sources(changed) yielding (filename, width, height, boxes) in
+        order, boxes being a records.CocoBoxes.
+
+        Unchanged images keep their entries and ids, a changed image keeps
+        the id of the image with the same file name and new images and
+        annotations are numbered after the largest ids in the file. Images
+        of removed sources are dropped. Return (sources read, images removed).
+    """
+    manifest = Manifest(manifest_path)
+    reader = CocoStreamReader(output_path) if os.path.exists(output_path) else None
+    deps = {source: dependencies(source) for source in sources}
+    if reader is None or reader.categories != categories:
+        current = set()
+    else:
+        current = {source for source in sources if manifest.isCurrent(**deps[source])}
+
+    try:
+        # First pass: find the kept images, the ids to reuse and the largest ids
+        keep_ids = {manifest.entries[source]['image_id'] for source in current}
+        found = set()
+        image_ids = {}
+        max_image_id, max_annotation_id = -1, 0
+        if reader is not None:
+            for img, anns in reader.iterImages():
+                max_image_id = max(max_image_id, img['id'])
+                for ann in anns:
+                    max_annotation_id = max(max_annotation_id, ann['id'])
+                if img['id'] in keep_ids:
+                    found.add(img['id'])
+                else:
+                    image_ids.setdefault(img['file_name'], img['id'])
+
+        # Sources whose image is missing from the json are read again
+        changed = [source for source in sources if source not in current or manifest.entries[source]['image_id'] not in found]
+
+        # The reader is done with output_path, the writer only replaces it on close
+        with CocoJsonWriter(output_path, categories) as writer:
+            if reader is not None:
+                for img, anns in reader.iterImages():
+                    if img['id'] in found:
+                        writer.addImage(img)
+                        for ann in anns:
+                            writer.addAnnotation(ann)
+
+            for source, (filename, width, height, boxes) in zip(changed, read_sources(changed)):
+                image = create_image_annotation(filename, width, height, None)
+                image_id = image_ids.pop(image['file_name'], None)
+                if image_id is None:
+                    max_image_id += 1
+                    image_id = max_image_id
+                image['id'] = image_id
+                writer.addImage(image)
+                writer.addBoxes(image_id, max_annotation_id + 1, boxes)
+                max_annotation_id += len(boxes)
+                manifest.update(image_id=image_id, **deps[source])
+    finally:
+        if reader is not None:
+            reader.close()
+
+    manifest.removeStale()
+    manifest.save()
+    return len(changed), len(image_ids)
@@ -0,0 +1,109 @@
+"""
+Any to any conversion, as a command line and as a library:
+
+    python -m annotation_converter --from yolo --to coco pascal -p images -l obj.names
+
+    from annotation_converter import convert
+    convert.convert('yolo', ['coco'], imagefolder_path='images', label_path='obj.names')
+    convert.main(['--from', 'yolo', '--to', 'coco', '-p', 'images', '-l', 'obj.names'])
+
+cv2, lxml and pycocotools are only imported by the code paths that need
+them, so importing the converters (or running -h) stays fast.
+"""
+import argparse
+import time
+from .labelmap import LabelMap
+from .imagesize import set_image_cache
+from . import dataset
+from .archive import is_archive
+from . import packed
+from . import instrument
+
+FORMATS = ('coco', 'pascal', 'yolo', 'packed')
+
+def load_dataset(input_format, imagefolder_path=None, cocojson_path=None, vocfolder_path=None, label_path=None, workers=1, cache_path=None):
+    if input_format == 'coco':
+        return dataset.load_coco(cocojson_path)
+    if input_format == 'packed':
+        return packed.load_packed(cache_path)
+    labelmap = LabelMap.load(label_path)
+    if input_format == 'pascal':
+        if is_archive(vocfolder_path):
+            return dataset.load_pascal_archive(vocfolder_path, labelmap, imagefolder_path)
+        return dataset.load_pascal(vocfolder_path, labelmap, imagefolder_path, workers)
+    if is_archive(imagefolder_path):
+        return dataset.load_yolo_archive(imagefolder_path, labelmap)
+    return dataset.load_yolo(imagefolder_path, labelmap, workers)
+
+def save_dataset(data, output_format, imagefolder_path=None, output_name="output", voc_output="pascal", cache_path=None, yolo_output=None):
+    if output_format == 'packed':
+        packed.save_packed(data, cache_path)
+        return cache_path
+    if output_format == 'coco':
+        dataset.save_coco(data, output_name + '.json')
+        return output_name + '.json'
+    if output_format == 'pascal':
+        dataset.save_pascal(data, imagefolder_path, voc_output)
+        return voc_output
+    yolo_output = yolo_output or imagefolder_path
+    dataset.save_yolo(data, yolo_output)
+    return yolo_output
+
+def convert(input_format, output_formats, imagefolder_path=None, cocojson_path=None, vocfolder_path=None,
+            label_path=None, output_name="output", voc_output="pascal", workers=1, cache_path=None, yolo_output=None):
+    """
+        Load the input annotations once and write every output format from
+        the in-memory Dataset. Return the written output paths. The packed
+        format reads/writes the binary cache at cache_path. The image folder,
+        the PascalVOC folder and the PascalVOC/YOLO outputs may be tar or
+        zip archives.
+    """
+    data = load_dataset(input_format, imagefolder_path, cocojson_path, vocfolder_path, label_path, workers, cache_path)
+    if input_format in ('coco', 'packed'):
+        LabelMap(data.classes).save(label_path or "obj.names")
+    return [save_dataset(data, output_format, imagefolder_path, output_name, voc_output, cache_path, yolo_output) for output_format in output_formats]
+
+def get_args(argv=None):
+    parser = argparse.ArgumentParser('Any to any (COCO, PascalVOC, YOLO) annotation converter helper')
+    parser.add_argument('--from', dest='input_format', choices=FORMATS, required=True, help='Format of the input annotations')
+    parser.add_argument('--to', dest='output_formats', choices=FORMATS, nargs='+', required=True, help='Format(s) to convert to, all written from one load')
+    parser.add_argument('-p', '--path', type=str, help='(Absolute) path for folder (or .tar/.zip archive) containing image files (and yolo annotated txt files)')
+    parser.add_argument('-j', '--json', type=str, help='(Absolute) path to COCO annotated json file')
+    parser.add_argument('-v', '--voc', type=str, help='(Absolute) path for folder (or .tar/.zip archive) containing the PascalVOC VML files')
+    parser.add_argument('-l', '--labels', type=str, help='(Absolute) path to file containing objection detection category names')
+    parser.add_argument('-o', '--output', default="output", type=str, help='Name of the output json file')
+    parser.add_argument('--voc-output', default="pascal", type=str, help='Name of the directory (or .tar/.zip archive) to store PascalVOC VML files')
+    parser.add_argument('--yolo-output', type=str, help='Directory (or .tar/.zip archive) to store the yolo txt files, the image folder by default')
+    parser.add_argument('-c', '--cache', type=str, help='(Absolute) path to the packed annotation cache file (.pack)')
+    parser.add_argument('--image-cache', type=str, help='Path to an image size cache file (created if missing), images are only read when not cached or changed')
+    parser.add_argument('-w', '--workers', default=1, type=int, help='Number of worker processes used for the conversion')
+    instrument.add_arguments(parser)
+
+    args = parser.parse_args(argv)
+    required = {'coco': ['json'], 'pascal': ['voc', 'labels'], 'yolo': ['path', 'labels'], 'packed': ['cache']}[args.input_format]
+    required += ['cache'] if 'packed' in args.output_formats else []
+    required += ['path'] if set(args.output_formats) & {'pascal', 'yolo'} else []
+    for name in required:
+        if getattr(args, name) is None:
+            parser.error("--%s is required to convert from %s to %s" % (name, args.input_format, ' '.join(args.output_formats)))
+    if 'yolo' in args.output_formats and args.yolo_output is None and is_archive(args.path):
+        parser.error("--yolo-output is required when the images are in an archive")
+    return args
+
+def main(argv=None):
+    """
+        Run the command line (sys.argv or the argv list) in this process,
+        return the written output paths.
+    """
+    start = time.time()
+    opt = get_args(argv)
+    if opt.image_cache:
+        set_image_cache(opt.image_cache)
+    with instrument.Run(opt):
+        outputs = convert(opt.input_format, opt.output_formats, opt.path, opt.json, opt.voc, opt.labels, opt.output, opt.voc_output, opt.workers, opt.cache, opt.yolo_output)
+    print(opt.input_format + " annotation converted to " + ", ".join(opt.output_formats) + " annotations in: " + ", ".join(outputs))
+    print("Conversion processed in " + str(float(time.time()-start)) + " seconds")
+    return outputs
+
+if __name__ == '__main__':
+    main()
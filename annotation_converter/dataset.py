@@ -0,0 +1,310 @@
+import os
+from array import array
+from functools import partial
+import numpy as np
+from .imagesize import get_image_size, read_image_size_bytes
+from .parallel import parallel_imap
+from .pipeline import write_file
+from .scan import IMAGE_EXTS, scan, warn_orphans
+from .archive import is_archive, archive_stem, member_key, iter_members, ArchiveWriter
+from .instrument import stage
+from .pascalvoc import PascalVocReader, PascalVocWriter
+from .cocoio import CocoStreamReader, CocoJsonWriter, create_image_annotation, create_categories
+from .bbox import coco_to_xyxy, coco_integral, coco_to_yolo, xyxy_to_coco, xyxy_to_yolo, yolo_to_coco, yolo_to_xyxy, yolo_clipped, round_half_even
+from .yololabels import parse_labels, iter_label_files, format_labels
+from .records import CocoBoxes
+
+# COCO json does not store the number of channels
+DEFAULT_DEPTH = 3
+
+class Dataset:
+    """
+        Detection dataset held in typed arrays, the common in-memory format
+        every reader loads into and every writer emits from.
+
+            classes      category names, categories index into it
+            file_names   image file name (relative to the image folder)
+            sizes        height, width, depth per image
+            ann_offsets  annotations of image i are ann_offsets[i]:ann_offsets[i + 1]
+            categories   class index per annotation
+            boxes        4 values per annotation, as read in the box layout
+                         of source: the normalised YOLO box, the COCO bbox
+                         (x, y, width, height) or else xmin, ymin, xmax, ymax
+                         in pixels
+            difficult    PascalVOC difficult flag per annotation
+            integral     per xmin, ymin, xmax, ymax, set when coco2pascal
+                         writes it as an integer (integer COCO values)
+
+        source is the format the dataset was loaded from ('coco', 'pascal',
+        'yolo'). The writers convert the boxes with the same bbox functions
+        as the pairwise script converting from it, so they write the same
+        files.
+    """
+
+    def __init__(self, classes=(), source=None):
+        self.classes = list(classes)
+        self.source = source
+        self.file_names = []
+        self.sizes = array('q')
+        self.ann_offsets = array('q', [0])
+        self.categories = array('q')
+        self.boxes = array('d')
+        self.difficult = array('b')
+        self.integral = array('b')
+
+    def __len__(self):
+        return len(self.file_names)
+
+    def numAnnotations(self):
+        return len(self.categories)
+
+    def addImage(self, file_name, imgSize, categories=(), boxes=(), difficult=None, integral=None):
+        """
+            Append an image of imgSize (height, width[, depth]) with its
+            annotations, boxes being N x 4 in the layout of source and
+            integral N x 4 flags (none by default).
+        """
+        boxes = np.asarray(boxes, dtype=np.float64).reshape(-1, 4)
+        categories = np.asarray(categories, dtype=np.int64).reshape(-1)
+        if difficult is None:
+            difficult = np.zeros(len(boxes), dtype=np.int8)
+        difficult = np.asarray(difficult, dtype=np.int8).reshape(-1)
+        if integral is None:
+            integral = np.zeros(boxes.shape, dtype=np.int8)
+        integral = np.asarray(integral, dtype=np.int8).reshape(-1, 4)
+        if not len(boxes) == len(categories) == len(difficult) == len(integral):
+            raise ValueError("%s has %d boxes but %d categories" % (file_name, len(boxes), len(categories)))
+
+        self.file_names.append(file_name)
+        depth = imgSize[2] if len(imgSize) > 2 else 1
+        self.sizes.extend((int(imgSize[0]), int(imgSize[1]), int(depth)))
+        self.categories.frombytes(categories.tobytes())
+        self.boxes.frombytes(boxes.tobytes())
+        self.difficult.frombytes(difficult.tobytes())
+        self.integral.frombytes(integral.tobytes())
+        self.ann_offsets.append(len(self.categories))
+
+    def getImage(self, index):
+        """
+            Return (file_name, imgSize, categories, boxes, difficult) of an image.
+        """
+        start, end = self.ann_offsets[index], self.ann_offsets[index + 1]
+        imgSize = tuple(self.sizes[3 * index:3 * index + 3])
+        categories = np.frombuffer(self.categories[start:end], dtype=np.int64)
+        boxes = np.frombuffer(self.boxes[4 * start:4 * end], dtype=np.float64).reshape(-1, 4)
+        difficult = np.frombuffer(self.difficult[start:end], dtype=np.int8).astype(bool)
+        return self.file_names[index], imgSize, categories, boxes, difficult
+
+    def getIntegral(self, index):
+        """
+            N x 4 bool array of the integral flags of an image's boxes.
+        """
+        start, end = self.ann_offsets[index], self.ann_offsets[index + 1]
+        return np.frombuffer(self.integral[4 * start:4 * end], dtype=np.int8).reshape(-1, 4).astype(bool)
+
+    def __iter__(self):
+        for index in range(len(self)):
+            yield self.getImage(index)
+
+def add_yolo_image(dataset, labelmap, file_name, imgSize, classes, yolo):
+    """
+        Add an image with its YOLO labels, after checking their classes.
+    """
+    labelmap.getNames(classes)
+    dataset.addImage(file_name, imgSize, classes, yolo)
+
+def load_yolo(yolo_path, labelmap, workers=1):
+    """
+        Load the images (and their YOLO txt files) found under yolo_path.
+        The image sizes are read by the workers, the txt files are parsed
+        in bulk.
+    """
+    index = scan(yolo_path, ('image', 'label'), recursive=True)
+    warn_orphans(index.orphans('label', 'image'), "txt files have no image")
+    paths = [os.path.join(yolo_path, sample.image) for sample in index.ordered('image')]
+
+    dataset = Dataset(labelmap.names, 'yolo')
+    sizes = parallel_imap(get_image_size, paths, workers)
+    labels = iter_label_files([os.path.splitext(imagePath)[0] + ".txt" for imagePath in paths])
+    for imagePath, imgSize, (classes, yolo, _) in zip(paths, sizes, labels):
+        add_yolo_image(dataset, labelmap, os.path.relpath(imagePath, yolo_path), imgSize, classes, yolo)
+    return dataset
+
+def load_yolo_archive(archive_path, labelmap):
+    """
+        Load the images and YOLO txt files of a tar/zip archive, paired by
+        member key. Images are kept in archive order, only their headers
+        are used.
+    """
+    images = []
+    labels = {}
+    for name, data in iter_members(archive_path, IMAGE_EXTS + ('.txt',)):
+        if name.lower().endswith('.txt'):
+            labels[member_key(name)] = data
+        else:
+            with stage('image_size'):
+                images.append((name, read_image_size_bytes(data, name)))
+
+    dataset = Dataset(labelmap.names, 'yolo')
+    for file_name, imgSize in images:
+        classes, yolo, _ = parse_labels(labels.get(member_key(file_name), b''), file_name)
+        add_yolo_image(dataset, labelmap, file_name, imgSize, classes, yolo)
+    return dataset
+
+def pascal_image_size(reader, imagefolder_path=None, sizes=None):
+    """
+        (height, width, depth) of the image of a PascalVocReader: its size,
+        or else the one in sizes (by file name) or read from imagefolder_path.
+    """
+    if reader.size is not None:
+        width, height, depth = reader.size
+        return (height, width, depth)
+    if sizes is not None and reader.filename in sizes:
+        return sizes[reader.filename]
+    if imagefolder_path is None or is_archive(imagefolder_path):
+        raise ValueError("%s has no size and %s is not found" % (reader.filepath, reader.filename))
+    return get_image_size(os.path.join(imagefolder_path, reader.filename))
+
+def read_pascal_file(xmlPath, imagefolder_path=None):
+    reader = PascalVocReader(xmlPath)
+    return reader.filename, pascal_image_size(reader, imagefolder_path), reader.labels, reader.boxes, reader.difficult
+
+def load_pascal(vocfolder_path, labelmap, imagefolder_path=None, workers=1):
+    """
+        Load the PascalVOC xml files of vocfolder_path. Images are only read
+        (from imagefolder_path) when an xml file has no size.
+    """
+    paths = [os.path.join(vocfolder_path, sample.xml) for sample in scan(vocfolder_path, ('xml',)).ordered('xml')]
+
+    dataset = Dataset(labelmap.names, 'pascal')
+    for file_name, imgSize, labels, boxes, difficult in parallel_imap(partial(read_pascal_file, imagefolder_path=imagefolder_path), paths, workers):
+        categories = [labelmap.getIndex(label) for label in labels]
+        dataset.addImage(file_name, imgSize, categories, boxes, difficult)
+    return dataset
+
+def load_pascal_archive(archive_path, labelmap, imagefolder_path=None):
+    """
+        Load the PascalVOC xml files of a tar/zip archive. An xml file
+        without a size takes it from the image of the same name in the
+        archive, or else in imagefolder_path.
+    """
+    readers = []
+    sizes = {}
+    for name, data in iter_members(archive_path, IMAGE_EXTS + (".xml",)):
+        if name.lower().endswith(".xml"):
+            readers.append(PascalVocReader(name, data))
+        else:
+            with stage('image_size'):
+                sizes[os.path.basename(name)] = read_image_size_bytes(data, name)
+
+    dataset = Dataset(labelmap.names, 'pascal')
+    for reader in readers:
+        imgSize = pascal_image_size(reader, imagefolder_path, sizes)
+        categories = [labelmap.getIndex(label) for label in reader.labels]
+        dataset.addImage(reader.filename, imgSize, categories, reader.boxes, reader.difficult)
+    return dataset
+
+def load_coco(cocojson_path):
+    """
+        Load a COCO json file. Sizes come from the json, depth is assumed 3.
+    """
+    with CocoStreamReader(cocojson_path) as reader:
+        dataset = Dataset([cat['name'] for cat in reader.categories], 'coco')
+        catIndex = {cat['id']: index for index, cat in enumerate(reader.categories)}
+        for img, anns in reader.iterImages():
+            categories = [catIndex[ann['category_id']] for ann in anns]
+            bboxes = [ann['bbox'] for ann in anns]
+            dataset.addImage(img['file_name'], (img['height'], img['width'], DEFAULT_DEPTH), categories, bboxes, integral=coco_integral(bboxes))
+    return dataset
+
+def coco_boxes(dataset, imgSize, boxes):
+    if dataset.source == 'yolo':
+        # yolo2coco
+        return yolo_to_coco(boxes, imgSize[1], imgSize[0])
+    if dataset.source == 'pascal':
+        # pascal2coco, the corner is kept as read
+        return xyxy_to_coco(boxes)
+    if dataset.source == 'coco':
+        return round_half_even(boxes, 2)
+    return round_half_even(xyxy_to_coco(boxes), 2)
+
+def save_coco(dataset, output_path):
+    """
+        Boxes are converted as the pairwise script from the dataset's
+        source does.
+    """
+    with CocoJsonWriter(output_path, create_categories(dataset.classes)) as writer:
+        annotation_id = 1
+        for image_id, (file_name, imgSize, categories, boxes, difficult) in enumerate(dataset):
+            writer.addImage(create_image_annotation(file_name, imgSize[1], imgSize[0], image_id))
+            writer.addBoxes(image_id, annotation_id, CocoBoxes(categories + 1, coco_boxes(dataset, imgSize, boxes)))
+            annotation_id += len(boxes)
+
+def write_files(files, output):
+    """
+        Write (name, data) pairs to the output folder (created with the
+        subfolders of the names when missing), or as the members of a new
+        archive when output is a .tar/.zip path.
+    """
+    if is_archive(output):
+        with ArchiveWriter(output) as archive:
+            for name, data in files:
+                archive.write(name, data)
+        return
+    folders = set()
+    for name, data in files:
+        path = os.path.join(output, name)
+        folder = os.path.dirname(path)
+        if folder not in folders:
+            os.makedirs(folder or '.', exist_ok=True)
+            folders.add(folder)
+        write_file(path, data)
+
+def pascal_boxes(dataset, index, imgSize, boxes):
+    """
+        Return the PascalVOC boxes of an image and their integral flags.
+    """
+    if dataset.source == 'yolo':
+        # yolo2pascal, the coordinates clipped to the border are integers
+        return yolo_to_xyxy(boxes, imgSize[1], imgSize[0]), yolo_clipped(boxes)
+    if dataset.source == 'coco':
+        # coco2pascal
+        return coco_to_xyxy(boxes), dataset.getIntegral(index)
+    if dataset.source == 'pascal':
+        return boxes, dataset.getIntegral(index)
+    return round_half_even(boxes, 2), dataset.getIntegral(index)
+
+def pascal_files(dataset, imagefolder_path):
+    """
+        Boxes are converted as the pairwise script from the dataset's
+        source does, from PascalVOC they are written as loaded.
+    """
+    imgFolderName = os.path.basename(archive_stem(imagefolder_path))
+    for index, (file_name, imgSize, categories, boxes, difficult) in enumerate(dataset):
+        imagePath = os.path.join(imagefolder_path, file_name)
+        writer = PascalVocWriter(imgFolderName, os.path.basename(file_name), imgSize, localImgPath=imagePath)
+        names = [dataset.classes[category] for category in categories.tolist()]
+        boxes, integral = pascal_boxes(dataset, index, imgSize, boxes)
+        writer.addBndBoxes(boxes, names, difficult, integral)
+        yield os.path.splitext(os.path.basename(file_name))[0] + ".xml", writer.toBytes()
+
+def save_pascal(dataset, imagefolder_path, output_directory):
+    write_files(pascal_files(dataset, imagefolder_path), output_directory)
+
+def yolo_files(dataset):
+    """
+        From COCO the values are truncated to 7 decimals (as coco2yolo
+        does), otherwise written with 6 decimals (as pascal2yolo does).
+        YOLO boxes are written as read.
+    """
+    for file_name, imgSize, categories, boxes, difficult in dataset:
+        if dataset.source == 'coco':
+            data = format_labels(categories, coco_to_yolo(boxes, imgSize[1], imgSize[0], 7), "%r")
+        elif dataset.source == 'yolo':
+            data = format_labels(categories, boxes)
+        else:
+            data = format_labels(categories, xyxy_to_yolo(boxes, imgSize[1], imgSize[0]))
+        yield os.path.splitext(file_name)[0] + ".txt", data
+
+def save_yolo(dataset, output_folder):
+    write_files(yolo_files(dataset), output_folder)
@@ -0,0 +1,253 @@
+import io
+import os
+import struct
+import sqlite3
+import threading
+from contextlib import contextmanager
+from multiprocessing.util import Finalize
+from .instrument import stage
+
+PNG_SIGNATURE = b'\x89PNG\r\n\x1a\n'
+PNG_COLOUR_TYPES = {0, 2, 3, 4, 6}
+# cv2.imread loads every image as 3 channel BGR (grey is expanded, alpha dropped)
+IMREAD_DEPTH = 3
+# JPEG start-of-frame markers (0xC4 DHT, 0xC8 JPG and 0xCC DAC are not frames)
+JPEG_SOF_MARKERS = set(range(0xC0, 0xD0)) - {0xC4, 0xC8, 0xCC}
+# JPEG markers that stand alone without a length field
+JPEG_STANDALONE_MARKERS = set(range(0xD0, 0xD9)) | {0x01}
+JPEG_APP1 = 0xE1
+EXIF_ORIENTATION_TAG = 0x0112
+# Exif orientations that rotate the image by 90 degrees (cv2.imread swaps width and height)
+EXIF_TRANSPOSED = {5, 6, 7, 8}
+# Bumped when read_image_size changes its results, older cache rows are dropped
+CACHE_VERSION = 2
+# New cache rows written per transaction
+CACHE_COMMIT_ROWS = 1000
+
+def _read_png_size(f):
+    header = f.read(26)
+    if len(header) < 26 or header[:8] != PNG_SIGNATURE or header[12:16] != b'IHDR':
+        return None
+    width, height = struct.unpack('>II', header[16:24])
+    if header[25] not in PNG_COLOUR_TYPES:
+        return None
+    return height, width, IMREAD_DEPTH
+
+def _exif_orientation(data):
+    """
+        Orientation tag of the Exif APP1 segment data (1 when missing).
+    """
+    if data[:6] != b'Exif\x00\x00':
+        return 1
+    tiff = data[6:]
+    endian = {b'II': '<', b'MM': '>'}.get(tiff[:2])
+    if endian is None or len(tiff) < 8:
+        return 1
+    offset = struct.unpack(endian + 'I', tiff[4:8])[0]
+    if offset + 2 > len(tiff):
+        return 1
+    entries = struct.unpack(endian + 'H', tiff[offset:offset + 2])[0]
+    for entry in range(offset + 2, min(offset + 2 + 12 * entries, len(tiff) - 11), 12):
+        tag = struct.unpack(endian + 'H', tiff[entry:entry + 2])[0]
+        if tag == EXIF_ORIENTATION_TAG:
+            return struct.unpack(endian + 'H', tiff[entry + 8:entry + 10])[0]
+    return 1
+
+def _read_jpeg_size(f):
+    if f.read(2) != b'\xff\xd8':
+        return None
+    orientation = 1
+    while True:
+        byte = f.read(1)
+        if not byte:
+            return None
+        if byte != b'\xff':
+            continue
+        marker = f.read(1)
+        # Skip fill bytes
+        while marker == b'\xff':
+            marker = f.read(1)
+        if not marker:
+            return None
+        marker = marker[0]
+        if marker in JPEG_STANDALONE_MARKERS:
+            continue
+        if marker == 0xD9:
+            return None
+        length = f.read(2)
+        if len(length) < 2:
+            return None
+        length = struct.unpack('>H', length)[0]
+        if marker in JPEG_SOF_MARKERS:
+            frame = f.read(5)
+            if len(frame) < 5:
+                return None
+            _, height, width = struct.unpack('>BHH', frame)
+            if height == 0 or width == 0:
+                # Height defined later by a DNL marker, let the decoder handle it
+                return None
+            if orientation in EXIF_TRANSPOSED:
+                return width, height, IMREAD_DEPTH
+            return height, width, IMREAD_DEPTH
+        if marker == JPEG_APP1 and orientation == 1:
+            # cv2.imread applies the Exif orientation
+            orientation = _exif_orientation(f.read(length - 2))
+            continue
+        f.seek(length - 2, 1)
+
+def _read_header_size(f):
+    signature = f.read(8)
+    f.seek(0)
+    if signature.startswith(PNG_SIGNATURE):
+        return _read_png_size(f)
+    if signature.startswith(b'\xff\xd8'):
+        return _read_jpeg_size(f)
+    return None
+
+def _image_shape(image, name):
+    if image is None:
+        raise IOError("Cannot read image: " + name)
+    return image.shape
+
+def _decode_image_size(imagePath):
+    import cv2
+    return _image_shape(cv2.imread(imagePath), imagePath)
+
+def read_image_size(imagePath):
+    """
+        Return (height, width, depth) of an image, the same as
+        cv2.imread(imagePath).shape. JPEG and PNG sizes are read from the
+        file header (JPEG Exif orientations that rotate the image swap width
+        and height, as cv2.imread does), any other format is decoded with cv2.
+    """
+    with open(imagePath, 'rb') as f:
+        size = _read_header_size(f)
+    if size is None:
+        size = _decode_image_size(imagePath)
+    return size
+
+def read_image_size_bytes(data, name="<bytes>"):
+    """
+        read_image_size of an image held in memory (e.g. an archive member).
+    """
+    size = _read_header_size(io.BytesIO(data))
+    if size is None:
+        import cv2
+        import numpy as np
+        size = _image_shape(cv2.imdecode(np.frombuffer(data, dtype=np.uint8), cv2.IMREAD_COLOR), name)
+    return size
+
+class ImageSizeCache:
+    """
+        SQLite table of image sizes keyed by absolute path, file size and
+        mtime, so an image is only read again after it changed. Several
+        processes can share one cache file, and the threads of a process
+        one cache (the images themselves are read outside its lock). New
+        rows are kept in memory and written commit_rows at a time in one
+        short transaction, and on close (at the latest when the process
+        exits).
+    """
+
+    def __init__(self, cache_path, commit_rows=CACHE_COMMIT_ROWS):
+        self.cache_path = cache_path
+        self.commit_rows = commit_rows
+        # path -> row not written yet
+        self.pending = {}
+        # Guards pending and the connection, commit() runs with it held
+        self.lock = threading.RLock()
+        # Transactions are explicit, the write lock is only held to insert a batch
+        self.connection = sqlite3.connect(cache_path, timeout=60, isolation_level=None, check_same_thread=False)
+        self.connection.execute('PRAGMA journal_mode=WAL')
+        self.connection.execute('PRAGMA synchronous=NORMAL')
+        with self.transaction():
+            if self.connection.execute('PRAGMA user_version').fetchone()[0] != CACHE_VERSION:
+                self.connection.execute('DROP TABLE IF EXISTS images')
+                self.connection.execute('PRAGMA user_version = %d' % CACHE_VERSION)
+            self.connection.execute('CREATE TABLE IF NOT EXISTS images (path TEXT PRIMARY KEY, size INTEGER, mtime INTEGER, '
+                                    'height INTEGER, width INTEGER, depth INTEGER)')
+        # Also run on a normal exit of a worker process (not on terminate)
+        self.finalizer = Finalize(self, self.close, exitpriority=10)
+
+    @contextmanager
+    def transaction(self):
+        # IMMEDIATE takes the write lock first (waiting for other writers)
+        self.connection.execute('BEGIN IMMEDIATE')
+        try:
+            yield
+        except BaseException:
+            self.connection.execute('ROLLBACK')
+            raise
+        self.connection.execute('COMMIT')
+
+    def getImageSize(self, imagePath):
+        path = os.path.abspath(imagePath)
+        st = os.stat(path)
+        with self.lock:
+            row = self.pending.get(path)
+            if row is not None and row[1:3] == (st.st_size, st.st_mtime_ns):
+                return row[3:]
+            row = self.connection.execute('SELECT height, width, depth FROM images WHERE path = ? AND size = ? AND mtime = ?',
+                                          (path, st.st_size, st.st_mtime_ns)).fetchone()
+        if row is not None:
+            return tuple(row)
+
+        size = tuple(int(value) for value in read_image_size(imagePath))
+        with self.lock:
+            self.pending[path] = (path, st.st_size, st.st_mtime_ns) + size
+            if len(self.pending) >= self.commit_rows:
+                self.commit()
+        return size
+
+    def commit(self):
+        """
+            Write the pending rows.
+        """
+        with self.lock:
+            if self.pending:
+                with self.transaction():
+                    self.connection.executemany('INSERT OR REPLACE INTO images VALUES (?, ?, ?, ?, ?, ?)', self.pending.values())
+                self.pending.clear()
+
+    def close(self):
+        with self.lock:
+            if self.connection is None:
+                return
+            self.commit()
+            self.connection.close()
+            self.connection = None
+
+_cache_path = None
+# (pid, ImageSizeCache), a connection cannot be shared with forked workers
+_cache = None
+
+def set_image_cache(cache_path):
+    """
+        Make get_image_size consult (and fill) the cache at cache_path, in
+        this process and in the worker processes forked afterwards. None
+        disables the cache.
+    """
+    global _cache_path, _cache
+    if _cache is not None and _cache[0] == os.getpid():
+        _cache[1].close()
+    _cache_path = cache_path
+    _cache = None
+    if cache_path is not None:
+        _cache = (os.getpid(), ImageSizeCache(cache_path))
+
+def image_cache():
+    global _cache
+    if _cache_path is None:
+        return None
+    if _cache is None or _cache[0] != os.getpid():
+        _cache = (os.getpid(), ImageSizeCache(_cache_path))
+    return _cache[1]
+
+def get_image_size(imagePath):
+    """
+        read_image_size through the image size cache, when one is set.
+    """
+    with stage('image_size'):
+        cache = image_cache()
+        if cache is not None:
+            return cache.getImageSize(imagePath)
+        return read_image_size(imagePath)
@@ -0,0 +1,182 @@
+"""
+Opt-in instrumentation of the converters: stage timers, counters, progress
+with ETA and a cProfile dump. Everything is a no-op until enable() is
+called, so the converters can be instrumented unconditionally.
+
+    with stage('parse'):      time a stage (inclusive of nested stages)
+    count('boxes', n)         add to a counter
+
+Worker processes run with collect(func), which sends their stats back with
+each result so parallel_imap can merge them in the main process.
+"""
+import sys
+import json
+import time
+import cProfile
+
+# Seconds between two progress lines
+PROGRESS_INTERVAL = 5.0
+
+_enabled = False
+_stages = {}
+_counters = {}
+_progress = None
+
+class _Stage:
+    __slots__ = ('name', 'start')
+
+    def __init__(self, name):
+        self.name = name
+
+    def __enter__(self):
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        _stages[self.name] = _stages.get(self.name, 0.0) + time.perf_counter() - self.start
+
+class _NullStage:
+    __slots__ = ()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        pass
+
+_NULL_STAGE = _NullStage()
+
+def enabled():
+    return _enabled
+
+def enable(progress_interval=None):
+    """
+        Start collecting stats, and print progress lines every
+        progress_interval seconds when it is set.
+    """
+    global _enabled, _progress
+    _enabled = True
+    if progress_interval:
+        _progress = Progress(progress_interval)
+
+def stage(name):
+    return _Stage(name) if _enabled else _NULL_STAGE
+
+def count(name, value=1):
+    if _enabled:
+        _counters[name] = _counters.get(name, 0) + value
+
+def snapshot():
+    return {'stages': dict(_stages), 'counters': dict(_counters)}
+
+def reset():
+    _stages.clear()
+    _counters.clear()
+
+def merge(stats):
+    for name, seconds in stats['stages'].items():
+        _stages[name] = _stages.get(name, 0.0) + seconds
+    for name, value in stats['counters'].items():
+        _counters[name] = _counters.get(name, 0) + value
+
+class collect:
+    """
+        Wrap a worker function so it returns (result, stats of the call).
+    """
+
+    def __init__(self, func):
+        self.func = func
+
+    def __call__(self, item):
+        global _enabled
+        _enabled = True
+        reset()
+        result = self.func(item)
+        return result, snapshot()
+
+class Progress:
+    """
+        Print the number of finished items, the rate and an ETA (when the
+        total is known) to stderr at most every interval seconds.
+    """
+
+    def __init__(self, interval=PROGRESS_INTERVAL):
+        self.interval = interval
+        self.start = time.time()
+        self.last = self.start
+        self.done = 0
+        self.total = None
+
+    def tick(self, total=None):
+        self.done += 1
+        if total is not None:
+            self.total = total
+        now = time.time()
+        if now - self.last >= self.interval:
+            self.last = now
+            self.report(now)
+
+    def report(self, now):
+        elapsed = now - self.start
+        rate = self.done / elapsed if elapsed > 0 else 0.0
+        line = "[%8.1fs] %d" % (elapsed, self.done)
+        if self.total:
+            line += "/%d (%.1f%%)" % (self.total, 100.0 * self.done / self.total)
+        line += " files, %.1f files/s" % rate
+        if self.total and rate > 0:
+            line += ", ETA %.1fs" % ((self.total - self.done) / rate)
+        print(line, file=sys.stderr, flush=True)
+
+def tick(total=None):
+    """
+        Called by parallel_imap for every finished item.
+    """
+    count('files')
+    if _progress is not None:
+        _progress.tick(total)
+
+def report(seconds=None):
+    """
+        Return the collected stats, with the throughput of the counters
+        when the total wall time is given.
+    """
+    stats = snapshot()
+    if seconds is not None:
+        stats['seconds'] = seconds
+        stats['rates'] = {name + '_per_s': value / seconds for name, value in stats['counters'].items() if seconds > 0}
+    return stats
+
+def add_arguments(parser):
+    parser.add_argument('--report', type=str, help='Write stage timings and counters (files, boxes, bytes) to this json file')
+    parser.add_argument('--progress', nargs='?', const=PROGRESS_INTERVAL, type=float, help='Print progress with ETA every N seconds (default %g)' % PROGRESS_INTERVAL)
+    parser.add_argument('--profile', type=str, help='Dump cProfile stats of the main process to this file')
+
+class Run:
+    """
+        Instrument a script run as set up by add_arguments, used around the
+        conversion in __main__:
+
+            with instrument.Run(opt):
+                convert(...)
+    """
+
+    def __init__(self, opt):
+        self.opt = opt
+        self.profiler = None
+
+    def __enter__(self):
+        self.start = time.time()
+        if self.opt.report or self.opt.progress:
+            enable(self.opt.progress)
+        if self.opt.profile:
+            self.profiler = cProfile.Profile()
+            self.profiler.enable()
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        if self.profiler is not None:
+            self.profiler.disable()
+            self.profiler.dump_stats(self.opt.profile)
+        if exc_type is None and self.opt.report:
+            with open(self.opt.report, 'w') as f:
+                json.dump(report(time.time() - self.start), f, indent=2)
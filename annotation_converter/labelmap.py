@@ -0,0 +1,50 @@
+class LabelMap:
+    """
+        Detection category names (one per line of obj.names) with O(1)
+        lookups from name to index and from index to name.
+    """
+
+    def __init__(self, names, label_path=None):
+        self.names = list(names)
+        self.label_path = label_path
+        self.indices = {name: index for index, name in enumerate(self.names)}
+
+    @classmethod
+    def load(cls, label_path):
+        with open(label_path, 'r') as f:
+            names = f.read().strip().splitlines()
+        return cls(names, label_path)
+
+    def save(self, label_path):
+        with open(label_path, 'w') as f:
+            for name in self.names:
+                f.write("%s\n" % name)
+
+    def __len__(self):
+        return len(self.names)
+
+    def __iter__(self):
+        return iter(self.names)
+
+    def source(self):
+        return self.label_path if self.label_path is not None else "the label map"
+
+    def getIndex(self, name):
+        try:
+            return self.indices[name]
+        except KeyError:
+            raise ValueError("Unknown label '%s', it is not listed in %s" % (name, self.source())) from None
+
+    def getName(self, index):
+        index = int(index)
+        if index < 0 or index >= len(self.names):
+            raise ValueError("Unknown class index %d, %s has %d labels" % (index, self.source(), len(self.names)))
+        return self.names[index]
+
+    def getNames(self, indices):
+        """
+            Names of a sequence (or int array) of class indices, checking each one.
+        """
+        if hasattr(indices, 'tolist'):
+            indices = indices.tolist()
+        return [self.getName(index) for index in indices]
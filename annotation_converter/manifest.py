@@ -0,0 +1,159 @@
+import os
+import json
+import hashlib
+
+# One manifest per converter, they can share an output folder
+MANIFEST_NAME = '.%s.manifest.json'
+HASH_CHUNK = 1 << 20
+
+def file_hash(path):
+    digest = hashlib.blake2b(digest_size=16)
+    with open(path, 'rb') as f:
+        for chunk in iter(lambda: f.read(HASH_CHUNK), b''):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+def content_digest(obj):
+    """
+        Hash of a json serialisable object, for inputs that are not files
+        of their own (e.g. one image entry of a COCO json).
+    """
+    return hashlib.blake2b(json.dumps(obj, sort_keys=True).encode('utf-8'), digest_size=16).hexdigest()
+
+class Manifest:
+    """
+        Record of the inputs and outputs of an incremental conversion.
+
+        Each entry (one converted file) stores [mtime_ns, size, hash] for
+        its inputs and outputs. A file whose mtime/size is unchanged is
+        trusted, otherwise its hash decides. Images are only tracked by
+        mtime/size (their header is all the converters read) and inputs
+        that are not files are tracked by a digest.
+    """
+
+    def __init__(self, manifest_path):
+        self.manifest_path = manifest_path
+        self.entries = {}
+        self.stats = {}
+        self.hashes = {}
+        self.seen = set()
+        if os.path.exists(manifest_path):
+            with open(manifest_path, 'r') as f:
+                self.entries = json.load(f).get('entries', {})
+
+    def stat(self, path, cached=True):
+        if cached and path in self.stats:
+            return self.stats[path]
+        try:
+            st = os.stat(path)
+            result = [st.st_mtime_ns, st.st_size]
+        except FileNotFoundError:
+            result = None
+        if cached:
+            self.stats[path] = result
+        return result
+
+    def hash(self, path, cached=True):
+        if cached and path in self.hashes:
+            return self.hashes[path]
+        result = file_hash(path)
+        if cached:
+            self.hashes[path] = result
+        return result
+
+    def fingerprint(self, path, hashed=True, cached=True):
+        st = self.stat(path, cached)
+        if st is None:
+            raise FileNotFoundError(path)
+        return st + [self.hash(path, cached) if hashed else None]
+
+    def matches(self, record, path, cached=True):
+        st = self.stat(path, cached)
+        if st is None:
+            return False
+        if st == record[:2]:
+            return True
+        if record[2] is None or self.hash(path, cached) != record[2]:
+            return False
+        # Touched but identical, remember the new mtime
+        record[:2] = st
+        return True
+
+    def isCurrent(self, key, inputs=(), outputs=(), images=(), digest=None):
+        """
+            Return True if the entry key was converted from the same inputs
+            and its outputs are untouched since.
+        """
+        self.seen.add(key)
+        entry = self.entries.get(key)
+        if entry is None or entry.get('digest') != digest:
+            return False
+        if set(entry['inputs']) != set(inputs) | set(images) or set(entry['outputs']) != set(outputs):
+            return False
+        for path, record in entry['inputs'].items():
+            if not self.matches(record, path):
+                return False
+        for path, record in entry['outputs'].items():
+            if not self.matches(record, path, cached=False):
+                return False
+        return True
+
+    def update(self, key, inputs=(), outputs=(), images=(), digest=None, **info):
+        """
+            Record the entry key, info is stored along with it.
+        """
+        self.seen.add(key)
+        entry = {'inputs': {}, 'outputs': {}, 'digest': digest}
+        entry.update(info)
+        for path in inputs:
+            entry['inputs'][path] = self.fingerprint(path)
+        for path in images:
+            entry['inputs'][path] = self.fingerprint(path, hashed=False)
+        for path in outputs:
+            entry['outputs'][path] = self.fingerprint(path, cached=False)
+        self.entries[key] = entry
+
+    def removeStale(self):
+        """
+            Delete the outputs of the entries not seen in this run (their
+            source is gone) and return the removed keys.
+        """
+        removed = [key for key in self.entries if key not in self.seen]
+        current = set()
+        for key in self.seen:
+            current.update(self.entries.get(key, {}).get('outputs', ()))
+        for key in removed:
+            for path in self.entries.pop(key)['outputs']:
+                if path not in current and os.path.exists(path):
+                    os.remove(path)
+        return removed
+
+    def save(self):
+        tmp_path = self.manifest_path + '.tmp'
+        with open(tmp_path, 'w') as f:
+            json.dump({'version': 1, 'entries': self.entries}, f)
+        os.replace(tmp_path, self.manifest_path)
+
+    def convertChanged(self, items, dependencies, convert):
+        """
+            Run convert (which consumes an iterable of items) over the items
+            whose dependencies changed since the last run, record them,
+            remove the outputs of vanished items and save the manifest.
+            dependencies(item) returns the isCurrent/update keyword arguments.
+            Return (number of converted items, removed keys).
+        """
+        converted = []
+
+        def changed():
+            for item in items:
+                deps = dependencies(item)
+                if not self.isCurrent(**deps):
+                    converted.append(deps)
+                    yield item
+
+        convert(changed())
+        for deps in converted:
+            self.update(**deps)
+        removed = self.removeStale()
+        self.save()
+        return len(converted), removed
@@ -0,0 +1,128 @@
+"""
+Packed annotation cache: a whole Dataset in one binary file that is loaded
+with numpy.memmap instead of parsing every txt/xml file again.
+
+    magic        8 bytes, PACK_MAGIC
+    header_size  little endian uint64
+    header       utf-8 json: classes, file_names, source and the offset,
+                 dtype and shape of every array (relative to the data section)
+    data         the arrays, each aligned to PACK_ALIGN bytes:
+                     sizes        int32   N x 3  height, width, depth
+                     ann_offsets  int64   N + 1  annotations of image i are ann_offsets[i]:ann_offsets[i + 1]
+                     categories   int32   M      class index
+                     boxes        float32 M x 4  Dataset.boxes, in the layout of source (float64
+                                                 when float32 would round them)
+                     difficult    uint8   M
+                     integral     uint8   M x 4  Dataset.integral
+
+source and integral keep the number formats of the loaded input, so a
+conversion from the pack writes the same files as one from the input.
+Version 1 packs have neither and boxes always xmin, ymin, xmax, ymax in
+float32.
+"""
+import os
+import json
+import struct
+import numpy as np
+
+PACK_EXT = '.pack'
+PACK_MAGIC = b'DETPACK1'
+PACK_VERSION = 2
+PACK_ALIGN = 64
+PACK_ARRAYS = (('sizes', '<i4', 3), ('ann_offsets', '<i8', None), ('categories', '<i4', None),
+               ('boxes', '<f4', 4), ('difficult', '|u1', None), ('integral', '|u1', 4))
+
+def align(offset):
+    return (offset + PACK_ALIGN - 1) // PACK_ALIGN * PACK_ALIGN
+
+def save_packed(dataset, pack_path):
+    """
+        Write a Dataset (or PackedDataset) to pack_path. Boxes are stored as
+        float32 unless that would change a value.
+    """
+    arrays = {}
+    for name, dtype, columns in PACK_ARRAYS:
+        values = np.asarray(getattr(dataset, name))
+        if name == 'boxes' and not np.array_equal(values.astype(dtype), values, equal_nan=True):
+            dtype = '<f8'
+        values = values.astype(dtype)
+        arrays[name] = values.reshape(-1, columns) if columns else values.reshape(-1)
+
+    layout = {}
+    offset = 0
+    for name, values in arrays.items():
+        layout[name] = [offset, values.dtype.str, list(values.shape)]
+        offset = align(offset + values.nbytes)
+    header = json.dumps({'version': PACK_VERSION, 'classes': list(dataset.classes), 'file_names': list(dataset.file_names),
+                         'source': dataset.source, 'arrays': layout}).encode('utf-8')
+
+    tmp_path = pack_path + '.tmp'
+    with open(tmp_path, 'wb') as f:
+        f.write(PACK_MAGIC + struct.pack('<Q', len(header)) + header)
+        data_start = align(f.tell())
+        for name, values in arrays.items():
+            f.write(b'\0' * (data_start + layout[name][0] - f.tell()))
+            f.write(values.tobytes())
+    os.replace(tmp_path, pack_path)
+
+class PackedDataset:
+    """
+        Read only Dataset backed by a memory mapped pack file. The arrays
+        are views of the file, nothing is parsed or copied until an image
+        is accessed.
+    """
+
+    def __init__(self, pack_path):
+        self.pack_path = pack_path
+        with open(pack_path, 'rb') as f:
+            magic = f.read(len(PACK_MAGIC))
+            if magic != PACK_MAGIC:
+                raise ValueError("%s is not a packed annotation file" % pack_path)
+            header_size, = struct.unpack('<Q', f.read(8))
+            header = json.loads(f.read(header_size).decode('utf-8'))
+        data_start = align(len(PACK_MAGIC) + 8 + header_size)
+
+        self.classes = header['classes']
+        self.file_names = header['file_names']
+        self.source = header.get('source')
+        self.integral = np.zeros((0, 4), dtype=np.uint8)
+        data = np.memmap(pack_path, dtype=np.uint8, mode='r')
+        for name, (offset, dtype, shape) in header['arrays'].items():
+            start = data_start + offset
+            count = int(np.prod(shape))
+            values = data[start:start + count * np.dtype(dtype).itemsize].view(dtype).reshape(shape)
+            setattr(self, name, values)
+
+    def __len__(self):
+        return len(self.file_names)
+
+    def numAnnotations(self):
+        return len(self.categories)
+
+    def getImage(self, index):
+        """
+            Return (file_name, imgSize, categories, boxes, difficult) of an image.
+        """
+        start, end = self.ann_offsets[index], self.ann_offsets[index + 1]
+        imgSize = tuple(int(value) for value in self.sizes[index])
+        categories = self.categories[start:end].astype(np.int64)
+        boxes = self.boxes[start:end].astype(np.float64)
+        difficult = self.difficult[start:end].astype(bool)
+        return self.file_names[index], imgSize, categories, boxes, difficult
+
+    def getIntegral(self, index):
+        """
+            N x 4 bool array of the integral flags of an image's boxes.
+        """
+        start, end = self.ann_offsets[index], self.ann_offsets[index + 1]
+        if not len(self.integral):
+            # Version 1 pack
+            return np.zeros((end - start, 4), dtype=bool)
+        return self.integral[start:end].astype(bool)
+
+    def __iter__(self):
+        for index in range(len(self)):
+            yield self.getImage(index)
+
+def load_packed(pack_path):
+    return PackedDataset(pack_path)
@@ -0,0 +1,80 @@
+import threading
+import multiprocessing
+from . import instrument
+
+# Shard size used when the number of items is not known in advance
+DEFAULT_CHUNKSIZE = 64
+
+def parallel_imap(func, items, workers=1, chunksize=None, pending=None):
+    """
+        Yield func(item) for every item, computed in a pool of worker
+        processes when workers > 1. The items are split into shards of
+        chunksize items and results come back in the order of items, so the
+        output is the same as a serial run. Items without a len() (e.g.
+        generators) are fed to the pool as they come, with at most pending
+        items (a few shards per worker by default) taken but not yet yielded.
+    """
+    sized = hasattr(items, '__len__')
+    total = len(items) if sized else None
+    if workers is None or workers <= 1:
+        for item in items:
+            result = func(item)
+            instrument.tick(total)
+            yield result
+        return
+
+    # Workers send their stats back with the results
+    collected = instrument.enabled()
+    if collected:
+        func = instrument.collect(func)
+
+    def results(pool_results):
+        for result in pool_results:
+            if collected:
+                result, stats = result
+                instrument.merge(stats)
+            instrument.tick(total)
+            yield result
+
+    if chunksize is None:
+        chunksize = max(1, len(items) // (workers * 4)) if sized else DEFAULT_CHUNKSIZE
+    with multiprocessing.Pool(workers) as pool:
+        if sized:
+            for result in results(pool.imap(func, items, chunksize)):
+                yield result
+            # Let the workers exit normally (running their exit handlers)
+            # instead of being terminated
+            pool.close()
+            pool.join()
+            return
+
+        # The pool's task thread takes an item per free slot, a slot is freed
+        # by every result yielded
+        pending = max(pending or workers * chunksize * 4, chunksize)
+        slots = threading.Semaphore(pending)
+        stopped = threading.Event()
+
+        def bounded(items):
+            for item in items:
+                slots.acquire()
+                if stopped.is_set():
+                    return
+                yield item
+
+        try:
+            for result in results(pool.imap(func, bounded(items), chunksize)):
+                slots.release()
+                yield result
+            pool.close()
+            pool.join()
+        finally:
+            # Unblock the task thread when the results are not all consumed
+            stopped.set()
+            for _ in range(pending):
+                slots.release()
+
+def parallel_map(func, items, workers=1, chunksize=None):
+    """
+        Return [func(item) for item in items], see parallel_imap.
+    """
+    return list(parallel_imap(func, items, workers, chunksize))
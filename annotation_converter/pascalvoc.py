@@ -0,0 +1,238 @@
+import re
+import numpy as np
+from .instrument import stage, count
+from .pipeline import write_file
+from .records import BoxList
+
+XML_EXT = '.xml'
+ENCODE_METHOD = 'utf-8'
+INDENT = '  '
+
+def escape(text):
+    # Line endings are normalised the way an XML parser reads them back
+    text = text.replace('\r\n', '\n').replace('\r', '\n')
+    return text.replace('&', '&amp;').replace('<', '&lt;').replace('>', '&gt;')
+
+def textElement(tag, text, depth):
+    if not text:
+        return '%s<%s/>\n' % (INDENT * depth, tag)
+    return '%s<%s>%s</%s>\n' % (INDENT * depth, tag, escape(text), tag)
+
+class PascalVocWriter:
+
+    def __init__(self, foldername, filename, imgSize,databaseSrc='detection_objects', localImgPath=None):
+        self.foldername = foldername
+        self.filename = filename
+        self.databaseSrc = databaseSrc
+        self.imgSize = imgSize
+        self.boxlist = BoxList()
+        self.localImgPath = localImgPath
+        self.verified = False
+
+    def genXML(self):
+        """
+            Return the pretty-printed XML document as a string
+        """
+        # Check conditions
+        if self.filename is None or \
+                self.foldername is None or \
+                self.imgSize is None:
+            return None
+
+        parts = ['<annotation verified="yes">\n' if self.verified else '<annotation>\n']
+        parts.append(textElement('folder', self.foldername, 1))
+        parts.append(textElement('filename', self.filename, 1))
+        if self.localImgPath is not None:
+            parts.append(textElement('path', self.localImgPath, 1))
+
+        parts.append(INDENT + '<source>\n')
+        parts.append(textElement('database', self.databaseSrc, 2))
+        parts.append(INDENT + '</source>\n')
+
+        parts.append(INDENT + '<size>\n')
+        parts.append(textElement('width', str(self.imgSize[1]), 2))
+        parts.append(textElement('height', str(self.imgSize[0]), 2))
+        if len(self.imgSize) == 3:
+            parts.append(textElement('depth', str(self.imgSize[2]), 2))
+        else:
+            parts.append(textElement('depth', '1', 2))
+        parts.append(INDENT + '</size>\n')
+
+        parts.append(textElement('segmented', '0', 1))
+        self.appendObjects(parts)
+        parts.append('</annotation>\n')
+
+        # Same output as lxml pretty_print with the indentation (and any
+        # double space) replaced by tabs
+        return ''.join(parts).replace("  ", "\t")
+
+    def addBndBox(self, xmin, ymin, xmax, ymax, name, difficult):
+        self.boxlist.add(xmin, ymin, xmax, ymax, name, difficult)
+
+    def addBndBoxes(self, boxes, names, difficult=None, integral=None):
+        """
+            Add N x 4 boxes (xmin, ymin, xmax, ymax) at once, see BoxList.extend
+        """
+        self.boxlist.extend(boxes, names, difficult, integral)
+
+    def isTruncated(self, xmin, ymin, xmax, ymax):
+        if int(ymax) == int(self.imgSize[0]) or (int(ymin)== 1):
+            return True # max == height or min
+        elif (int(xmax)==int(self.imgSize[1])) or (int(xmin)== 1):
+            return True # max == width or min
+        return False
+
+    def appendObjects(self, parts):
+        for xmin, ymin, xmax, ymax, name, difficult in self.boxlist:
+            parts.append(INDENT + '<object>\n')
+            parts.append(textElement('name', name, 2))
+            parts.append(textElement('pose', "Unspecified", 2))
+            parts.append(textElement('truncated', "1" if self.isTruncated(xmin, ymin, xmax, ymax) else "0", 2))
+            parts.append(textElement('difficult', str( bool(difficult) & 1 ), 2))
+            parts.append(INDENT * 2 + '<bndbox>\n')
+            parts.append(textElement('xmin', str(xmin), 3))
+            parts.append(textElement('ymin', str(ymin), 3))
+            parts.append(textElement('xmax', str(xmax), 3))
+            parts.append(textElement('ymax', str(ymax), 3))
+            parts.append(INDENT * 2 + '</bndbox>\n')
+            parts.append(INDENT + '</object>\n')
+
+    def toBytes(self):
+        return self.genXML().encode(ENCODE_METHOD)
+
+    def save(self, targetFile=None):
+        if targetFile is None:
+            targetFile = self.filename + XML_EXT
+
+        write_file(targetFile, self.toBytes())
+
+# Minimal extractor for the fixed VOC layout written by PascalVocWriter and
+# most labelling tools. Anything it cannot vouch for goes through lxml.
+VOC_OBJECT = re.compile(r'<object>(.*?)<bndbox>\s*<xmin>([^<]*)</xmin>\s*<ymin>([^<]*)</ymin>\s*'
+                        r'<xmax>([^<]*)</xmax>\s*<ymax>([^<]*)</ymax>\s*</bndbox>\s*</object>', re.S)
+VOC_NAME = re.compile(r'<name>([^<]*)</name>')
+VOC_DIFFICULT = re.compile(r'<difficult>([^<]*)</difficult>')
+VOC_FILENAME = re.compile(r'<filename>([^<]*)</filename>')
+VOC_SIZE = re.compile(r'<size>\s*<width>([^<]*)</width>\s*<height>([^<]*)</height>\s*<depth>([^<]*)</depth>\s*</size>')
+VOC_ROOT = re.compile(r'\s*(?:<\?xml[^>]*\?>\s*)?<annotation( verified="yes")?>')
+VOC_UNSUPPORTED = ('&', '<!', '<part', '<object ', '<?xml-')
+
+def read_file(filepath):
+    with stage('read'):
+        with open(filepath, 'rb') as f:
+            data = f.read()
+    count('bytes_read', len(data))
+    return data
+
+class PascalVocReader:
+    """
+        Read a PascalVOC xml file. Files in the usual VOC layout are read with
+        a minimal regular-expression extractor, anything else (entities,
+        comments, object parts, ...) is parsed with lxml. Boxes are returned
+        as arrays:
+            labels    list of N label names
+            boxes     N x 4 float array of xmin, ymin, xmax, ymax
+            difficult N bool array
+    """
+
+    def __init__(self, filepath, data=None):
+        self.filepath = filepath
+        # Content of the file when it has already been read
+        self.data = data
+        self.filename = ""
+        self.size = None
+        self.verified = False
+        self.labels = []
+        self.boxes = None
+        self.difficult = None
+        self.parseXML()
+
+    def getSize(self):
+        return self.size
+
+    def getFilename(self):
+        return self.filename
+
+    def getShapes(self):
+        """
+            Return the boxes as [label, [(x1,y1), (x2,y2), (x3,y3), (x4,y4)], color, color, difficult]
+        """
+        shapes = []
+        for label, (xmin, ymin, xmax, ymax), difficult in zip(self.labels, self.boxes.tolist(), self.difficult.tolist()):
+            points = [(xmin, ymin), (xmax, ymin), (xmax, ymax), (xmin, ymax)]
+            shapes.append((label, points, None, None, difficult))
+        return shapes
+
+    def parseFast(self, data):
+        """
+            Extract the annotation with regular expressions, return False if
+            the file is not in the plain VOC layout.
+        """
+        try:
+            text = data.decode(ENCODE_METHOD)
+        except UnicodeDecodeError:
+            return False
+        root = VOC_ROOT.match(text)
+        if root is None or any(token in text for token in VOC_UNSUPPORTED):
+            return False
+        if text.startswith('<?xml') and 'utf-8' not in text[:text.index('?>')].lower():
+            return False
+
+        objects = VOC_OBJECT.findall(text)
+        if len(objects) != text.count('<object>'):
+            return False
+        labels = []
+        difficult = []
+        for head, xmin, ymin, xmax, ymax in objects:
+            name = VOC_NAME.search(head)
+            if name is None or '<object>' in head:
+                return False
+            labels.append(name.group(1))
+            isDifficult = VOC_DIFFICULT.search(head)
+            difficult.append(bool(int(isDifficult.group(1))) if isDifficult is not None else False)
+
+        filename = VOC_FILENAME.search(text)
+        self.filename = filename.group(1) if filename is not None else None
+        size = VOC_SIZE.search(text)
+        if size is None and '<size>' in text:
+            return False
+        if size is not None:
+            self.size = (int(size.group(1)), int(size.group(2)), int(size.group(3)))
+        self.verified = root.group(1) is not None
+        self.labels = labels
+        self.boxes = np.array([box[1:] for box in objects], dtype=np.float64).reshape(-1, 4)
+        self.difficult = np.array(difficult, dtype=bool)
+        return True
+
+    def parseTree(self, data):
+        # lxml is only imported for the files the fast extractor cannot read
+        from lxml import etree
+        root = etree.fromstring(data)
+        coords = []
+        difficult = []
+        for child in root.iterchildren():
+            if child.tag == 'object':
+                self.labels.append(child.findtext('name'))
+                bndbox = child.find('bndbox')
+                coords.extend((float(bndbox.findtext('xmin')), float(bndbox.findtext('ymin')),
+                               float(bndbox.findtext('xmax')), float(bndbox.findtext('ymax'))))
+                isDifficult = child.findtext('difficult')
+                difficult.append(bool(int(isDifficult)) if isDifficult is not None else False)
+            elif child.tag == 'filename':
+                self.filename = child.text
+            elif child.tag == 'size':
+                self.size = (int(child.findtext('width')), int(child.findtext('height')), int(child.findtext('depth')))
+
+        self.verified = root.get('verified') == 'yes'
+        self.boxes = np.array(coords, dtype=np.float64).reshape(-1, 4)
+        self.difficult = np.array(difficult, dtype=bool)
+
+    def parseXML(self):
+        assert self.filepath.endswith(XML_EXT), "Unsupport file format"
+        data = self.data if self.data is not None else read_file(self.filepath)
+        self.data = None
+        with stage('parse'):
+            if not self.parseFast(data):
+                self.parseTree(data)
+        count('boxes', len(self.boxes))
+        return True
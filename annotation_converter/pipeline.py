@@ -0,0 +1,123 @@
+"""
+Pipelined conversion for latency bound storage: reads run in a thread pool
+a bounded number of items ahead, the conversion runs in parallel_imap and
+the converted files are written by another thread pool, so the reads,
+the conversion and the writes of different files overlap. Memory is
+bounded by the queue depth: at most depth items read ahead, depth items
+in the worker processes and depth files queued for writing.
+"""
+import os
+import queue
+import threading
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+from .parallel import parallel_imap
+from .instrument import stage, count
+
+DEFAULT_THREADS = 8
+# Items read ahead of the conversion / files queued for writing
+DEFAULT_DEPTH = 64
+
+def write_file(path, data):
+    """
+        Write data to path, str in text mode and bytes in binary mode, with
+        a single write to a temporary file renamed over path, so path never
+        holds a partially written file.
+    """
+    tmp_path = path + '.tmp'
+    with stage('write'):
+        try:
+            with open(tmp_path, 'w' if isinstance(data, str) else 'wb') as f:
+                f.write(data)
+            os.replace(tmp_path, path)
+        except BaseException:
+            if os.path.exists(tmp_path):
+                os.remove(tmp_path)
+            raise
+    count('bytes_written', len(data))
+
+def prefetch(func, items, threads=DEFAULT_THREADS, depth=DEFAULT_DEPTH):
+    """
+        Yield func(item) for every item in order, computed by a pool of
+        threads at most depth items ahead of the consumer.
+    """
+    with ThreadPoolExecutor(threads) as executor:
+        pending = deque()
+        for item in items:
+            pending.append(executor.submit(func, item))
+            if len(pending) >= depth:
+                yield pending.popleft().result()
+        while pending:
+            yield pending.popleft().result()
+
+class WriterPool:
+    """
+        Write (path, data) pairs from a pool of threads, one file (written
+        with write_file) per job. write() blocks once depth files are queued.
+        The first error is raised by the next write() or close().
+    """
+
+    def __init__(self, threads=DEFAULT_THREADS, depth=DEFAULT_DEPTH):
+        self.queue = queue.Queue(depth)
+        self.error = None
+        self.threads = [threading.Thread(target=self.run, daemon=True) for _ in range(threads)]
+        for thread in self.threads:
+            thread.start()
+
+    def run(self):
+        while True:
+            job = self.queue.get()
+            if job is None:
+                return
+            try:
+                write_file(*job)
+            except BaseException as e:
+                if self.error is None:
+                    self.error = e
+
+    def write(self, path, data):
+        if self.error is not None:
+            raise self.error
+        self.queue.put((path, data))
+
+    def close(self):
+        # One stop marker per thread, a thread never takes more than one
+        for _ in self.threads:
+            self.queue.put(None)
+        for thread in self.threads:
+            thread.join()
+        if self.error is not None:
+            raise self.error
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        if exc_type is None:
+            self.close()
+        else:
+            for _ in self.threads:
+                self.queue.put(None)
+
+def pipeline_imap(read, compute, items, workers=1, threads=DEFAULT_THREADS, depth=DEFAULT_DEPTH):
+    """
+        Yield compute(read(item)) for every item in order. read (the I/O)
+        runs in threads ahead of compute, which runs in workers processes
+        fed as the reads complete.
+    """
+    chunksize = max(1, depth // (4 * max(1, workers or 1)))
+    return parallel_imap(compute, prefetch(read, items, threads, depth), workers, chunksize, depth)
+
+def pipeline_write(read, compute, items, workers=1, threads=DEFAULT_THREADS, depth=DEFAULT_DEPTH):
+    """
+        Write the (path, data) returned by compute(read(item)) for every
+        item, the files being written by a WriterPool of threads. read may
+        be None when the items need no reading.
+    """
+    if read is None:
+        results = parallel_imap(compute, items, workers)
+    else:
+        results = pipeline_imap(read, compute, items, workers, threads, depth)
+    with WriterPool(threads, depth) as writer:
+        for path, data in results:
+            writer.write(path, data)
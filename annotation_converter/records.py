@@ -0,0 +1,85 @@
+"""
+Compact annotation records. The boxes of an image are kept as a few typed
+arrays (struct-of-arrays) instead of a dict or tuple per box, which costs
+tens of bytes per box instead of hundreds and pickles as a few buffers
+between the worker processes.
+"""
+from array import array
+import numpy as np
+
+INTEGER_TYPES = (int, np.integer)
+
+class BoxList:
+    """
+        Boxes added one at a time (or in bulk) to a writer: xmin, ymin,
+        xmax, ymax per box in coords, a label (name or class index) and a
+        difficult flag per box. Coordinates given as integers are flagged
+        in integral and given back as integers, so they are written out the
+        same way.
+    """
+    __slots__ = ('coords', 'integral', 'labels', 'difficult')
+
+    def __init__(self):
+        self.coords = array('d')
+        self.integral = array('b')
+        self.labels = []
+        self.difficult = array('b')
+
+    def __len__(self):
+        return len(self.labels)
+
+    def add(self, xmin, ymin, xmax, ymax, label, difficult=False):
+        values = (xmin, ymin, xmax, ymax)
+        self.coords.extend(values)
+        self.integral.extend([isinstance(value, INTEGER_TYPES) for value in values])
+        self.labels.append(label)
+        self.difficult.append(1 if difficult else 0)
+
+    def extend(self, boxes, labels, difficult=None, integral=None):
+        """
+            Add N x 4 boxes with their N labels, difficult flags (none by
+            default) and N x 4 integral flags (none by default).
+        """
+        boxes = np.asarray(boxes, dtype=np.float64).reshape(-1, 4)
+        self.coords.frombytes(boxes.tobytes())
+        if integral is None:
+            integral = np.zeros(boxes.shape, dtype=np.int8)
+        self.integral.frombytes(np.asarray(integral, dtype=np.int8).tobytes())
+        self.labels.extend(labels)
+        if difficult is None:
+            difficult = np.zeros(len(boxes), dtype=np.int8)
+        self.difficult.frombytes(np.asarray(difficult, dtype=np.int8).tobytes())
+
+    def boxes(self):
+        """
+            N x 4 float array of the coordinates (a view, no copy).
+        """
+        return np.frombuffer(self.coords, dtype=np.float64).reshape(-1, 4)
+
+    def __iter__(self):
+        """
+            Yield (xmin, ymin, xmax, ymax, label, difficult) of every box.
+        """
+        coords = [int(value) if flag else value for value, flag in zip(self.coords.tolist(), self.integral.tolist())]
+        for index, (label, difficult) in enumerate(zip(self.labels, self.difficult.tolist())):
+            xmin, ymin, xmax, ymax = coords[4 * index:4 * index + 4]
+            yield xmin, ymin, xmax, ymax, label, bool(difficult)
+
+class CocoBoxes:
+    """
+        The COCO boxes of one image: category ids and N x 4 min_x, min_y,
+        width, height. Iterating yields (category_id, min_x, min_y, width,
+        height) tuples.
+    """
+    __slots__ = ('category_ids', 'boxes')
+
+    def __init__(self, category_ids=(), boxes=()):
+        self.category_ids = np.asarray(category_ids, dtype=np.int64).reshape(-1)
+        self.boxes = np.asarray(boxes, dtype=np.float64).reshape(-1, 4)
+
+    def __len__(self):
+        return len(self.category_ids)
+
+    def __iter__(self):
+        for category_id, box in zip(self.category_ids.tolist(), self.boxes.tolist()):
+            yield (category_id,) + tuple(box)
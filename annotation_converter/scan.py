@@ -0,0 +1,127 @@
+"""
+Directory scanning for the converters. One os.scandir pass per folder
+classifies the entries by extension and pairs images, YOLO txt files and
+PascalVOC xml files by key (the path relative to the scanned folder without
+extension), so a.png pairs with a.txt and a.xml. Only the directory entries
+are read: no file is opened or stat'ed, and orphans (e.g. a txt file
+without an image) are known from the index alone.
+"""
+import os
+import sys
+from .instrument import stage
+
+IMAGE_EXTS = ('.jpg', '.jpeg', '.png', '.bmp', '.tif', '.tiff', '.webp')
+LABEL_EXT = '.txt'
+XML_EXT = '.xml'
+KINDS = ('image', 'label', 'xml')
+
+def file_kind(name):
+    """
+        'image', 'label', 'xml' or None, from the (case insensitive) extension.
+    """
+    ext = os.path.splitext(name)[1].lower()
+    if ext in IMAGE_EXTS:
+        return 'image'
+    if ext == LABEL_EXT:
+        return 'label'
+    if ext == XML_EXT:
+        return 'xml'
+    return None
+
+class Sample:
+    """
+        The files of one image: names relative to their scanned folder of
+        the image, the YOLO txt and the PascalVOC xml (None when missing).
+    """
+    __slots__ = ('key', 'image', 'label', 'xml')
+
+    def __init__(self, key):
+        self.key = key
+        self.image = None
+        self.label = None
+        self.xml = None
+
+    def __repr__(self):
+        return "Sample(%r, image=%r, label=%r, xml=%r)" % (self.key, self.image, self.label, self.xml)
+
+class Index:
+    """
+        Samples by key. ordered(kind) lists the samples having a file of
+        that kind in the order those files were scanned (the os.listdir
+        order, folders as os.walk visits them).
+    """
+
+    def __init__(self):
+        self.samples = {}
+        self.order = {kind: [] for kind in KINDS}
+        # Files whose key already has a file of the same kind (a.jpg and
+        # a.png), listed by ordered(kind) on their own but not paired
+        self.duplicates = []
+
+    def __len__(self):
+        return len(self.samples)
+
+    def add(self, kind, name):
+        key = os.path.splitext(name)[0]
+        sample = self.samples.get(key)
+        if sample is None:
+            sample = self.samples[key] = Sample(key)
+        elif getattr(sample, kind) is not None:
+            self.duplicates.append(name)
+            sample = Sample(key)
+        setattr(sample, kind, name)
+        self.order[kind].append(sample)
+
+    def ordered(self, kind, required=()):
+        """
+            Samples with a file of kind (and of every required kind).
+        """
+        return [sample for sample in self.order[kind] if all(getattr(sample, other) is not None for other in required)]
+
+    def orphans(self, kind, required):
+        """
+            Names of the files of kind whose sample misses a required kind.
+        """
+        return [getattr(sample, kind) for sample in self.order[kind] if getattr(sample, required) is None]
+
+def scan(folder, kinds=KINDS, recursive=False, index=None):
+    """
+        Add the files of kinds found in folder (and its subfolders when
+        recursive) to index (a new Index by default) and return it.
+    """
+    if index is None:
+        index = Index()
+    with stage('list'):
+        _scan(folder, "", set(kinds), recursive, index)
+    return index
+
+def _scan(folder, prefix, kinds, recursive, index):
+    subfolders = []
+    with os.scandir(folder) as entries:
+        for entry in entries:
+            # d_type of the directory entry, no stat on most file systems
+            if entry.is_dir():
+                if recursive and not entry.is_symlink():
+                    subfolders.append(entry.name)
+                continue
+            kind = file_kind(entry.name)
+            if kind in kinds:
+                index.add(kind, prefix + entry.name)
+    # Files of a folder come before those of its subfolders, as with os.walk
+    for name in subfolders:
+        _scan(os.path.join(folder, name), prefix + name + "/", kinds, recursive, index)
+
+def walk_path(folder, name):
+    """
+        Path of a scanned file name joined as os.walk would (folder + "/"
+        + file for the top folder).
+    """
+    subfolder, file = os.path.split(name)
+    return (os.path.join(folder, subfolder) if subfolder else folder) + "/" + file
+
+def warn_orphans(names, message):
+    """
+        Print how many files are skipped, with an example, to stderr.
+    """
+    if names:
+        print("Warning: %d %s, skipped (e.g. %s)" % (len(names), message, names[0]), file=sys.stderr)
@@ -0,0 +1,78 @@
+"""
+Sharded conversion: with --shard i/N a converter only processes the inputs
+whose file name hashes to shard i of N (0 <= i < N), so N jobs on different
+machines convert disjoint slices of a dataset. The per-shard COCO json files
+are combined with merge_coco (mergecoco.py).
+"""
+import os
+import sys
+import zlib
+import argparse
+from .cocoio import CocoJsonWriter, CocoStreamReader
+
+def parse_shard(text):
+    """
+        argparse type of --shard: "i/N" -> (i, N)
+    """
+    try:
+        index, count = (int(value) for value in text.split('/'))
+    except ValueError:
+        raise argparse.ArgumentTypeError("shard must be i/N, e.g. 0/8, got '%s'" % text) from None
+    if count < 1 or not 0 <= index < count:
+        raise argparse.ArgumentTypeError("shard index must be in 0..N-1, got '%s'" % text)
+    return index, count
+
+def in_shard(name, shard):
+    """
+        True if the file name belongs to shard (index, count). The hash
+        does not depend on the folder or the machine.
+    """
+    if shard is None:
+        return True
+    index, count = shard
+    return zlib.crc32(os.path.basename(name).encode('utf-8')) % count == index
+
+def select_shard(names, shard):
+    return [name for name in names if in_shard(name, shard)]
+
+def shard_name(name, shard):
+    """
+        Name of a per-shard output (or manifest), name itself when not sharded.
+    """
+    if shard is None:
+        return name
+    return "%s.shard%dof%d" % (name, shard[0], shard[1])
+
+def merge_coco(shard_paths, output_path):
+    """
+        Combine COCO json files with the same categories into output_path.
+        Images and annotations are renumbered in file order (image ids from
+        0, annotation ids from 1) so the ids are unique across the shards.
+        Return (number of images, number of annotations).
+    """
+    if not shard_paths:
+        raise ValueError("No COCO json file to merge")
+    writer = None
+    image_id = 0
+    annotation_id = 1
+    try:
+        for shard_path in shard_paths:
+            with CocoStreamReader(shard_path) as reader:
+                if writer is None:
+                    categories = reader.categories
+                    writer = CocoJsonWriter(output_path, categories)
+                elif reader.categories != categories:
+                    raise ValueError("%s has different categories than %s" % (shard_path, shard_paths[0]))
+                for img, anns in reader.iterImages():
+                    writer.addImage(dict(img, id=image_id))
+                    for ann in anns:
+                        writer.addAnnotation(dict(ann, id=annotation_id, image_id=image_id))
+                        annotation_id += 1
+                    image_id += 1
+    except BaseException:
+        if writer is not None:
+            writer.__exit__(*sys.exc_info())
+        raise
+    if writer is not None:
+        writer.close()
+    return image_id, annotation_id - 1
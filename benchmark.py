@@ -0,0 +1,208 @@
+import os
+import sys
+import json
+import time
+import random
+import shutil
+import argparse
+import tempfile
+import subprocess
+
+SCRIPT_DIR = os.path.dirname(os.path.abspath(__file__))
+PATHS = ('yolo2coco', 'yolo2pascal', 'pascal2coco', 'pascal2yolo', 'coco2yolo', 'coco2pascal')
+
+def parse_sizes(text):
+    """
+        "640x480,1280x720" -> [(640, 480), (1280, 720)] (width x height)
+    """
+    return [tuple(int(value) for value in size.split('x')) for size in text.split(',')]
+
+def encode_image(width, height):
+    import cv2
+    import numpy as np
+    ok, data = cv2.imencode('.jpg', np.zeros((height, width, 3), dtype=np.uint8))
+    if not ok:
+        raise IOError("Cannot encode a %dx%d jpeg" % (width, height))
+    return data.tobytes()
+
+def generate_dataset(output_directory, num_images, boxes_per_image, num_classes, sizes, seed=0):
+    """
+        Write num_images blank jpegs of the given (width, height) sizes with
+        random YOLO labels and an obj.names of num_classes classes to
+        output_directory/images. Return the number of boxes.
+    """
+    rng = random.Random(seed)
+    image_folder = os.path.join(output_directory, 'images')
+    os.makedirs(image_folder, exist_ok=True)
+    with open(os.path.join(output_directory, 'obj.names'), 'w') as f:
+        for index in range(num_classes):
+            f.write("class_%d\n" % index)
+
+    images = {size: encode_image(*size) for size in sizes}
+    num_boxes = 0
+    for index in range(num_images):
+        size = sizes[index % len(sizes)]
+        name = os.path.join(image_folder, "%08d" % index)
+        with open(name + '.jpg', 'wb') as f:
+            f.write(images[size])
+        lines = []
+        for _ in range(rng.randint(max(0, boxes_per_image // 2), boxes_per_image * 3 // 2 or 1)):
+            w, h = rng.uniform(0.02, 0.5), rng.uniform(0.02, 0.5)
+            x, y = rng.uniform(w / 2, 1 - w / 2), rng.uniform(h / 2, 1 - h / 2)
+            lines.append("%d %.6f %.6f %.6f %.6f\n" % (rng.randrange(num_classes), x, y, w, h))
+        with open(name + '.txt', 'w') as f:
+            f.write("".join(lines))
+        num_boxes += len(lines)
+    return num_boxes
+
+def link_images(source_folder, target_folder):
+    """
+        Image folder for the converters that write labels next to the images.
+    """
+    os.makedirs(target_folder, exist_ok=True)
+    for file in os.listdir(source_folder):
+        if file.endswith('.jpg'):
+            try:
+                os.symlink(os.path.abspath(os.path.join(source_folder, file)), os.path.join(target_folder, file))
+            except OSError:
+                shutil.copyfile(os.path.join(source_folder, file), os.path.join(target_folder, file))
+
+def path_commands(extra_args):
+    """
+        Return (path, script arguments, image folder to prepare) in run order,
+        every path reads the output of an earlier one.
+    """
+    return [
+        ('yolo2coco', ['-p', 'images', '-l', 'obj.names', '-o', 'y2c'] + extra_args, None),
+        ('yolo2pascal', ['-p', 'images', '-l', 'obj.names', '-o', 'y2p'] + extra_args, None),
+        ('pascal2coco', ['-v', 'y2p', '-l', 'obj.names', '-o', 'p2c'] + extra_args, None),
+        ('pascal2yolo', ['-p', 'images_p2y', '-v', 'y2p', '-l', 'obj.names'] + extra_args, 'images_p2y'),
+        ('coco2yolo', ['-p', 'images_c2y', '-j', 'y2c.json'] + extra_args, 'images_c2y'),
+        ('coco2pascal', ['-p', 'images', '-j', 'y2c.json', '-o', 'c2p'] + extra_args, None),
+    ]
+
+def run_script(script_path, args, cwd):
+    """
+        Run a conversion script, return (wall seconds, user, sys, peak RSS in MB).
+    """
+    # stderr goes to a file, a pipe would block a child writing more than the
+    # pipe buffer before it is read
+    with tempfile.TemporaryFile() as stderr_file:
+        start = time.time()
+        process = subprocess.Popen([sys.executable, script_path] + args, cwd=cwd,
+                                   stdout=subprocess.DEVNULL, stderr=stderr_file)
+        # wait4 gives the resource usage of this child only
+        _, status, usage = os.wait4(process.pid, 0)
+        seconds = time.time() - start
+        process.returncode = os.waitstatus_to_exitcode(status)
+        stderr_file.seek(0)
+        stderr = stderr_file.read().decode('utf-8', 'replace')
+    if process.returncode != 0:
+        raise RuntimeError("%s %s failed:\n%s" % (os.path.basename(script_path), ' '.join(args), stderr))
+    # ru_maxrss is in kilobytes on Linux and bytes on macOS
+    peak_rss = usage.ru_maxrss / (1 << 20 if sys.platform == 'darwin' else 1 << 10)
+    return seconds, usage.ru_utime, usage.ru_stime, peak_rss
+
+def run_benchmark(output_directory, num_images=1000, boxes_per_image=5, num_classes=80, sizes=((640, 480),),
+                  paths=PATHS, scripts_dir=SCRIPT_DIR, extra_args=(), repeat=1, seed=0, script_reports=False):
+    """
+        Generate a synthetic dataset in output_directory and time every
+        conversion path on it. Return the report as a dict. With
+        script_reports the stage timings and counters reported by the
+        scripts themselves (--report) are included.
+    """
+    sizes = list(sizes)
+    stages = {}
+    start = time.time()
+    num_boxes = generate_dataset(output_directory, num_images, boxes_per_image, num_classes, sizes, seed)
+    stages['generate'] = time.time() - start
+
+    results = []
+    for path, args, image_folder in path_commands(list(extra_args)):
+        if image_folder is not None:
+            start = time.time()
+            link_images(os.path.join(output_directory, 'images'), os.path.join(output_directory, image_folder))
+            stages['prepare_' + path] = time.time() - start
+        report_path = os.path.join(output_directory, path + '_report.json')
+        if script_reports:
+            args = args + ['--report', os.path.abspath(report_path)]
+        # Later paths read the outputs of earlier ones, so they always run
+        runs = []
+        for _ in range(repeat if path in paths else 1):
+            run = run_script(os.path.join(scripts_dir, path + '.py'), args, output_directory)
+            script_report = None
+            if script_reports:
+                with open(report_path, 'r') as f:
+                    script_report = json.load(f)
+            runs.append((run, script_report))
+        if path not in paths:
+            continue
+        (seconds, user, system, peak_rss), script_report = min(runs, key=lambda run: run[0][0])
+        result = {
+            'path': path,
+            'seconds': seconds,
+            'user_seconds': user,
+            'system_seconds': system,
+            'files_per_s': num_images / seconds,
+            'boxes_per_s': num_boxes / seconds,
+            'peak_rss_mb': peak_rss,
+            'runs': [run[0][0] for run in runs],
+        }
+        if script_report is not None:
+            result['stages'] = script_report['stages']
+            result['counters'] = script_report['counters']
+        results.append(result)
+        stages[path] = seconds
+
+    return {
+        'config': {
+            'images': num_images,
+            'boxes': num_boxes,
+            'boxes_per_image': boxes_per_image,
+            'classes': num_classes,
+            'sizes': ['%dx%d' % size for size in sizes],
+            'scripts': os.path.abspath(scripts_dir),
+            'args': list(extra_args),
+            'repeat': repeat,
+            'seed': seed,
+            'python': sys.version.split()[0],
+        },
+        'stages': stages,
+        'results': results,
+    }
+
+def get_args():
+    parser = argparse.ArgumentParser('Benchmark of the six conversion paths on a synthetic dataset')
+    parser.add_argument('-n', '--images', default=1000, type=int, help='Number of images to generate')
+    parser.add_argument('-b', '--boxes', default=5, type=int, help='Average number of boxes per image')
+    parser.add_argument('-c', '--classes', default=80, type=int, help='Number of classes')
+    parser.add_argument('--sizes', default="640x480", type=str, help='Comma separated image sizes (WIDTHxHEIGHT) used in turn')
+    parser.add_argument('-d', '--directory', default="benchmark", type=str, help='Directory to generate the dataset and outputs in (must not exist)')
+    parser.add_argument('--paths', default=list(PATHS), choices=PATHS, nargs='+', help='Conversion paths to report')
+    parser.add_argument('--scripts', default=SCRIPT_DIR, type=str, help='Directory containing the conversion scripts to benchmark (e.g. an older checkout)')
+    parser.add_argument('--args', default="", type=str, help='Extra arguments passed to every script, e.g. "-w 4"')
+    parser.add_argument('-r', '--repeat', default=1, type=int, help='Number of runs per path, the fastest is reported')
+    parser.add_argument('--seed', default=0, type=int, help='Random seed of the generated labels')
+    parser.add_argument('-o', '--output', type=str, help='Json report file (printed when omitted)')
+    parser.add_argument('--script-reports', action='store_true', help='Include the stage timings and counters reported by the scripts (--report), not supported by older checkouts')
+    parser.add_argument('--keep', action='store_true', help='Keep the generated directory')
+
+    args = parser.parse_args()
+    if os.path.exists(args.directory):
+        parser.error("%s already exists" % args.directory)
+    return args
+
+if __name__ == '__main__':
+    opt = get_args()
+    try:
+        report = run_benchmark(opt.directory, opt.images, opt.boxes, opt.classes, parse_sizes(opt.sizes), opt.paths,
+                               opt.scripts, opt.args.split(), opt.repeat, opt.seed, opt.script_reports)
+    finally:
+        if not opt.keep:
+            shutil.rmtree(opt.directory, ignore_errors=True)
+    text = json.dumps(report, indent=2)
+    if opt.output:
+        with open(opt.output, 'w') as f:
+            f.write(text + "\n")
+    else:
+        print(text)
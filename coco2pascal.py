@@ -1,170 +1,139 @@
-from pycocotools.coco import COCO
-import requests
 import os
 import argparse
-from xml.etree import ElementTree
-from xml.etree.ElementTree import Element, SubElement
-from lxml import etree
-import codecs
-import cv2
 import time
+from functools import partial
+from annotation_converter.parallel import parallel_imap
+from annotation_converter.pipeline import pipeline_write
+from annotation_converter.cocoio import CocoStreamReader, create_labelsfile
+from annotation_converter.shard import parse_shard, in_shard, shard_name
+from annotation_converter.manifest import Manifest, MANIFEST_NAME, content_digest
+from annotation_converter.imagesize import get_image_size, set_image_cache
+from annotation_converter.pascalvoc import PascalVocWriter
+from annotation_converter.bbox import coco_to_xyxy, coco_integral
+from annotation_converter import instrument
+from annotation_converter.instrument import stage, count
 
 XML_EXT = '.xml'
 ENCODE_METHOD = 'utf-8'
-
-class PascalVocWriter:
-
-    def __init__(self, foldername, filename, imgSize,databaseSrc='detection_objects', localImgPath=None):
-        self.foldername = foldername
-        self.filename = filename
-        self.databaseSrc = databaseSrc
-        self.imgSize = imgSize
-        self.boxlist = []
-        self.localImgPath = localImgPath
-        self.verified = False
-
-    def prettify(self, elem):
-        """
-            Return a pretty-printed XML string for the Element.
-        """
-        rough_string = ElementTree.tostring(elem, 'utf8')
-        root = etree.fromstring(rough_string)
-        return etree.tostring(root, pretty_print=True, encoding=ENCODE_METHOD).replace("  ".encode(), "\t".encode())
-
-    def genXML(self):
-        """
-            Return XML root
-        """
-        # Check conditions
-        if self.filename is None or \
-                self.foldername is None or \
-                self.imgSize is None:
-            return None
-
-        top = Element('annotation')
-        if self.verified:
-            top.set('verified', 'yes')
-
-        folder = SubElement(top, 'folder')
-        folder.text = self.foldername
-
-        filename = SubElement(top, 'filename')
-        filename.text = self.filename
-
-        if self.localImgPath is not None:
-            localImgPath = SubElement(top, 'path')
-            localImgPath.text = self.localImgPath
-
-        source = SubElement(top, 'source')
-        database = SubElement(source, 'database')
-        database.text = self.databaseSrc
-
-        size_part = SubElement(top, 'size')
-        width = SubElement(size_part, 'width')
-        height = SubElement(size_part, 'height')
-        depth = SubElement(size_part, 'depth')
-        width.text = str(self.imgSize[1])
-        height.text = str(self.imgSize[0])
-        if len(self.imgSize) == 3:
-            depth.text = str(self.imgSize[2])
-        else:
-            depth.text = '1'
-
-        segmented = SubElement(top, 'segmented')
-        segmented.text = '0'
-        return top
-
-    def addBndBox(self, xmin, ymin, xmax, ymax, name, difficult):
-        bndbox = {'xmin': xmin, 'ymin': ymin, 'xmax': xmax, 'ymax': ymax}
-        bndbox['name'] = name
-        bndbox['difficult'] = difficult
-        self.boxlist.append(bndbox)
-
-    def appendObjects(self, top):
-        for each_object in self.boxlist:
-            object_item = SubElement(top, 'object')
-            name = SubElement(object_item, 'name')
-            name.text = each_object['name']
-            pose = SubElement(object_item, 'pose')
-            pose.text = "Unspecified"
-            truncated = SubElement(object_item, 'truncated')
-            if int(each_object['ymax']) == int(self.imgSize[0]) or (int(each_object['ymin'])== 1):
-                truncated.text = "1" # max == height or min
-            elif (int(each_object['xmax'])==int(self.imgSize[1])) or (int(each_object['xmin'])== 1):
-                truncated.text = "1" # max == width or min
-            else:
-                truncated.text = "0"
-            difficult = SubElement(object_item, 'difficult')
-            difficult.text = str( bool(each_object['difficult']) & 1 )
-            bndbox = SubElement(object_item, 'bndbox')
-            xmin = SubElement(bndbox, 'xmin')
-            xmin.text = str(each_object['xmin'])
-            ymin = SubElement(bndbox, 'ymin')
-            ymin.text = str(each_object['ymin'])
-            xmax = SubElement(bndbox, 'xmax')
-            xmax.text = str(each_object['xmax'])
-            ymax = SubElement(bndbox, 'ymax')
-            ymax.text = str(each_object['ymax'])
-
-    def save(self, targetFile=None):
-        root = self.genXML()
-        self.appendObjects(root)
-        out_file = None
-        if targetFile is None:
-            out_file = codecs.open(
-                self.filename + XML_EXT, 'w', encoding=ENCODE_METHOD)
-        else:
-            out_file = codecs.open(targetFile, 'w', encoding=ENCODE_METHOD)
-
-        prettifyResult = self.prettify(root)
-        out_file.write(prettifyResult.decode('utf8'))
-        out_file.close()
-
-def create_labelsfile(coco):
-    cats = coco.loadCats(coco.getCatIds())
-    classes = [cat['name'] for cat in cats]
-    filename = "obj.names"
-    with open(filename, 'w') as f:
-        for cat in classes:
-            f.write("%s\n" % cat)
-    f.close()
-    return classes
-
-def create_pascalfromcoco(imagefolder_path, cocojson_path, output_directory):
+# COCO json does not store the number of channels
+DEFAULT_DEPTH = 3
+
+def get_imagesize(img, imagePath, verify_images=False):
+    """
+        Return (height, width, depth) of a COCO image entry. The width/height
+        stored in the json is used unless it is missing or verify_images is
+        set, in which case the image file header is read.
+    """
+    has_size = img.get('width') is not None and img.get('height') is not None
+    if has_size and not verify_images:
+        return (img['height'], img['width'], DEFAULT_DEPTH)
+
+    imgSize = get_image_size(imagePath)
+    if has_size and tuple(imgSize[:2]) != (img['height'], img['width']):
+        print("Warning: size of " + imagePath + " is " + str(imgSize[1]) + "x" + str(imgSize[0]) +
+              " but COCO json has " + str(img['width']) + "x" + str(img['height']))
+    return imgSize
+
+def pascalfile_writer(image_anns, imagefolder_path, verify_images=False):
+    """
+        Return the PascalVocWriter of an image and its annotations.
+    """
+    img, anns = image_anns
+    imgFileName = img['file_name']
+    imagePath = os.path.join(imagefolder_path, imgFileName)
+    imgFolderName = os.path.basename(imagefolder_path)
+
+    imgSize = get_imagesize(img, imagePath, verify_images)
+    writer = PascalVocWriter(imgFolderName, imgFileName, imgSize, localImgPath=imagePath)
+
+    with stage('convert'):
+        bboxes = [bbox for label, bbox in anns]
+        # Integer values of a mixed image stay integers in the xml
+        writer.addBndBoxes(coco_to_xyxy(bboxes), [label for label, bbox in anns], None, coco_integral(bboxes))
+    count('boxes', len(anns))
+    return writer
+
+def write_pascalfile(image_anns, imagefolder_path, output_directory, verify_images=False):
+    writer = pascalfile_writer(image_anns, imagefolder_path, verify_images)
+    annotation_no_txt = os.path.splitext(image_anns[0]['file_name'])[0]
+    writer.save(targetFile= output_directory+ "/" + annotation_no_txt + ".xml")
+
+def pascalfile_data(image_anns, imagefolder_path, output_directory, verify_images=False):
+    """
+        Return (xml path, xml content) of an image and its annotations.
+    """
+    writer = pascalfile_writer(image_anns, imagefolder_path, verify_images)
+    annotation_no_txt = os.path.splitext(image_anns[0]['file_name'])[0]
+    return output_directory+ "/" + annotation_no_txt + ".xml", writer.toBytes()
+
+def pascalfile_dependencies(image_anns, imagefolder_path, output_directory, verify_images=False):
+    img, anns = image_anns
+    imagePath = os.path.join(imagefolder_path, img['file_name'])
+    annotation_no_txt = os.path.splitext(img['file_name'])[0]
+    # The json is one file, each image is tracked by the digest of its own entries
+    digest = content_digest([img['file_name'], img.get('width'), img.get('height'), anns, verify_images])
+    # The image is only read when its size is verified or missing
+    read_image = verify_images or img.get('width') is None or img.get('height') is None
+    return {'key': img['file_name'], 'images': [imagePath] if read_image else [],
+            'outputs': [output_directory + "/" + annotation_no_txt + ".xml"], 'digest': digest}
+
+def write_pascalfiles(cats, image_anns, imagefolder_path, output_directory, verify_images=False, workers=1, incremental=False, io_threads=0, shard=None):
+    create_labelsfile(cats)
+    catNames = {cat['id']: cat['name'] for cat in cats}
+    image_anns = ((img, [(catNames[ann["category_id"]], ann['bbox']) for ann in anns]) for img, anns in image_anns if in_shard(img['file_name'], shard))
+
+    write = partial(write_pascalfile, imagefolder_path=imagefolder_path, output_directory=output_directory, verify_images=verify_images)
+
+    def write_all(image_anns):
+        if io_threads:
+            # Files are written by threads while the next ones are converted
+            convert = partial(pascalfile_data, imagefolder_path=imagefolder_path, output_directory=output_directory, verify_images=verify_images)
+            pipeline_write(None, convert, image_anns, workers, io_threads)
+            return
+        for _ in parallel_imap(write, image_anns, workers):
+            pass
+
+    if not incremental:
+        write_all(image_anns)
+        return
+
+    # Only write the xml files of the images changed since the last run
+    manifest = Manifest(os.path.join(output_directory, MANIFEST_NAME % shard_name('coco2pascal', shard)))
+    dependencies = partial(pascalfile_dependencies, imagefolder_path=imagefolder_path, output_directory=output_directory, verify_images=verify_images)
+    converted, removed = manifest.convertChanged(image_anns, dependencies, write_all)
+    print("%d files converted, %d removed" % (converted, len(removed)))
+
+def create_pascalfromcoco(imagefolder_path, cocojson_path, output_directory, verify_images=False, workers=1, stream=False, incremental=False, io_threads=0, shard=None):
     os.makedirs(output_directory, exist_ok=True)
 
-    coco = COCO(cocojson_path)
-    create_labelsfile(coco)
-    imgIds = coco.getImgIds()
-    for i in imgIds:
-        img = coco.loadImgs(i)[0]
-        imgFileName = img['file_name']
-        imagePath = os.path.join(imagefolder_path, imgFileName)
-        annotation_no_txt = os.path.splitext(imgFileName)[0]
-        imgFolderName = os.path.basename(imagefolder_path)
-
-        image = cv2.imread(imagePath)
-        writer = PascalVocWriter(imgFolderName, imgFileName, image.shape, localImgPath=imagePath)
-
-        annIds = coco.getAnnIds(imgIds=i)
-        anns = coco.loadAnns(annIds)
-        for ann in anns:
-            label = coco.loadCats(ann["category_id"])[0]['name']
-            bbox = ann['bbox']
-            xmin = bbox[0]
-            ymin = bbox[1]
-            x_max = bbox[2] + bbox[0]
-            y_max = bbox[3] + bbox[1]
-
-            writer.addBndBox(xmin, ymin, x_max, y_max, label, 0)
-
-        writer.save(targetFile= output_directory+ "/" + annotation_no_txt + ".xml")
+    count('bytes_read', os.path.getsize(cocojson_path))
+    if stream:
+        with stage('parse'):
+            reader = CocoStreamReader(cocojson_path)
+        with reader:
+            write_pascalfiles(reader.categories, reader.iterImages(), imagefolder_path, output_directory, verify_images, workers, incremental, io_threads, shard)
+        return
+
+    # pycocotools is only imported when the json is loaded whole
+    from pycocotools.coco import COCO
+    with stage('parse'):
+        coco = COCO(cocojson_path)
+    image_anns = [(coco.imgs[i], coco.imgToAnns.get(i, [])) for i in coco.getImgIds()]
+    write_pascalfiles(coco.loadCats(coco.getCatIds()), image_anns, imagefolder_path, output_directory, verify_images, workers, incremental, io_threads, shard)
 
 def get_args():
     parser = argparse.ArgumentParser('COCO annotations to ParscalVOC annotation converter helper')
     parser.add_argument('-p', '--path', type=str, required=True, help='(Absolute) path for folder containing image files')
     parser.add_argument('-j', '--json', type=str, required=True ,help='(Absolute) path to COCO annotated json file')
     parser.add_argument('-o', '--output', default="pascal", type=str, help='Name of the directory to store PascalVOC VML files')
+    parser.add_argument('--verify', action='store_true', help='Read image files to verify the COCO width/height and detect depth')
+    parser.add_argument('-s', '--stream', action='store_true', help='Stream the json instead of loading it whole with pycocotools (for very large files)')
+    parser.add_argument('--image-cache', type=str, help='Path to an image size cache file (created if missing), images are only read when not cached or changed')
+    parser.add_argument('-w', '--workers', default=1, type=int, help='Number of worker processes used for the conversion')
+    parser.add_argument('-t', '--io-threads', default=0, type=int, help='Write the xml files with N threads while the next ones are converted (for network storage)')
+    parser.add_argument('-i', '--incremental', action='store_true', help='Only write the xml files of the images changed since the last incremental run and remove those of deleted images')
+    parser.add_argument('--shard', type=parse_shard, help='Only convert shard i/N of the inputs (selected by a hash of the file name), for distributing a conversion over N jobs')
+    instrument.add_arguments(parser)
 
     args = parser.parse_args()
     return args
@@ -172,9 +141,12 @@ def get_args():
 if __name__ == '__main__':
     start = time.time()
     opt = get_args()
+    if opt.image_cache:
+        set_image_cache(opt.image_cache)
     imagefolder_path = opt.path
     cocojson_path = opt.json
     output_directory = opt.output
-    create_pascalfromcoco(imagefolder_path, cocojson_path, output_directory)
+    with instrument.Run(opt):
+        create_pascalfromcoco(imagefolder_path, cocojson_path, output_directory, opt.verify, opt.workers, opt.stream, opt.incremental, opt.io_threads, opt.shard)
     print("COCO annotation converted to PascalVOC annotations in: " + output_directory+" folder")
     print("Conversion processed in " + str(float(time.time()-start)) + " seconds")
\ No newline at end of file
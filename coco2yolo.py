@@ -1,66 +1,94 @@
-from pycocotools.coco import COCO
-import requests
 import os
 import argparse
 import time
+from functools import partial
+from annotation_converter.parallel import parallel_imap
+from annotation_converter.pipeline import pipeline_write, write_file
+from annotation_converter.cocoio import CocoStreamReader, create_labelsfile
+from annotation_converter.shard import parse_shard, in_shard, shard_name
+from annotation_converter.manifest import Manifest, MANIFEST_NAME, content_digest
+from annotation_converter.bbox import coco_to_yolo
+from annotation_converter.yololabels import format_labels
+from annotation_converter import instrument
+from annotation_converter.instrument import stage, count
 
-def create_labelsfile(coco):
-    cats = coco.loadCats(coco.getCatIds())
-    classes = [cat['name'] for cat in cats]
-    filename = "obj.names"
-    with open(filename, 'w') as f:
-        for cat in classes:
-            f.write("%s\n" % cat)
-    f.close()
-    return classes
+def yolofile_data(image_anns, imagefolder_path, catIndex):
+    """
+        Return (txt path, txt content) of an image and its annotations.
+    """
+    im, anns = image_anns
+    with stage('convert'):
+        yolo = coco_to_yolo([ann["bbox"] for ann in anns], im['width'], im['height'], 7)
+        # %r is str() of the rounded values
+        data = format_labels([catIndex[ann["category_id"]] for ann in anns], yolo, "%r")
+    count('boxes', len(anns))
 
-def truncate(n, decimals=0):
-    multiplier = 10 ** decimals
-    return int(n * multiplier) / multiplier
+    filename = os.path.splitext(im['file_name'])[0] + ".txt"
+    return os.path.join(imagefolder_path, filename), data
 
-def create_yolofromcoco(cocojson_path, imagefolder_path):
-    coco = COCO(cocojson_path)
-    classes = create_labelsfile(coco)
-    for cat in classes:
-        catIds = coco.getCatIds(catNms=[cat])
-        imgIds = coco.getImgIds(catIds=catIds)
-        images = coco.loadImgs(imgIds)
-        for im in images:
-            dw = 1. / im['width']
-            dh = 1. / im['height']
+def write_yolofile(image_anns, imagefolder_path, catIndex):
+    # Each label file is written once with all of its categories
+    write_file(*yolofile_data(image_anns, imagefolder_path, catIndex))
 
-            annIds = coco.getAnnIds(imgIds=im['id'], catIds=catIds, iscrowd=None)
-            anns = coco.loadAnns(annIds)
-            
-            filename = im['file_name'].replace(".jpg", ".txt")
-            with open(imagefolder_path + "/" + filename, "a") as f:
-                for i in range(len(anns)):
-                    xmin = anns[i]["bbox"][0]
-                    ymin = anns[i]["bbox"][1]
-                    xmax = anns[i]["bbox"][2] + anns[i]["bbox"][0]
-                    ymax = anns[i]["bbox"][3] + anns[i]["bbox"][1]
-                    
-                    x = (xmin + xmax)/2
-                    y = (ymin + ymax)/2
-                    
-                    w = xmax - xmin
-                    h = ymax-ymin
-                    
-                    x = x * dw
-                    w = w * dw
-                    y = y * dh
-                    h = h * dh
-                    catno = catIds[0]-1
-                    mystring = str(str(catno)+" " + str(truncate(x, 7)) + " " + str(truncate(y, 7)) + " " + str(truncate(w, 7)) + " " + str(truncate(h, 7)))
-                    f.write(mystring)
-                    f.write("\n")
+def yolofile_dependencies(image_anns, imagefolder_path, catIndex):
+    im, anns = image_anns
+    filename = os.path.splitext(im['file_name'])[0] + ".txt"
+    # The json is one file, each image is tracked by the digest of its own entries
+    digest = content_digest([im['file_name'], im['width'], im['height'],
+                             [(catIndex[ann["category_id"]], ann["bbox"]) for ann in anns]])
+    return {'key': im['file_name'], 'outputs': [os.path.join(imagefolder_path, filename)], 'digest': digest}
 
-            f.close()
+def write_yolofiles(cats, image_anns, imagefolder_path, workers=1, incremental=False, io_threads=0, shard=None):
+    create_labelsfile(cats)
+    # COCO category id -> line number in obj.names
+    catIndex = {cat['id']: index for index, cat in enumerate(cats)}
+
+    def write_all(image_anns):
+        if io_threads:
+            # Files are written by threads while the next ones are converted
+            pipeline_write(None, partial(yolofile_data, imagefolder_path=imagefolder_path, catIndex=catIndex), image_anns, workers, io_threads)
+            return
+        for _ in parallel_imap(partial(write_yolofile, imagefolder_path=imagefolder_path, catIndex=catIndex), image_anns, workers):
+            pass
+
+    if not incremental:
+        write_all(image_anns)
+        return
+
+    # Only write the label files of the images changed since the last run
+    manifest = Manifest(os.path.join(imagefolder_path, MANIFEST_NAME % shard_name('coco2yolo', shard)))
+    dependencies = partial(yolofile_dependencies, imagefolder_path=imagefolder_path, catIndex=catIndex)
+    converted, removed = manifest.convertChanged(image_anns, dependencies, write_all)
+    print("%d files converted, %d removed" % (converted, len(removed)))
+
+def create_yolofromcoco(cocojson_path, imagefolder_path, workers=1, stream=False, incremental=False, io_threads=0, shard=None):
+    count('bytes_read', os.path.getsize(cocojson_path))
+    if stream:
+        with stage('parse'):
+            reader = CocoStreamReader(cocojson_path)
+        with reader:
+            image_anns = ((im, anns) for im, anns in reader.iterImages() if anns and in_shard(im['file_name'], shard))
+            write_yolofiles(reader.categories, image_anns, imagefolder_path, workers, incremental, io_threads, shard)
+        return
+
+    # pycocotools is only imported when the json is loaded whole
+    from pycocotools.coco import COCO
+    with stage('parse'):
+        coco = COCO(cocojson_path)
+    image_anns = [(coco.imgs[imgId], coco.imgToAnns[imgId]) for imgId in coco.getImgIds()
+                  if coco.imgToAnns.get(imgId) and in_shard(coco.imgs[imgId]['file_name'], shard)]
+    write_yolofiles(coco.loadCats(coco.getCatIds()), image_anns, imagefolder_path, workers, incremental, io_threads, shard)
 
 def get_args():
     parser = argparse.ArgumentParser('COCO annotations to YOLO annotation converter helper')
     parser.add_argument('-p', '--path', type=str, required=True, help='(Absolute) path for folder containing image files')
     parser.add_argument('-j', '--json', type=str, required=True ,help='(Absolute) path to COCO annotated json file')
+    parser.add_argument('-s', '--stream', action='store_true', help='Stream the json instead of loading it whole with pycocotools (for very large files)')
+    parser.add_argument('-w', '--workers', default=1, type=int, help='Number of worker processes used for the conversion')
+    parser.add_argument('-t', '--io-threads', default=0, type=int, help='Write the label files with N threads while the next ones are converted (for network storage)')
+    parser.add_argument('-i', '--incremental', action='store_true', help='Only write the label files of the images changed since the last incremental run and remove those of deleted images')
+    parser.add_argument('--shard', type=parse_shard, help='Only convert shard i/N of the inputs (selected by a hash of the file name), for distributing a conversion over N jobs')
+    instrument.add_arguments(parser)
 
     args = parser.parse_args()
     return args
@@ -70,6 +98,7 @@ if __name__ == '__main__':
     opt = get_args()
     imagefolder_path = opt.path
     cocojson_path = opt.json
-    create_yolofromcoco(cocojson_path, imagefolder_path)
+    with instrument.Run(opt):
+        create_yolofromcoco(cocojson_path, imagefolder_path, opt.workers, opt.stream, opt.incremental, opt.io_threads, opt.shard)
     print("COCO annotation converted to YOLO annotations in: " + imagefolder_path+" folder")
     print("Conversion processed in " + str(float(time.time()-start)) + " seconds")
\ No newline at end of file
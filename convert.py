@@ -0,0 +1,9 @@
+"""
+Any to any conversion, see annotation_converter.convert:
+
+    python convert.py --from yolo --to coco pascal -p images -l obj.names
+"""
+from annotation_converter.convert import main
+
+if __name__ == '__main__':
+    main()
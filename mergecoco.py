@@ -0,0 +1,19 @@
+import argparse
+import time
+from annotation_converter.shard import merge_coco
+
+def get_args():
+    parser = argparse.ArgumentParser('Merge the per-shard COCO json files of a sharded conversion')
+    parser.add_argument('-j', '--json', type=str, nargs='+', required=True, help='(Absolute) paths to the COCO json files of the shards')
+    parser.add_argument('-o', '--output', default="output", type=str, help='Name of the output json file')
+
+    args = parser.parse_args()
+    return args
+
+if __name__ == '__main__':
+    start = time.time()
+    opt = get_args()
+    output_name = opt.output
+    num_images, num_annotations = merge_coco(opt.json, output_name + '.json')
+    print("%d shards merged (%d images, %d annotations) in: %s.json" % (len(opt.json), num_images, num_annotations, output_name))
+    print("Conversion processed in " + str(float(time.time()-start)) + " seconds")
@@ -1,173 +1,134 @@
-import cv2
-import sys
-import os
-import json
-from xml.etree import ElementTree
-from xml.etree.ElementTree import Element, SubElement
-from lxml import etree
-import codecs
 import argparse
 import time
+from functools import partial
+from annotation_converter.parallel import parallel_imap
+from annotation_converter.pipeline import pipeline_imap
+from annotation_converter.cocoio import CocoJsonWriter, create_image_annotation, create_annotations, create_categories, update_cocojson
+from annotation_converter.manifest import MANIFEST_NAME
+from annotation_converter.labelmap import LabelMap
+from annotation_converter.shard import parse_shard, select_shard, shard_name
+from annotation_converter.scan import scan
+from annotation_converter.pascalvoc import PascalVocReader, read_file
+from annotation_converter.bbox import xyxy_to_coco
+from annotation_converter.records import CocoBoxes
+from annotation_converter import instrument
+from annotation_converter.instrument import stage
 
 XML_EXT = '.xml'
 ENCODE_METHOD = 'utf-8'
 
-class PascalVocReader:
-
-    def __init__(self, filepath):
-        # shapes type:
-        # [labbel, [(x1,y1), (x2,y2), (x3,y3), (x4,y4)], color, color, difficult]
-        self.shapes = []
-        self.size = None
-        self.filename = ""
-        self.filepath = filepath
-        self.verified = False
-        self.parseXML()
-
-    def getShapes(self):
-        return self.shapes
-
-    def addShape(self, label, bndbox, difficult):
-        xmin = float(bndbox.find('xmin').text)
-        ymin = float(bndbox.find('ymin').text)
-        xmax = float(bndbox.find('xmax').text)
-        ymax = float(bndbox.find('ymax').text)
-        points = [(xmin, ymin), (xmax, ymin), (xmax, ymax), (xmin, ymax)]
-        self.shapes.append((label, points, None, None, difficult))
-
-    def addSize(self, width, height, depth):
-        self.size = ((width,height,depth))
-
-    def getSize(self):
-        return self.size
-
-    def getFilename(self):
-        return self.filename
-
-    def parseXML(self):
-        assert self.filepath.endswith(XML_EXT), "Unsupport file format"
-        parser = etree.XMLParser()
-        xmltree = ElementTree.parse(self.filepath, parser=parser).getroot()
-        self.filename = xmltree.find('filename').text
-
-        for object_iter in xmltree.findall('size'):
-            width = int(object_iter.find("width").text)
-            height = int(object_iter.find("height").text)
-            depth = int(object_iter.find("depth").text)
-            self.addSize(width,height,depth)
-        try:
-            verified = xmltree.attrib['verified']
-            if verified == 'yes':
-                self.verified = True
-        except KeyError:
-            self.verified = False
-
-        for object_iter in xmltree.findall('object'):
-            bndbox = object_iter.find("bndbox")
-            label = object_iter.find('name').text
-
-            difficult = False
-            if object_iter.find('difficult') is not None:
-                difficult = bool(int(object_iter.find('difficult').text))
-            self.addShape(label, bndbox, difficult)
-        return True
-
-def create_image_annotation(file_name, width, height, image_id):
-    file_name = file_name.split('/')[-1]
-    images = {
-        'file_name': file_name,
-        'height': height,
-        'width': width,
-        'id': image_id
-    }
-    return images
-def create_annotation_yolo_format(min_x, min_y, width, height, image_id, category_id, annotation_id):
-    bbox = (min_x, min_y, width, height)
-    area = round(width * height,2)
-
-    annotation = {
-        'id': annotation_id,
-        'image_id': image_id,
-        'bbox': bbox,
-        'area': area,
-        'iscrowd': 0,
-        'category_id': category_id,
-        'segmentation': []
-    }
-
-    return annotation
-
-coco_format = {
-    "images": [
-        {
-        }
-    ],
-    "categories": [
-
-    ],
-    "annotations": [
-        {
-        }
-    ]
-}
-
-def images_annotations_info(vocfolder_path, classes):
-    annotations = []
-    images = []
-
+def read_pascalfile(file, vocfolder_path, labelmap, data=None):
+    """
+        Return (filename, width, height, boxes) of a PascalVOC xml file,
+        boxes being a records.CocoBoxes. data is the content of the file
+        when it has already been read.
+    """
+    filePath = vocfolder_path + "/" + file
+    VocParseReader = PascalVocReader(filePath, data)
+    size = VocParseReader.getSize()
+    filename = VocParseReader.getFilename()
+
+    with stage('convert'):
+        category_ids = [labelmap.getIndex(label) + 1 for label in VocParseReader.labels]
+        boxes = CocoBoxes(category_ids, xyxy_to_coco(VocParseReader.boxes))
+
+    return filename, size[0], size[1], boxes
+
+def load_pascalfile(file, vocfolder_path):
+    """
+        The I/O of read_pascalfile for the pipelined mode.
+    """
+    return file, read_file(vocfolder_path + "/" + file)
+
+def parse_pascalfile(loaded, vocfolder_path, labelmap):
+    file, data = loaded
+    return read_pascalfile(file, vocfolder_path, labelmap, data)
+
+def read_pascalfiles(files, vocfolder_path, labelmap, workers=1, io_threads=0):
+    """
+        Yield read_pascalfile(file) for every file in order. With io_threads
+        the files are read by threads ahead of the parsing.
+    """
+    if io_threads:
+        return pipeline_imap(partial(load_pascalfile, vocfolder_path=vocfolder_path),
+                             partial(parse_pascalfile, vocfolder_path=vocfolder_path, labelmap=labelmap), files, workers, io_threads)
+    return parallel_imap(partial(read_pascalfile, vocfolder_path=vocfolder_path, labelmap=labelmap), files, workers)
+
+def list_xmlfiles(vocfolder_path):
+    return [sample.xml for sample in scan(vocfolder_path, ('xml',)).ordered('xml')]
+
+def iter_images_boxes(vocfolder_path, labelmap, workers=1, io_threads=0, shard=None):
+    """
+        Yield (image, boxes, id of the first annotation) in COCO format for
+        every xml file, boxes being a records.CocoBoxes.
+    """
+    files = select_shard(list_xmlfiles(vocfolder_path), shard)
+    results = read_pascalfiles(files, vocfolder_path, labelmap, workers, io_threads)
+
+    # ids are assigned in file order, the same as a serial run
     image_id = 0
     annotation_id = 1 
-    for file in os.listdir(vocfolder_path):
-        if file.endswith(".xml"):
-            
-            filePath = vocfolder_path + "/" + file
-            VocParseReader = PascalVocReader(filePath)
-            size = VocParseReader.getSize()
-            filename = VocParseReader.getFilename()
-            image = create_image_annotation(filename, size[0], size[1], image_id)
-            images.append(image)
-
-            shapes = VocParseReader.getShapes()
-            num_of_box = len(shapes)
-
-            for i in range(num_of_box):
-                category_id = classes.index(shapes[i][0]) + 1
-                min_x = shapes[i][1][0][0]
-                min_y = shapes[i][1][0][1]
-                max_x = shapes[i][1][2][0]
-                max_y = shapes[i][1][2][1]
-
-                width = round(max_x - min_x,2)
-                height = round(max_y - min_y,2)
-
-                annotation = create_annotation_yolo_format(min_x, min_y, width, height, image_id, category_id, annotation_id)
-                annotations.append(annotation)
-                annotation_id += 1
-
-            image_id += 1
+    for filename, width, height, boxes in results:
+        image = create_image_annotation(filename, width, height, image_id)
+
+        yield image, boxes, annotation_id
+        annotation_id += len(boxes)
+        image_id += 1
+
+def iter_images_annotations(vocfolder_path, labelmap, workers=1, io_threads=0, shard=None):
+    """
+        Yield (image, annotations) in COCO format for every xml file.
+    """
+    for image, boxes, annotation_id in iter_images_boxes(vocfolder_path, labelmap, workers, io_threads, shard):
+        yield image, create_annotations(boxes, image['id'], annotation_id)
+
+def images_annotations_info(vocfolder_path, labelmap, workers=1):
+    annotations = []
+    images = []
+    for image, image_annotations in iter_images_annotations(vocfolder_path, labelmap, workers):
+        images.append(image)
+        annotations.extend(image_annotations)
 
     return images,annotations
 
-def create_cocofrompascal(vocfolder_path, label_path, output_name):
+def update_cocofrompascal(vocfolder_path, label_path, output_name, workers=1, io_threads=0, shard=None):
+    """
+        Update output_name.json in place, only the xml files added, changed
+        or removed since the last update patch their images and annotations.
+    """
+    labelmap = LabelMap.load(label_path)
+    files = select_shard(list_xmlfiles(vocfolder_path), shard)
+    dependencies = lambda file: {'key': file, 'inputs': [vocfolder_path + "/" + file, label_path]}
+    read_sources = lambda changed: read_pascalfiles(changed, vocfolder_path, labelmap, workers, io_threads)
+    converted, removed = update_cocojson(output_name + '.json', create_categories(labelmap), files, dependencies,
+                                         read_sources, output_name + MANIFEST_NAME % 'pascal2coco')
+    print("%d of %d files converted, %d images removed" % (converted, len(files), removed))
+
+def create_cocofrompascal(vocfolder_path, label_path, output_name, workers=1, update=False, io_threads=0, shard=None):
+    output_name = shard_name(output_name, shard)
+    if update:
+        update_cocofrompascal(vocfolder_path, label_path, output_name, workers, io_threads, shard)
+        return
+
     output_path = output_name + '.json'
-    classes = open(label_path).read().strip().split("\n")
-    coco_format['images'], coco_format['annotations'] = images_annotations_info(vocfolder_path, classes)
-    for index, label in enumerate(classes):
-        ann = {
-            "supercategory": "detection_objects",
-            "id": index + 1,  # Index starts with '1' .
-            "name": label
-        }
-        coco_format['categories'].append(ann)
-
-    with open(output_path, 'w') as outfile:
-        json.dump(coco_format, outfile)
+    labelmap = LabelMap.load(label_path)
+
+    # images and annotations are written out as each file is converted
+    with CocoJsonWriter(output_path, create_categories(labelmap)) as writer:
+        for image, boxes, annotation_id in iter_images_boxes(vocfolder_path, labelmap, workers, io_threads, shard):
+            writer.addImage(image)
+            writer.addBoxes(image['id'], annotation_id, boxes)
 
 def get_args():
     parser = argparse.ArgumentParser('PascalVOC annotations to COCO annotation converter helper (Assumes that image directory is already present)')
     parser.add_argument('-v', '--voc', type=str, required=True, help='(Absolute) path for folder containing the PascalVOC VML files')
     parser.add_argument('-l', '--labels', type=str, required=True ,help='(Absolute) path to file containing objection detection category names')
     parser.add_argument('-o', '--output', default="output", type=str, help='Name of the output json file')
+    parser.add_argument('-w', '--workers', default=1, type=int, help='Number of worker processes used for the conversion')
+    parser.add_argument('-t', '--io-threads', default=0, type=int, help='Read the xml files with N threads ahead of the conversion (for network storage)')
+    parser.add_argument('-u', '--update', action='store_true', help='Update the existing output json, only converting the files changed since the last update and keeping image ids stable')
+    parser.add_argument('--shard', type=parse_shard, help='Only convert shard i/N of the inputs (selected by a hash of the file name) to OUTPUT.shardIofN.json, merged with mergecoco.py')
+    instrument.add_arguments(parser)
 
     args = parser.parse_args()
     return args
@@ -178,6 +139,7 @@ if __name__ == '__main__':
     vocfolder_path = opt.voc
     label_path = opt.labels
     output_name = opt.output
-    create_cocofrompascal(vocfolder_path, label_path, output_name)
-    print("PascalVOC annotation converted to COCO annotations in: " + output_name+".json")
+    with instrument.Run(opt):
+        create_cocofrompascal(vocfolder_path, label_path, output_name, opt.workers, opt.update, opt.io_threads, opt.shard)
+    print("PascalVOC annotation converted to COCO annotations in: " + shard_name(output_name, opt.shard)+".json")
     print("Conversion processed in " + str(float(time.time()-start)) + " seconds")
\ No newline at end of file
@@ -1,12 +1,20 @@
-import cv2
-import sys
 import os
-from xml.etree import ElementTree
-from xml.etree.ElementTree import Element, SubElement
-from lxml import etree
-import codecs
 import argparse
 import time
+from functools import partial
+from annotation_converter.imagesize import get_image_size, set_image_cache
+from annotation_converter.parallel import parallel_map
+from annotation_converter.pipeline import pipeline_write, write_file
+from annotation_converter.manifest import Manifest, MANIFEST_NAME
+from annotation_converter.labelmap import LabelMap
+from annotation_converter.shard import parse_shard, in_shard, shard_name
+from annotation_converter.scan import scan, warn_orphans
+from annotation_converter.pascalvoc import PascalVocReader, read_file
+from annotation_converter.bbox import xyxy_to_yolo
+from annotation_converter.yololabels import format_labels
+from annotation_converter.records import BoxList
+from annotation_converter import instrument
+from annotation_converter.instrument import stage
 
 XML_EXT = '.xml'
 TXT_EXT = '.txt'
@@ -19,137 +27,110 @@ class YOLOWriter:
         self.filename = filename
         self.databaseSrc = databaseSrc
         self.imgSize = imgSize
-        self.boxlist = []
+        self.boxlist = BoxList()
         self.localImgPath = localImgPath
         self.verified = False
 
     def addBndBox(self, xmin, ymin, xmax, ymax, name, difficult):
-        bndbox = {'xmin': xmin, 'ymin': ymin, 'xmax': xmax, 'ymax': ymax}
-        bndbox['name'] = name
-        bndbox['difficult'] = difficult
-        self.boxlist.append(bndbox)
+        self.boxlist.add(xmin, ymin, xmax, ymax, name, difficult)
 
-    def BndBox2YoloLine(self, box, classList=[]):
-        xmin = box['xmin']
-        xmax = box['xmax']
-        ymin = box['ymin']
-        ymax = box['ymax']
+    def addBndBoxes(self, boxes, classes, difficult=None):
+        self.boxlist.extend(boxes, classes, difficult)
 
-        xcen = float((xmin + xmax)) / 2 / self.imgSize[1]
-        ycen = float((ymin + ymax)) / 2 / self.imgSize[0]
-
-        w = float((xmax - xmin)) / self.imgSize[1]
-        h = float((ymax - ymin)) / self.imgSize[0]
-
-        # PR387
-        classIndex = box['name']
-
-        return classIndex, xcen, ycen, w, h
+    def toString(self):
+        with stage('convert'):
+            yolo = xyxy_to_yolo(self.boxlist.boxes(), self.imgSize[1], self.imgSize[0])
+            return format_labels(self.boxlist.labels, yolo)
 
     def save(self, classList=[], targetFile=None):
-
-        out_file = None 
-
         if targetFile is None:
-            out_file = open(
-            self.filename + TXT_EXT, 'w', encoding=ENCODE_METHOD)
-
-        else:
-            out_file = codecs.open(targetFile, 'w', encoding=ENCODE_METHOD)
-
-
-        for box in self.boxlist:
-            classIndex, xcen, ycen, w, h = self.BndBox2YoloLine(box, classList)
-            out_file.write("%d %.6f %.6f %.6f %.6f\n" % (classIndex, xcen, ycen, w, h))
-
-        out_file.close()
-
-class PascalVocReader:
-
-    def __init__(self, filepath):
-        # shapes type:
-        # [labbel, [(x1,y1), (x2,y2), (x3,y3), (x4,y4)], color, color, difficult]
-        self.shapes = []
-        self.filepath = filepath
-        self.verified = False
-        self.parseXML()
-
-    def getShapes(self):
-        return self.shapes
-
-    def addShape(self, label, bndbox, difficult):
-        xmin = float(bndbox.find('xmin').text)
-        ymin = float(bndbox.find('ymin').text)
-        xmax = float(bndbox.find('xmax').text)
-        ymax = float(bndbox.find('ymax').text)
-        points = [(xmin, ymin), (xmax, ymin), (xmax, ymax), (xmin, ymax)]
-        self.shapes.append((label, points, None, None, difficult))
-
-    def parseXML(self):
-        assert self.filepath.endswith(XML_EXT), "Unsupport file format"
-        parser = etree.XMLParser()
-        xmltree = ElementTree.parse(self.filepath, parser=parser).getroot()
-        filename = xmltree.find('filename').text
-        try:
-            verified = xmltree.attrib['verified']
-            if verified == 'yes':
-                self.verified = True
-        except KeyError:
-            self.verified = False
-
-        for object_iter in xmltree.findall('object'):
-            bndbox = object_iter.find("bndbox")
-            label = object_iter.find('name').text
-
-            difficult = False
-            if object_iter.find('difficult') is not None:
-                difficult = bool(int(object_iter.find('difficult').text))
-            self.addShape(label, bndbox, difficult)
-        return True
-
-def create_yolofrompascal(imagefolder_path, vocfolder_path, label_path):
-
-    for file in os.listdir(vocfolder_path):
-        if file.endswith(".xml"):
-            
-            annotation_no_xml = os.path.splitext(file)[0]
-
-            imagePath = os.path.join(imagefolder_path, annotation_no_xml + ".jpg")
-
-            image = cv2.imread(imagePath)
-            imgFolderName = os.path.basename(imagefolder_path)
-            imgFileName = os.path.basename(imagePath)
-
-            writer = YOLOWriter(imgFolderName, imgFileName, image.shape, localImgPath=imagePath)
-
-            # Read classes.txt
-            classListPath = label_path
-            classesFile = open(classListPath, 'r')
-            classes = classesFile.read().strip('\n').split('\n')
-            classesFile.close()
-
-            # Read VOC file
-            filePath = vocfolder_path + "/" + file
-            VocParseReader = PascalVocReader(filePath)
-            shapes = VocParseReader.getShapes()
-            num_of_box = len(shapes)
-
-            for i in range(num_of_box):
-                label = classes.index(shapes[i][0])
-                xmin = shapes[i][1][0][0]
-                ymin = shapes[i][1][0][1]
-                x_max = shapes[i][1][2][0]
-                y_max = shapes[i][1][2][1]
-
-                writer.addBndBox(xmin, ymin, x_max, y_max, label, 0)
-
-            writer.save(targetFile= imagefolder_path + "/" + annotation_no_xml + ".txt")
+            targetFile = self.filename + TXT_EXT
+        # All the lines in one write, renamed into place
+        write_file(targetFile, self.toString())
+
+def pascalfile_writer(sample, imagefolder_path, vocfolder_path, labelmap, imgSize, data=None):
+    """
+        Return the YOLOWriter of the PascalVOC xml file of a scan.Sample,
+        data being the content of the file when it has already been read.
+    """
+    imagePath = os.path.join(imagefolder_path, sample.image)
+
+    imgFolderName = os.path.basename(imagefolder_path)
+    imgFileName = os.path.basename(imagePath)
+
+    writer = YOLOWriter(imgFolderName, imgFileName, imgSize, localImgPath=imagePath)
+
+    # Read VOC file
+    filePath = vocfolder_path + "/" + sample.xml
+    VocParseReader = PascalVocReader(filePath, data)
+    writer.addBndBoxes(VocParseReader.boxes, [labelmap.getIndex(name) for name in VocParseReader.labels])
+
+    return writer
+
+def convert_pascalfile(sample, imagefolder_path, vocfolder_path, labelmap):
+    imgSize = get_image_size(os.path.join(imagefolder_path, sample.image))
+    writer = pascalfile_writer(sample, imagefolder_path, vocfolder_path, labelmap, imgSize)
+    writer.save(targetFile= imagefolder_path + "/" + sample.key + ".txt")
+
+def read_pascalfile(sample, imagefolder_path, vocfolder_path):
+    """
+        The I/O of convert_pascalfile (image size and xml file) for the
+        pipelined mode.
+    """
+    imgSize = get_image_size(os.path.join(imagefolder_path, sample.image))
+    return sample, imgSize, read_file(vocfolder_path + "/" + sample.xml)
+
+def compute_pascalfile(read_result, imagefolder_path, vocfolder_path, labelmap):
+    """
+        Return (txt path, txt content) from the result of read_pascalfile.
+    """
+    sample, imgSize, data = read_result
+    writer = pascalfile_writer(sample, imagefolder_path, vocfolder_path, labelmap, imgSize, data)
+    return imagefolder_path + "/" + sample.key + ".txt", writer.toString().encode(ENCODE_METHOD)
+
+def pascalfile_dependencies(sample, imagefolder_path, vocfolder_path, label_path):
+    return {'key': sample.xml,
+            'inputs': [vocfolder_path + "/" + sample.xml, label_path],
+            'images': [os.path.join(imagefolder_path, sample.image)],
+            'outputs': [imagefolder_path + "/" + sample.key + ".txt"]}
+
+def create_yolofrompascal(imagefolder_path, vocfolder_path, label_path, workers=1, incremental=False, io_threads=0, shard=None):
+    # xml files and images are paired by name, whatever the image extension
+    index = scan(vocfolder_path, ('xml',))
+    scan(imagefolder_path, ('image',), index=index)
+    warn_orphans(index.orphans('xml', 'image'), "xml files have no image in " + imagefolder_path)
+    warn_orphans(index.duplicates, "images have the name of another image")
+    files = [sample for sample in index.ordered('xml', required=('image',)) if in_shard(sample.xml, shard)]
+    labelmap = LabelMap.load(label_path)
+    if io_threads:
+        # Reads, conversion and writes of different files overlap
+        read = partial(read_pascalfile, imagefolder_path=imagefolder_path, vocfolder_path=vocfolder_path)
+        compute = partial(compute_pascalfile, imagefolder_path=imagefolder_path, vocfolder_path=vocfolder_path, labelmap=labelmap)
+        convert_all = partial(pipeline_write, read, compute, workers=workers, threads=io_threads)
+    else:
+        convert = partial(convert_pascalfile, imagefolder_path=imagefolder_path, vocfolder_path=vocfolder_path, labelmap=labelmap)
+        convert_all = partial(parallel_map, convert, workers=workers)
+    if not incremental:
+        convert_all(files)
+        return
+
+    # Only convert the xml files changed since the last run
+    manifest = Manifest(os.path.join(imagefolder_path, MANIFEST_NAME % shard_name('pascal2yolo', shard)))
+    dependencies = partial(pascalfile_dependencies, imagefolder_path=imagefolder_path, vocfolder_path=vocfolder_path, label_path=label_path)
+    converted, removed = manifest.convertChanged(files, dependencies, convert_all)
+    print("%d of %d files converted, %d removed" % (converted, len(files), len(removed)))
 
 def get_args():
     parser = argparse.ArgumentParser('PascalVOC annotations to YOLO annotation converter helper')
     parser.add_argument('-p', '--path', type=str, required=True, help='(Absolute) path for folder containing image files')
     parser.add_argument('-v', '--voc', type=str, required=True, help='(Absolute) path for folder containing the PascalVOC VML files')
     parser.add_argument('-l', '--labels', type=str, required=True ,help='(Absolute) path to file containing objection detection category names')
+    parser.add_argument('--image-cache', type=str, help='Path to an image size cache file (created if missing), images are only read when not cached or changed')
+    parser.add_argument('-w', '--workers', default=1, type=int, help='Number of worker processes used for the conversion')
+    parser.add_argument('-t', '--io-threads', default=0, type=int, help='Pipeline the conversion with N threads reading and N threads writing files ahead of/behind the conversion (for network storage)')
+    parser.add_argument('-i', '--incremental', action='store_true', help='Only convert the files changed since the last incremental run and remove the outputs of deleted files')
+    parser.add_argument('--shard', type=parse_shard, help='Only convert shard i/N of the inputs (selected by a hash of the file name), for distributing a conversion over N jobs')
+    instrument.add_arguments(parser)
 
     args = parser.parse_args()
     return args
@@ -157,9 +138,12 @@ def get_args():
 if __name__ == '__main__':
     start = time.time()
     opt = get_args()
+    if opt.image_cache:
+        set_image_cache(opt.image_cache)
     imagefolder_path = opt.path
     vocfolder_path = opt.voc
     label_path = opt.labels
-    create_yolofrompascal(imagefolder_path, vocfolder_path, label_path)
+    with instrument.Run(opt):
+        create_yolofrompascal(imagefolder_path, vocfolder_path, label_path, opt.workers, opt.incremental, opt.io_threads, opt.shard)
     print("PascalVOC annotation converted to YOLO annotations in: " + imagefolder_path+" folder")
     print("Conversion processed in " + str(float(time.time()-start)) + " seconds")
\ No newline at end of file
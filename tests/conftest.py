@@ -0,0 +1,51 @@
+import os
+import sys
+import json
+import shutil
+import pytest
+
+REPO = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+# The converters are top level scripts, imported from the repository root
+sys.path.insert(0, REPO)
+
+@pytest.fixture
+def workdir(tmp_path, monkeypatch):
+    """
+        A copy of the sample images (with their YOLO txt files) and obj.names
+        in a temporary working directory.
+    """
+    shutil.copytree(os.path.join(REPO, 'images'), tmp_path / 'images')
+    shutil.copy(os.path.join(REPO, 'obj.names'), tmp_path / 'obj.names')
+    monkeypatch.chdir(tmp_path)
+    return tmp_path
+
+def copy_images(folder):
+    """
+        Copy the sample images, without their txt files, to folder.
+    """
+    os.makedirs(folder)
+    for name in os.listdir('images'):
+        if name.endswith('.jpg'):
+            shutil.copy(os.path.join('images', name), folder)
+
+def read_folder(folder, ext):
+    """
+        {file name: content} of the files of folder ending with ext.
+    """
+    files = {}
+    for name in sorted(os.listdir(folder)):
+        if name.endswith(ext):
+            with open(os.path.join(folder, name), 'rb') as f:
+                files[name] = f.read()
+    return files
+
+def write_mixed_json(path):
+    """
+        COCO json of one sample image mixing integer and float bbox values.
+    """
+    coco = {"images": [{"file_name": "000000000139.jpg", "height": 426, "width": 640, "id": 0}],
+            "categories": [{"supercategory": "detection_objects", "id": 1, "name": "person"}],
+            "annotations": [{"id": 1, "image_id": 0, "bbox": [10, 20, 30, 40], "area": 1200, "iscrowd": 0, "category_id": 1, "segmentation": []},
+                            {"id": 2, "image_id": 0, "bbox": [1.5, 20, 30.25, 40], "area": 1210.0, "iscrowd": 0, "category_id": 1, "segmentation": []}]}
+    with open(path, 'w') as f:
+        json.dump(coco, f)
@@ -0,0 +1,108 @@
+import os
+import json
+import tarfile
+import zipfile
+import pytest
+from conftest import read_folder
+from annotation_converter.archive import ArchiveWriter, iter_members, archive_stem
+from annotation_converter.scan import scan
+from annotation_converter import convert
+
+def read(path):
+    with open(path, 'rb') as f:
+        return f.read()
+
+def pack_images(archive_path):
+    """
+        Archive of the sample images and their txt files, in the order the
+        folder is scanned so the dataset order is the same.
+    """
+    with ArchiveWriter(archive_path) as archive:
+        for sample in scan('images', ('image', 'label')).ordered('image'):
+            for name in (sample.image, sample.label):
+                archive.write(name, read(os.path.join('images', name)))
+
+def read_archive(archive_path, ext):
+    return {name: data for name, data in iter_members(archive_path, (ext,))}
+
+def annotations_by_file(path):
+    """
+        {file name: (width, height, [(category id, bbox), ...])} of a COCO
+        json, which does not depend on the order of the images.
+    """
+    with open(path) as f:
+        coco = json.load(f)
+    files = {img['id']: (img['file_name'], img['width'], img['height'], []) for img in coco['images']}
+    for ann in coco['annotations']:
+        files[ann['image_id']][3].append((ann['category_id'], ann['bbox']))
+    return {name: (width, height, anns) for name, width, height, anns in files.values()}
+
+def test_archive_stem():
+    assert archive_stem('a/shard.tar.gz') == 'a/shard'
+    assert archive_stem('shard.TGZ') == 'shard'
+    assert archive_stem('shard.zip') == 'shard'
+    assert archive_stem('folder') == 'folder'
+
+@pytest.mark.parametrize('ext', ['.tar', '.tar.gz', '.zip'])
+def test_archive_round_trip(workdir, ext):
+    convert.main(['--from', 'yolo', '--to', 'coco', 'pascal', 'yolo', '-p', 'images', '-l', 'obj.names', '-o', 'folder', '--voc-output', 'pascal',
+                  '--yolo-output', 'yolo'])
+    pack_images('images' + ext)
+    convert.main(['--from', 'yolo', '--to', 'coco', 'pascal', 'yolo', '-p', 'images' + ext, '-l', 'obj.names', '-o', 'archive',
+                  '--voc-output', 'pascal' + ext, '--yolo-output', 'yolo' + ext])
+    assert read('archive.json') == read('folder.json')
+    xml = read_archive('pascal' + ext, '.xml')
+    # The xml files only differ by the image path
+    expected = read_folder('pascal', '.xml')
+    assert {name: data.replace(('images' + ext).encode(), b'images') for name, data in xml.items()} == expected
+    assert read_archive('yolo' + ext, '.txt') == read_folder('yolo', '.txt')
+    assert not [name for name in os.listdir('.') if name.endswith('.tmp')]
+
+    # The PascalVOC archive reads back as the folder (in archive order)
+    convert.main(['--from', 'pascal', '--to', 'coco', '-v', 'pascal' + ext, '-l', 'obj.names', '-o', 'from_archive'])
+    convert.main(['--from', 'pascal', '--to', 'coco', '-v', 'pascal', '-l', 'obj.names', '-o', 'from_folder'])
+    assert annotations_by_file('from_archive.json') == annotations_by_file('from_folder.json')
+
+def test_iter_members_skips_folders_and_other_files(tmp_path):
+    path = str(tmp_path / 'a.zip')
+    with zipfile.ZipFile(path, 'w') as archive:
+        archive.writestr('sub/', b'')
+        archive.writestr('sub/a.txt', b'0 0.5 0.5 0.1 0.1\n')
+        archive.writestr('sub/a.json', b'{}')
+    assert list(iter_members(path, ('.txt',))) == [('sub/a.txt', b'0 0.5 0.5 0.1 0.1\n')]
+    assert [name for name, data in iter_members(path)] == ['sub/a.txt', 'sub/a.json']
+
+def test_archive_writer_removes_the_archive_on_error(tmp_path):
+    path = str(tmp_path / 'out.tar')
+    with pytest.raises(RuntimeError):
+        with ArchiveWriter(path) as archive:
+            archive.write('a.txt', 'text')
+            raise RuntimeError
+    assert os.listdir(str(tmp_path)) == []
+    with ArchiveWriter(path) as archive:
+        archive.write('a.txt', 'text')
+    with tarfile.open(path) as archive:
+        assert archive.extractfile('a.txt').read() == b'text'
+
+@pytest.mark.parametrize('with_images', [False, True])
+def test_pascal_archive_without_size_reads_the_image(workdir, with_images):
+    convert.main(['--from', 'yolo', '--to', 'pascal', '-p', 'images', '-l', 'obj.names', '--voc-output', 'pascal'])
+    with ArchiveWriter('nosize.tar') as archive:
+        for name, data in read_folder('pascal', '.xml').items():
+            start, end = data.index(b'<size>'), data.index(b'</size>') + len(b'</size>')
+            archive.write(name, data[:start] + data[end:])
+            if with_images:
+                # The image of the same name in the archive, or else in -p
+                image = os.path.splitext(name)[0] + '.jpg'
+                archive.write(image, read(os.path.join('images', image)))
+    convert.main(['--from', 'pascal', '--to', 'coco', '-v', 'nosize.tar', '-p', 'missing' if with_images else 'images', '-l', 'obj.names', '-o', 'nosize'])
+    convert.main(['--from', 'pascal', '--to', 'coco', '-v', 'pascal', '-l', 'obj.names', '-o', 'sized'])
+    assert annotations_by_file('nosize.json') == annotations_by_file('sized.json')
+
+def test_pascal_archive_without_size_or_image(workdir):
+    convert.main(['--from', 'yolo', '--to', 'pascal', '-p', 'images', '-l', 'obj.names', '--voc-output', 'pascal'])
+    pack_images('images.tar')
+    with ArchiveWriter('nosize.tar') as archive:
+        archive.write('a.xml', '<annotation><filename>a.jpg</filename></annotation>')
+    with pytest.raises(ValueError):
+        convert.main(['--from', 'pascal', '--to', 'coco', '-v', 'nosize.tar', '-p', 'images.tar', '-l', 'obj.names', '-o', 'nosize'])
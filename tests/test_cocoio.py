@@ -0,0 +1,161 @@
+import io
+import os
+import json
+import shutil
+import tempfile
+import pytest
+from annotation_converter.cocoio import JsonStream, CocoStreamReader, CocoJsonWriter, create_annotations
+from annotation_converter.records import CocoBoxes
+import yolo2coco
+import yolo2pascal
+import pascal2coco
+
+DOC = {"a": 1.5e10, "b": [1, -2.25e-3, 3.0, 12345678901234567890, True, None, "x"], "c": {"d": -0.5, "e": 1e-7}, "f": 7}
+
+@pytest.mark.parametrize('chunk_size', range(1, 12))
+@pytest.mark.parametrize('separators', [(', ', ': '), (',', ':')])
+def test_json_stream_numbers_cut_by_chunks(chunk_size, separators):
+    text = json.dumps(DOC, separators=separators)
+    stream = JsonStream(io.StringIO(text), chunk_size=chunk_size)
+    assert dict(stream.items()) == DOC
+
+def test_json_stream_streams_arrays():
+    text = json.dumps({"images": [{"id": 1}, {"id": 2.5e3}], "info": {}})
+    stream = JsonStream(io.StringIO(text), chunk_size=4)
+    assert list(stream.items(('images',))) == [('images', {"id": 1}), ('images', {"id": 2.5e3}), ('info', {})]
+
+def write_coco(path, num_images=5):
+    categories = [{"supercategory": "detection_objects", "id": 1, "name": "a"}, {"supercategory": "detection_objects", "id": 2, "name": "b"}]
+    with CocoJsonWriter(path, categories) as writer:
+        annotation_id = 1
+        for image_id in range(num_images):
+            writer.addImage({"file_name": "%d.jpg" % image_id, "height": 10, "width": 20, "id": image_id})
+            boxes = CocoBoxes([1 + image_id % 2] * image_id, [[image_id, 1.25, 2.5, 3.0]] * image_id)
+            writer.addBoxes(image_id, annotation_id, boxes)
+            annotation_id += len(boxes)
+
+@pytest.mark.parametrize('bucket_bytes', [1 << 20, 200])
+def test_stream_reader_groups_annotations(tmp_path, bucket_bytes):
+    path = str(tmp_path / 'a.json')
+    write_coco(path)
+    with open(path) as f:
+        coco = json.load(f)
+    with CocoStreamReader(path, bucket_bytes=bucket_bytes) as reader:
+        assert reader.categories == coco['categories']
+        grouped = list(reader.iterImages())
+        assert (reader.tempdir is None) == (bucket_bytes > 1000)
+    # Images come in file order with their annotations
+    assert grouped == [(img, [ann for ann in coco['annotations'] if ann['image_id'] == img['id']]) for img in coco['images']]
+
+def test_stream_reader_buckets_keep_file_order(tmp_path):
+    # Annotations before images, image ids out of order and an annotation without image
+    images = [{"id": image_id, "file_name": "%d.jpg" % image_id} for image_id in (7, 3, 9, 1, 5, 8, 2)]
+    annotations = [{"id": index + 1, "image_id": image_id} for index, image_id in enumerate((2, 7, 4, 9, 9, 1, 7))]
+    path = str(tmp_path / 'a.json')
+    with open(path, 'w') as f:
+        json.dump({"annotations": annotations, "categories": [], "images": images}, f, indent=1)
+    with CocoStreamReader(path, bucket_bytes=100) as reader:
+        # Spooled in the temporary directory, the json folder may be read-only
+        assert os.path.dirname(reader.tempdir) == tempfile.gettempdir()
+        grouped = list(reader.iterImages())
+    assert grouped == [(img, [ann for ann in annotations if ann['image_id'] == img['id']]) for img in images]
+
+@pytest.mark.parametrize('values', [[[0.1, 2, 3.5, 1e20], [-0.0, 1 / 3, 7, 2.25]], [[1, 2, float('nan'), 4]], [[float('inf'), 0, 1, 1]]])
+def test_add_boxes_matches_json_dumps(tmp_path, values):
+    path = str(tmp_path / 'a.json')
+    boxes = CocoBoxes(range(1, len(values) + 1), values)
+    with CocoJsonWriter(path, []) as writer:
+        writer.addImage({"id": 3})
+        writer.addBoxes(3, 10, boxes)
+    expected = json.dumps({"images": [{"id": 3}], "categories": [], "annotations": create_annotations(boxes, 3, 10)})
+    with open(path) as f:
+        assert f.read() == expected
+
+def test_writer_keeps_previous_output_on_error(tmp_path):
+    path = str(tmp_path / 'a.json')
+    write_coco(path)
+    with open(path) as f:
+        previous = f.read()
+    with pytest.raises(RuntimeError):
+        with CocoJsonWriter(path, []) as writer:
+            writer.addImage({"id": 1})
+            raise RuntimeError
+    with open(path) as f:
+        assert f.read() == previous
+    assert os.listdir(str(tmp_path)) == ['a.json']
+
+def test_failed_conversion_keeps_previous_output(workdir):
+    yolo2pascal.create_pascalfromyolo('images', 'obj.names', 'pascal')
+    pascal2coco.create_cocofrompascal('pascal', 'obj.names', 'output')
+    previous = load_json('output.json')
+    with open('obj.names') as f:
+        names = f.read().splitlines()
+    with open('small.names', 'w') as f:
+        f.write("\n".join(names[:3]))
+    with pytest.raises(ValueError):
+        pascal2coco.create_cocofrompascal('pascal', 'small.names', 'output')
+    assert load_json('output.json') == previous
+    assert not os.path.exists('output.json.tmp')
+
+def load_json(path):
+    with open(path) as f:
+        return json.load(f)
+
+def update(capsys):
+    yolo2coco.create_cocofromyolo('images', 'obj.names', 'output', update=True)
+    return capsys.readouterr().out.splitlines()[0]
+
+def test_update_cocojson(workdir, capsys):
+    yolo2coco.create_cocofromyolo('images', 'obj.names', 'full')
+    assert update(capsys) == "20 of 20 files converted, 0 images removed"
+    first = load_json('output.json')
+    assert first == load_json('full.json')
+
+    # Nothing changed, nothing is read and the file is the same
+    assert update(capsys) == "0 of 20 files converted, 0 images removed"
+    assert load_json('output.json') == first
+
+    images = {img['file_name']: img for img in first['images']}
+    max_annotation_id = max(ann['id'] for ann in first['annotations'])
+    with open('images/000000000139.txt') as f:
+        lines = f.readlines()
+    with open('images/000000000139.txt', 'w') as f:
+        f.writelines(lines[1:])
+    shutil.copy('images/000000000285.jpg', 'images/new.jpg')
+    shutil.copy('images/000000000285.txt', 'images/new.txt')
+    os.remove('images/000000000632.jpg')
+    assert update(capsys) == "2 of 20 files converted, 1 images removed"
+    second = load_json('output.json')
+
+    ids = {img['file_name']: img['id'] for img in second['images']}
+    # The changed image keeps its id, the new one is numbered after the largest
+    assert ids['000000000139.jpg'] == images['000000000139.jpg']['id']
+    assert ids['new.jpg'] == max(img['id'] for img in first['images']) + 1
+    assert '000000000632.jpg' not in ids
+    # Unchanged images keep their annotations, changed ones get new ids
+    changed = {images['000000000139.jpg']['id'], images['000000000632.jpg']['id']}
+    kept = [ann for ann in first['annotations'] if ann['image_id'] not in changed]
+    assert [ann for ann in second['annotations'] if ann['id'] <= max_annotation_id] == kept
+    anns = [ann for ann in second['annotations'] if ann['image_id'] == ids['000000000139.jpg']]
+    assert len(anns) == len(lines) - 1
+    assert min(ann['id'] for ann in anns) > max_annotation_id
+    assert len({ann['id'] for ann in second['annotations']}) == len(second['annotations'])
+
+def test_update_keeps_image_order_of_bucketed_json(workdir, capsys, monkeypatch):
+    update(capsys)
+    with open('output.json', 'rb') as f:
+        first = f.read()
+    # Read the json back in buckets of a few images
+    monkeypatch.setattr(CocoStreamReader.__init__, '__defaults__', (2000,))
+    assert update(capsys) == "0 of 20 files converted, 0 images removed"
+    with open('output.json', 'rb') as f:
+        assert f.read() == first
+
+def test_update_rebuilds_when_categories_change(workdir, capsys):
+    assert update(capsys) == "20 of 20 files converted, 0 images removed"
+    with open('obj.names') as f:
+        names = f.read().splitlines()
+    with open('obj.names', 'w') as f:
+        f.write("\n".join(names + ["extra"]))
+    assert update(capsys) == "20 of 20 files converted, 0 images removed"
+    assert load_json('output.json')['categories'][-1]['name'] == "extra"
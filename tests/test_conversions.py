@@ -0,0 +1,110 @@
+import os
+import sys
+import json
+import subprocess
+import pytest
+from conftest import REPO, copy_images, read_folder, write_mixed_json
+from annotation_converter import convert
+import coco2pascal
+import coco2yolo
+import pascal2coco
+import pascal2yolo
+import yolo2coco
+import yolo2pascal
+
+def read(path):
+    with open(path, 'rb') as f:
+        return f.read()
+
+@pytest.mark.parametrize('stream', [False, True])
+def test_coco2pascal_keeps_integer_values(workdir, stream):
+    write_mixed_json('mixed.json')
+    coco2pascal.create_pascalfromcoco('images', 'mixed.json', 'pascal', stream=stream)
+    xml = read('pascal/000000000139.xml').decode('utf-8')
+    objects = xml.split('<object>')[1:]
+    for tag, value in (('xmin', '10'), ('ymin', '20'), ('xmax', '40'), ('ymax', '60')):
+        assert '<%s>%s</%s>' % (tag, value, tag) in objects[0]
+    for tag, value in (('xmin', '1.5'), ('ymin', '20'), ('xmax', '31.75'), ('ymax', '60')):
+        assert '<%s>%s</%s>' % (tag, value, tag) in objects[1]
+
+# convert.py writes the same bytes as the pairwise script for the same conversion
+
+def test_convert_coco_to_pascal_keeps_integer_values(workdir):
+    write_mixed_json('mixed.json')
+    coco2pascal.create_pascalfromcoco('images', 'mixed.json', 'pairwise')
+    convert.main(['--from', 'coco', '--to', 'pascal', '-j', 'mixed.json', '-p', 'images', '-l', 'coco.names', '--voc-output', 'converted'])
+    assert read_folder('converted', '.xml') == read_folder('pairwise', '.xml')
+
+def test_yolo_to_pascal_matches_yolo2pascal(workdir):
+    yolo2pascal.create_pascalfromyolo('images', 'obj.names', 'pairwise')
+    convert.main(['--from', 'yolo', '--to', 'pascal', '-p', 'images', '-l', 'obj.names', '--voc-output', 'converted'])
+    expected = read_folder('pairwise', '.xml')
+    assert len(expected) == 20
+    assert read_folder('converted', '.xml') == expected
+
+def test_yolo_to_coco_matches_yolo2coco(workdir):
+    # Boxes crossing the image border, yolo2coco does not clip them
+    with open('images/000000000139.txt', 'a') as f:
+        f.write('0 0.02 0.5 0.2 0.3\n1 0.95 0.9 0.3 0.4\n')
+    yolo2coco.create_cocofromyolo('images', 'obj.names', 'pairwise')
+    convert.main(['--from', 'yolo', '--to', 'coco', '-p', 'images', '-l', 'obj.names', '-o', 'converted'])
+    assert any(x < 0 for x, y, w, h in (ann['bbox'] for ann in json.loads(read('pairwise.json'))['annotations']))
+    assert read('converted.json') == read('pairwise.json')
+
+def test_coco_to_pascal_matches_coco2pascal(workdir):
+    yolo2coco.create_cocofromyolo('images', 'obj.names', 'coco')
+    coco2pascal.create_pascalfromcoco('images', 'coco.json', 'pairwise')
+    convert.main(['--from', 'coco', '--to', 'pascal', '-j', 'coco.json', '-p', 'images', '-l', 'coco.names', '--voc-output', 'converted'])
+    assert read_folder('converted', '.xml') == read_folder('pairwise', '.xml')
+
+def test_coco_to_yolo_matches_coco2yolo(workdir):
+    yolo2coco.create_cocofromyolo('images', 'obj.names', 'coco')
+    copy_images('pairwise')
+    coco2yolo.create_yolofromcoco('coco.json', 'pairwise')
+    # The YOLO output folder is created when missing
+    convert.main(['--from', 'coco', '--to', 'yolo', 'pascal', '-j', 'coco.json', '-p', 'images', '-l', 'coco.names',
+                  '--yolo-output', 'new/yolo', '--voc-output', 'new/pascal'])
+    expected = read_folder('pairwise', '.txt')
+    assert len(expected) == 20
+    assert read_folder('new/yolo', '.txt') == expected
+    assert len(read_folder('new/pascal', '.xml')) == 20
+
+def test_pascal_to_coco_matches_pascal2coco(workdir):
+    yolo2pascal.create_pascalfromyolo('images', 'obj.names', 'pascal')
+    pascal2coco.create_cocofrompascal('pascal', 'obj.names', 'pairwise')
+    convert.main(['--from', 'pascal', '--to', 'coco', '-v', 'pascal', '-p', 'images', '-l', 'obj.names', '-o', 'converted'])
+    assert read('converted.json') == read('pairwise.json')
+
+def test_pascal_to_yolo_matches_pascal2yolo(workdir):
+    yolo2pascal.create_pascalfromyolo('images', 'obj.names', 'pascal')
+    copy_images('pairwise')
+    pascal2yolo.create_yolofrompascal('pairwise', 'pascal', 'obj.names')
+    convert.main(['--from', 'pascal', '--to', 'yolo', '-v', 'pascal', '-p', 'images', '-l', 'obj.names', '--yolo-output', 'converted'])
+    expected = read_folder('pairwise', '.txt')
+    assert len(expected) == 20
+    assert read_folder('converted', '.txt') == expected
+
+def test_yolo_round_trip_through_coco_and_pascal(workdir):
+    yolo2coco.create_cocofromyolo('images', 'obj.names', 'coco')
+    yolo2pascal.create_pascalfromyolo('images', 'obj.names', 'pascal')
+    pascal2coco.create_cocofrompascal('pascal', 'obj.names', 'from_pascal')
+    coco = json.loads(read('coco.json'))
+    from_pascal = json.loads(read('from_pascal.json'))
+    assert sorted(img['file_name'] for img in coco['images']) == sorted(img['file_name'] for img in from_pascal['images'])
+    assert len(coco['annotations']) == len(from_pascal['annotations'])
+
+def run_python(args):
+    env = dict(os.environ, PYTHONPATH=REPO)
+    return subprocess.run([sys.executable] + args, env=env, check=True, stdout=subprocess.PIPE).stdout.decode('utf-8')
+
+def test_command_lines_match(workdir):
+    yolo = ['--from', 'yolo', '--to', 'coco', '-p', 'images', '-l', 'obj.names', '-o']
+    run_python(['-m', 'annotation_converter'] + yolo + ['module'])
+    run_python([os.path.join(REPO, 'convert.py')] + yolo + ['script'])
+    assert read('module.json') == read('script.json')
+
+def test_heavy_modules_are_imported_lazily():
+    loaded = run_python(['-c', "import sys\n"
+                         "import annotation_converter.convert, coco2pascal, coco2yolo, pascal2coco, pascal2yolo, yolo2coco, yolo2pascal\n"
+                         "print(sorted(name for name in ('cv2', 'lxml', 'pycocotools') if name in sys.modules))"])
+    assert loaded == "[]\n"
@@ -0,0 +1,87 @@
+import os
+import struct
+import sqlite3
+import pytest
+from conftest import REPO, copy_images, read_folder
+from annotation_converter.imagesize import read_image_size, read_image_size_bytes, ImageSizeCache, set_image_cache
+import yolo2coco
+import yolo2pascal
+import pascal2yolo
+
+SAMPLE = os.path.join(REPO, 'images', '000000000139.jpg')
+
+def exif_jpeg(data, orientation, endian):
+    """
+        data with an APP1 Exif segment holding an orientation tag.
+    """
+    tiff = (b'II' if endian == '<' else b'MM') + struct.pack(endian + 'HI', 42, 8) + struct.pack(endian + 'H', 2)
+    tiff += struct.pack(endian + 'HHII', 0x010F, 2, 4, 0) + struct.pack(endian + 'HHIHH', 0x0112, 3, 1, orientation, 0)
+    segment = b'Exif\x00\x00' + tiff + struct.pack(endian + 'I', 0)
+    return data[:2] + b'\xff\xe1' + struct.pack('>H', len(segment) + 2) + segment + data[2:]
+
+@pytest.mark.parametrize('orientation', range(1, 9))
+@pytest.mark.parametrize('endian', ['<', '>'])
+def test_exif_orientation_matches_imread(tmp_path, orientation, endian):
+    cv2 = pytest.importorskip('cv2')
+    with open(SAMPLE, 'rb') as f:
+        data = exif_jpeg(f.read(), orientation, endian)
+    path = str(tmp_path / 'a.jpg')
+    with open(path, 'wb') as f:
+        f.write(data)
+    expected = cv2.imread(path).shape
+    assert read_image_size(path) == expected
+    assert read_image_size_bytes(data) == expected
+    assert (expected[0] > expected[1]) == (orientation >= 5)
+
+@pytest.mark.parametrize('ext, channels', [('.jpg', 1), ('.jpg', 3), ('.png', 1), ('.png', 3), ('.png', 4),
+                                           ('.bmp', 1), ('.bmp', 4), ('.tiff', 1), ('.tiff', 4)])
+def test_depth_matches_imread(tmp_path, ext, channels):
+    cv2 = pytest.importorskip('cv2')
+    import numpy as np
+    path = str(tmp_path / ('a' + ext))
+    image = np.zeros((5, 7, channels) if channels > 1 else (5, 7), dtype=np.uint8)
+    assert cv2.imwrite(path, image)
+    # JPEG and PNG sizes come from the header, the others are decoded
+    expected = cv2.imread(path).shape
+    assert expected == (5, 7, 3)
+    assert read_image_size(path) == expected
+    with open(path, 'rb') as f:
+        assert read_image_size_bytes(f.read()) == expected
+
+def test_image_size_cache_writes_rows_in_batches(tmp_path):
+    path = str(tmp_path / 'cache.db')
+    cache = ImageSizeCache(path, commit_rows=2)
+    images = [os.path.join(REPO, 'images', name) for name in sorted(os.listdir(os.path.join(REPO, 'images'))) if name.endswith('.jpg')][:3]
+    sizes = [cache.getImageSize(image) for image in images]
+    assert sizes == [read_image_size(image) for image in images]
+    # Two rows written, the third one is pending (and found) until close
+    assert sqlite3.connect(path).execute('SELECT COUNT(*) FROM images').fetchone() == (2,)
+    assert cache.getImageSize(images[2]) == sizes[2]
+    cache.close()
+    assert sqlite3.connect(path).execute('SELECT COUNT(*) FROM images').fetchone() == (3,)
+    cache = ImageSizeCache(path)
+    assert [cache.getImageSize(image) for image in images] == sizes
+    assert not cache.pending
+    cache.close()
+
+def convert_all(name, workers):
+    yolo2pascal.create_pascalfromyolo('images', 'obj.names', name + '_pascal', workers=workers, io_threads=2)
+    yolo2coco.create_cocofromyolo('images', 'obj.names', name, workers=workers, io_threads=2)
+    copy_images(name + '_yolo')
+    pascal2yolo.create_yolofrompascal(name + '_yolo', name + '_pascal', 'obj.names', workers=workers, io_threads=2)
+    with open(name + '.json', 'rb') as f:
+        return read_folder(name + '_pascal', '.xml'), f.read(), read_folder(name + '_yolo', '.txt')
+
+@pytest.mark.parametrize('workers', [1, 2])
+def test_image_cache_with_io_threads(workdir, workers):
+    expected = convert_all('plain', workers)
+    set_image_cache('cache.db')
+    try:
+        # The reads of the pipeline share the cache from several threads
+        assert convert_all('cached', workers) == expected
+        assert convert_all('again', workers) == expected
+    finally:
+        set_image_cache(None)
+    rows = sqlite3.connect('cache.db').execute('SELECT COUNT(*) FROM images').fetchone()[0]
+    # The images of images/, cached_yolo/ and again_yolo/
+    assert rows == 60
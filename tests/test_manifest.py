@@ -0,0 +1,88 @@
+import os
+from conftest import read_folder
+from annotation_converter.manifest import Manifest
+import yolo2pascal
+
+def write(path, text):
+    with open(path, 'w') as f:
+        f.write(text)
+
+def copy_file(source, target):
+    with open(source) as f:
+        write(target, f.read())
+
+class Converter:
+    """
+        convert argument of Manifest.convertChanged copying in/<name> to
+        out/<name> and recording the names it was given.
+    """
+
+    def __init__(self):
+        self.names = []
+
+    def __call__(self, items):
+        for name in items:
+            self.names.append(name)
+            copy_file(os.path.join('in', name), os.path.join('out', name))
+
+    def dependencies(self, name):
+        return {'key': name, 'inputs': [os.path.join('in', name)], 'outputs': [os.path.join('out', name)]}
+
+def convert_changed(names):
+    converter = Converter()
+    manifest = Manifest(os.path.join('out', '.test.manifest.json'))
+    converted, removed = manifest.convertChanged(names, converter.dependencies, converter)
+    assert converted == len(converter.names)
+    return converter.names, removed
+
+def test_convert_changed(tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    os.makedirs('in')
+    os.makedirs('out')
+    names = ['a', 'b', 'c']
+    for name in names:
+        write(os.path.join('in', name), name)
+    assert convert_changed(names) == (names, [])
+    assert convert_changed(names) == ([], [])
+
+    # A changed input, and a touched output with the same content
+    write(os.path.join('in', 'b'), 'changed')
+    os.utime(os.path.join('out', 'c'), ns=(0, 0))
+    assert convert_changed(names) == (['b'], [])
+    # A modified output is converted again
+    write(os.path.join('out', 'a'), 'modified')
+    assert convert_changed(names) == (['a'], [])
+
+    # The output of a vanished input is removed
+    os.remove(os.path.join('in', 'c'))
+    assert convert_changed(['a', 'b']) == ([], ['c'])
+    assert sorted(os.listdir('out')) == ['.test.manifest.json', 'a', 'b']
+    with open(os.path.join('out', 'b')) as f:
+        assert f.read() == 'changed'
+
+def test_incremental_yolo2pascal(workdir, capsys):
+    yolo2pascal.create_pascalfromyolo('images', 'obj.names', 'full')
+    yolo2pascal.create_pascalfromyolo('images', 'obj.names', 'pascal', incremental=True)
+    assert capsys.readouterr().out == "20 of 20 files converted, 0 removed\n"
+    yolo2pascal.create_pascalfromyolo('images', 'obj.names', 'pascal', incremental=True)
+    assert capsys.readouterr().out == "0 of 20 files converted, 0 removed\n"
+    assert read_folder('pascal', '.xml') == read_folder('full', '.xml')
+
+    # One label file changed and one image removed with its labels
+    with open('images/000000000139.txt', 'a') as f:
+        f.write('0 0.5 0.5 0.2 0.2\n')
+    os.remove('images/000000000285.jpg')
+    os.remove('images/000000000285.txt')
+    yolo2pascal.create_pascalfromyolo('images', 'obj.names', 'pascal', incremental=True)
+    assert capsys.readouterr().out == "1 of 19 files converted, 1 removed\n"
+    assert not os.path.exists('pascal/000000000285.xml')
+    yolo2pascal.create_pascalfromyolo('images', 'obj.names', 'again')
+    assert read_folder('pascal', '.xml') == read_folder('again', '.xml')
+
+def test_label_map_change_converts_everything(workdir, capsys):
+    yolo2pascal.create_pascalfromyolo('images', 'obj.names', 'pascal', incremental=True)
+    with open('obj.names', 'a') as f:
+        f.write('extra\n')
+    capsys.readouterr()
+    yolo2pascal.create_pascalfromyolo('images', 'obj.names', 'pascal', incremental=True)
+    assert capsys.readouterr().out == "20 of 20 files converted, 0 removed\n"
@@ -0,0 +1,41 @@
+import numpy as np
+import pytest
+from conftest import read_folder, write_mixed_json
+from annotation_converter import convert
+import yolo2pascal
+from annotation_converter.packed import load_packed, save_packed
+
+INPUTS = {
+    'yolo': ['--from', 'yolo', '-p', 'images', '-l', 'obj.names'],
+    'pascal': ['--from', 'pascal', '-v', 'pascal', '-p', 'images', '-l', 'obj.names'],
+    'coco': ['--from', 'coco', '-j', 'mixed.json', '-p', 'images', '-l', 'coco.names'],
+}
+
+def convert_all(args, name):
+    convert.main(args + ['--to', 'coco', 'pascal', 'yolo', '-o', name, '--voc-output', name + '_pascal', '--yolo-output', name + '_yolo'])
+    with open(name + '.json', 'rb') as f:
+        return f.read(), read_folder(name + '_pascal', '.xml'), read_folder(name + '_yolo', '.txt')
+
+@pytest.mark.parametrize('source', sorted(INPUTS))
+def test_packed_conversion_matches_input(workdir, source):
+    yolo2pascal.create_pascalfromyolo('images', 'obj.names', 'pascal')
+    write_mixed_json('mixed.json')
+    expected = convert_all(INPUTS[source], 'direct')
+    convert.main(INPUTS[source] + ['--to', 'packed', '-c', 'data.pack'])
+    data = load_packed('data.pack')
+    assert data.source == source
+    assert convert_all(['--from', 'packed', '-c', 'data.pack', '-p', 'images', '-l', 'packed.names'], 'packed') == expected
+    # A pack of a pack is the same file
+    save_packed(data, 'copy.pack')
+    with open('data.pack', 'rb') as f, open('copy.pack', 'rb') as g:
+        assert f.read() == g.read()
+
+def test_packed_boxes_are_float32_when_lossless(workdir):
+    write_mixed_json('mixed.json')
+    convert.main(INPUTS['coco'] + ['--to', 'packed', '-c', 'mixed.pack'])
+    assert load_packed('mixed.pack').boxes.dtype == np.float32
+    yolo2pascal.create_pascalfromyolo('images', 'obj.names', 'pascal')
+    convert.main(INPUTS['pascal'] + ['--to', 'packed', '-c', 'pascal.pack'])
+    data = load_packed('pascal.pack')
+    assert data.boxes.dtype == np.float64
+    assert data.getImage(0)[3].tolist() == convert.load_dataset('pascal', 'images', vocfolder_path='pascal', label_path='obj.names').getImage(0)[3].tolist()
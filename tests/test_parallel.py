@@ -0,0 +1,44 @@
+import pytest
+from conftest import copy_images, read_folder
+from annotation_converter.parallel import parallel_imap, parallel_map
+import coco2pascal
+import coco2yolo
+import pascal2coco
+import pascal2yolo
+import yolo2coco
+import yolo2pascal
+
+def read(path):
+    with open(path, 'rb') as f:
+        return f.read()
+
+def convert_all(name, workers):
+    """
+        The outputs of the six converters run with workers processes.
+    """
+    yolo2coco.create_cocofromyolo('images', 'obj.names', name, workers=workers)
+    yolo2pascal.create_pascalfromyolo('images', 'obj.names', name + '_pascal', workers=workers)
+    pascal2coco.create_cocofrompascal(name + '_pascal', 'obj.names', name + '_frompascal', workers=workers)
+    coco2pascal.create_pascalfromcoco('images', name + '.json', name + '_fromcoco', workers=workers)
+    copy_images(name + '_yolo')
+    pascal2yolo.create_yolofrompascal(name + '_yolo', name + '_pascal', 'obj.names', workers=workers)
+    copy_images(name + '_cocoyolo')
+    coco2yolo.create_yolofromcoco(name + '.json', name + '_cocoyolo', workers=workers)
+    return (read(name + '.json'), read_folder(name + '_pascal', '.xml'), read(name + '_frompascal.json'),
+            read_folder(name + '_fromcoco', '.xml'), read_folder(name + '_yolo', '.txt'), read_folder(name + '_cocoyolo', '.txt'))
+
+def test_workers_write_the_same_files_as_a_serial_run(workdir):
+    serial = convert_all('serial', 1)
+    assert len(serial[1]) == 20
+    assert convert_all('parallel', 3) == serial
+
+def square(x):
+    return x * x
+
+@pytest.mark.parametrize('chunksize', [None, 1, 7])
+def test_parallel_imap_keeps_the_order(chunksize):
+    items = list(range(100))
+    expected = [square(x) for x in items]
+    assert parallel_map(square, items, 3, chunksize) == expected
+    # Items without a len() are fed to the pool as they come
+    assert list(parallel_imap(square, iter(items), 3, chunksize, pending=10)) == expected
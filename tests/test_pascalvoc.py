@@ -0,0 +1,129 @@
+import pytest
+from annotation_converter.pascalvoc import PascalVocReader, PascalVocWriter
+
+etree = pytest.importorskip('lxml.etree')
+
+def baseline_xml(foldername, filename, imgSize, boxes, localImgPath=None, verified=False, databaseSrc='detection_objects'):
+    """
+        The ElementTree document pretty-printed by lxml that the pairwise
+        scripts wrote before PascalVocWriter formatted the XML itself.
+    """
+    from xml.etree import ElementTree
+    from xml.etree.ElementTree import Element, SubElement
+    top = Element('annotation')
+    if verified:
+        top.set('verified', 'yes')
+    SubElement(top, 'folder').text = foldername
+    SubElement(top, 'filename').text = filename
+    if localImgPath is not None:
+        SubElement(top, 'path').text = localImgPath
+    source = SubElement(top, 'source')
+    SubElement(source, 'database').text = databaseSrc
+    size_part = SubElement(top, 'size')
+    SubElement(size_part, 'width').text = str(imgSize[1])
+    SubElement(size_part, 'height').text = str(imgSize[0])
+    SubElement(size_part, 'depth').text = str(imgSize[2]) if len(imgSize) == 3 else '1'
+    SubElement(top, 'segmented').text = '0'
+    for xmin, ymin, xmax, ymax, name, difficult in boxes:
+        object_item = SubElement(top, 'object')
+        SubElement(object_item, 'name').text = name
+        SubElement(object_item, 'pose').text = "Unspecified"
+        truncated = SubElement(object_item, 'truncated')
+        if int(ymax) == int(imgSize[0]) or (int(ymin)== 1):
+            truncated.text = "1"
+        elif (int(xmax)==int(imgSize[1])) or (int(xmin)== 1):
+            truncated.text = "1"
+        else:
+            truncated.text = "0"
+        SubElement(object_item, 'difficult').text = str( bool(difficult) & 1 )
+        bndbox = SubElement(object_item, 'bndbox')
+        SubElement(bndbox, 'xmin').text = str(xmin)
+        SubElement(bndbox, 'ymin').text = str(ymin)
+        SubElement(bndbox, 'xmax').text = str(xmax)
+        SubElement(bndbox, 'ymax').text = str(ymax)
+    root = etree.fromstring(ElementTree.tostring(top, 'utf8'))
+    return etree.tostring(root, pretty_print=True, encoding='utf-8').replace("  ".encode(), "\t".encode())
+
+BOXES = [(1, 20, 30.5, 40.25, 'dog', 0), (0.0, 1.5, 640, 480, 'cat', 1)]
+
+CASES = {
+    'plain': dict(foldername='images', filename='a.jpg', imgSize=(480, 640, 3), boxes=BOXES),
+    'path and verified': dict(foldername='images', filename='a.jpg', imgSize=(480, 640), boxes=BOXES, localImgPath='/data/images/a.jpg', verified=True),
+    'no objects': dict(foldername='images', filename='a.jpg', imgSize=(480, 640, 3), boxes=[]),
+    'escaping': dict(foldername='a&b', filename='<x>.jpg', imgSize=(480, 640, 3), boxes=[(1, 2, 3, 4, 'R&D <"quoted"> \'it\'', 0)],
+                     localImgPath='c:\\a&b\\<x>.jpg', databaseSrc='>'),
+    'empty text': dict(foldername='', filename='a.jpg', imgSize=(480, 640, 3), boxes=[(1, 2, 3, 4, '', 0)], localImgPath='', databaseSrc=''),
+    'double spaces': dict(foldername='my  images', filename='a   b.jpg', imgSize=(480, 640, 3), boxes=[(1, 2, 3, 4, 'traffic  light', 0)]),
+    'non ascii': dict(foldername='imágenes', filename='日本.jpg', imgSize=(480, 640, 3), boxes=[(1, 2, 3, 4, 'çà ø €', 0)]),
+    'line breaks': dict(foldername='a\nb', filename='a\r\nb.jpg', imgSize=(480, 640, 3), boxes=[(1, 2, 3, 4, 'x\ry', 0)]),
+}
+
+@pytest.mark.parametrize('case', sorted(CASES))
+def test_writer_matches_baseline_serializer(case):
+    kwargs = dict(CASES[case])
+    boxes = kwargs.pop('boxes')
+    verified = kwargs.pop('verified', False)
+    writer = PascalVocWriter(kwargs['foldername'], kwargs['filename'], kwargs['imgSize'],
+                             databaseSrc=kwargs.get('databaseSrc', 'detection_objects'), localImgPath=kwargs.get('localImgPath'))
+    writer.verified = verified
+    for xmin, ymin, xmax, ymax, name, difficult in boxes:
+        writer.addBndBox(xmin, ymin, xmax, ymax, name, difficult)
+    assert writer.toBytes() == baseline_xml(boxes=boxes, verified=verified, **kwargs)
+
+VOC_OBJECT = """  <object>
+    <name>%s</name>
+    <difficult>%s</difficult>
+    <bndbox>
+      <xmin>%s</xmin>
+      <ymin>12</ymin>
+      <xmax>30.5</xmax>
+      <ymax>40</ymax>
+    </bndbox>
+  </object>
+"""
+
+def voc_document(objects, head='', root='<annotation>', size=True):
+    size = '  <size>\n    <width>640</width>\n    <height>480</height>\n    <depth>3</depth>\n  </size>\n' if size else ''
+    return head + root + '\n  <filename>a.jpg</filename>\n' + size + ''.join(VOC_OBJECT % obj for obj in objects) + '</annotation>\n'
+
+DOCUMENTS = {
+    'plain': voc_document([('dog', 0, 1), ('cat', 1, 2.25)]),
+    'declaration': voc_document([('dog', 0, 1)], head='<?xml version="1.0" encoding="utf-8"?>\n'),
+    'latin-1 declaration': voc_document([('chien', 0, 1)], head='<?xml version="1.0" encoding="ISO-8859-1"?>\n'),
+    'verified': voc_document([('dog', 0, 1)], root='<annotation verified="yes">'),
+    'no size': voc_document([('dog', 0, 1)], size=False),
+    'no objects': voc_document([]),
+    'non ascii': voc_document([('çà ø €', 0, 1)]),
+    'entity': voc_document([('R&amp;D', 0, 1)]),
+    'comment': voc_document([('dog', 0, 1), ('cat<!-- x -->', 0, 2)]),
+    'no difficult': voc_document([('dog', 0, 1)]).replace('    <difficult>0</difficult>\n', ''),
+    'object part': voc_document([('person', 0, 1)]).replace('  </object>', '    <part><name>hand</name><bndbox><xmin>1</xmin><ymin>2</ymin>'
+                                                            '<xmax>3</xmax><ymax>4</ymax></bndbox></part>\n  </object>'),
+}
+
+def read_voc(path):
+    reader = PascalVocReader(path)
+    return reader.filename, reader.size, reader.verified, reader.labels, reader.boxes.tolist(), reader.difficult.tolist()
+
+@pytest.mark.parametrize('document', sorted(DOCUMENTS))
+def test_fast_reader_matches_lxml(tmp_path, monkeypatch, document):
+    text = DOCUMENTS[document]
+    path = str(tmp_path / 'a.xml')
+    with open(path, 'wb') as f:
+        f.write(text.encode('iso-8859-1' if 'ISO-8859-1' in text else 'utf-8'))
+    fast = read_voc(path)
+    monkeypatch.setattr(PascalVocReader, 'parseFast', lambda self, data: False)
+    assert fast == read_voc(path)
+
+def test_fast_reader_reads_the_writer_output(tmp_path, monkeypatch):
+    path = str(tmp_path / 'a.xml')
+    writer = PascalVocWriter('images', 'a.jpg', (480, 640, 3))
+    for xmin, ymin, xmax, ymax, name, difficult in BOXES:
+        writer.addBndBox(xmin, ymin, xmax, ymax, name, difficult)
+    writer.save(path)
+    with open(path, 'rb') as f:
+        assert PascalVocReader(path).parseFast(f.read())
+    fast = read_voc(path)
+    assert fast == ('a.jpg', (640, 480, 3), False, ['dog', 'cat'], [[1, 20, 30.5, 40.25], [0, 1.5, 640, 480]], [False, True])
+    monkeypatch.setattr(PascalVocReader, 'parseFast', lambda self, data: False)
+    assert fast == read_voc(path)
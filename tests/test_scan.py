@@ -0,0 +1,70 @@
+import os
+import shutil
+from annotation_converter.scan import scan, file_kind, walk_path
+import yolo2pascal
+
+def touch(folder, *names):
+    for name in names:
+        path = os.path.join(folder, name)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        open(path, 'w').close()
+
+def test_file_kind():
+    assert file_kind('a.JPG') == 'image'
+    assert file_kind('a.b.png') == 'image'
+    assert file_kind('a.txt') == 'label'
+    assert file_kind('a.XML') == 'xml'
+    assert file_kind('a.json') is None
+    assert file_kind('jpg') is None
+
+def test_scan_pairs_files_by_key(tmp_path):
+    folder = str(tmp_path)
+    touch(folder, 'a.jpg', 'a.txt', 'a.xml', 'b.PNG', 'b.txt', 'c.txt', 'd.jpeg', 'e.json', 'sub/f.jpg', 'sub/f.txt')
+    index = scan(folder)
+    assert sorted(index.samples) == ['a', 'b', 'c', 'd']
+    a = index.samples['a']
+    assert (a.image, a.label, a.xml) == ('a.jpg', 'a.txt', 'a.xml')
+    assert (index.samples['b'].image, index.samples['b'].label) == ('b.PNG', 'b.txt')
+    assert sorted(sample.key for sample in index.ordered('image', required=('label',))) == ['a', 'b']
+    assert index.orphans('label', 'image') == ['c.txt']
+    assert sorted(index.orphans('image', 'label')) == ['d.jpeg']
+    assert index.duplicates == []
+
+    # Only the kinds asked for, subfolders when recursive
+    index = scan(folder, ('image', 'label'), recursive=True)
+    assert index.ordered('xml') == []
+    assert index.samples['sub/f'].image == 'sub/f.jpg'
+    assert index.samples['sub/f'].label == 'sub/f.txt'
+    assert walk_path(folder, 'sub/f.jpg') == os.path.join(folder, 'sub') + '/f.jpg'
+    assert walk_path(folder, 'a.jpg') == folder + '/a.jpg'
+
+def test_scan_order_matches_listdir(tmp_path):
+    folder = str(tmp_path)
+    names = ['%03d.jpg' % index for index in range(50)]
+    touch(folder, *names)
+    touch(folder, 'sub/a.jpg')
+    index = scan(folder, recursive=True)
+    # Files of a folder come before those of its subfolders
+    expected = [name for name in os.listdir(folder) if name.endswith('.jpg')] + ['sub/a.jpg']
+    assert [sample.image for sample in index.ordered('image')] == expected
+
+def test_scan_keeps_duplicates_listed(tmp_path):
+    folder = str(tmp_path)
+    touch(folder, 'a.jpg', 'a.png', 'a.txt')
+    index = scan(folder)
+    images = [sample.image for sample in index.ordered('image')]
+    assert sorted(images) == ['a.jpg', 'a.png']
+    # The first image scanned is paired, the other is listed on its own
+    assert index.duplicates == images[1:]
+    assert [sample.image for sample in index.ordered('image', required=('label',))] == images[:1]
+    assert index.samples['a'].image == images[0]
+
+def test_converter_warns_about_duplicates_and_orphans(workdir, capsys):
+    shutil.copy('images/000000000139.jpg', 'images/000000000139.png')
+    with open('images/orphan.txt', 'w') as f:
+        f.write('0 0.5 0.5 0.2 0.2\n')
+    yolo2pascal.create_pascalfromyolo('images', 'obj.names', 'pascal')
+    err = capsys.readouterr().err
+    assert "Warning: 1 txt files have no image, skipped (e.g. orphan.txt)" in err
+    assert "Warning: 1 images have the name of another image, skipped" in err
+    assert len(os.listdir('pascal')) == 20
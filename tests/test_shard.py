@@ -0,0 +1,81 @@
+import os
+import json
+import argparse
+import pytest
+from conftest import read_folder
+from annotation_converter.shard import parse_shard, in_shard, shard_name, merge_coco
+import yolo2coco
+import yolo2pascal
+
+SHARDS = 3
+
+def read_json(path):
+    with open(path) as f:
+        return json.load(f)
+
+def test_parse_shard():
+    assert parse_shard('0/8') == (0, 8)
+    assert parse_shard('7/8') == (7, 8)
+    for text in ('8/8', '-1/8', '0/0', '1', 'a/b'):
+        with pytest.raises(argparse.ArgumentTypeError):
+            parse_shard(text)
+
+def test_shard_depends_on_the_file_name_only():
+    assert in_shard('a/b/000000000139.txt', None)
+    for index in range(SHARDS):
+        assert in_shard('a/b/000000000139.txt', (index, SHARDS)) == in_shard('000000000139.txt', (index, SHARDS))
+    assert sum(in_shard('000000000139.txt', (index, SHARDS)) for index in range(SHARDS)) == 1
+    assert shard_name('output', None) == 'output'
+    assert shard_name('output', (1, SHARDS)) == 'output.shard1of3'
+
+def test_shards_split_the_files(workdir):
+    yolo2pascal.create_pascalfromyolo('images', 'obj.names', 'full')
+    shards = []
+    for index in range(SHARDS):
+        yolo2pascal.create_pascalfromyolo('images', 'obj.names', 'shard%d' % index, shard=(index, SHARDS))
+        shards.append(read_folder('shard%d' % index, '.xml'))
+    assert all(shards)
+    merged = {}
+    for files in shards:
+        assert not set(files) & set(merged)
+        merged.update(files)
+    assert merged == read_folder('full', '.xml')
+
+def annotations_by_file(coco):
+    """
+        {file name: [(category id, bbox), ...]} of a COCO json, without the ids.
+    """
+    files = {img['id']: img['file_name'] for img in coco['images']}
+    result = {name: [] for name in files.values()}
+    for ann in coco['annotations']:
+        result[files[ann['image_id']]].append((ann['category_id'], ann['bbox']))
+    return result
+
+def test_merge_coco_renumbers_the_ids(workdir):
+    yolo2coco.create_cocofromyolo('images', 'obj.names', 'full')
+    paths = []
+    for index in range(SHARDS):
+        yolo2coco.create_cocofromyolo('images', 'obj.names', 'output', shard=(index, SHARDS))
+        paths.append('output.shard%dof%d.json' % (index, SHARDS))
+    # Every shard numbers its images and annotations from the start
+    assert all(read_json(path)['images'][0]['id'] == 0 for path in paths)
+
+    full = read_json('full.json')
+    assert merge_coco(paths, 'merged.json') == (len(full['images']), len(full['annotations']))
+    merged = read_json('merged.json')
+    assert [img['id'] for img in merged['images']] == list(range(len(full['images'])))
+    assert [ann['id'] for ann in merged['annotations']] == list(range(1, len(full['annotations']) + 1))
+    assert [img['file_name'] for img in merged['images']] == [img['file_name'] for path in paths for img in read_json(path)['images']]
+    assert merged['categories'] == full['categories']
+    assert annotations_by_file(merged) == annotations_by_file(full)
+
+def test_merge_coco_rejects_different_categories(workdir):
+    yolo2coco.create_cocofromyolo('images', 'obj.names', 'output', shard=(0, 2))
+    coco = read_json('output.shard0of2.json')
+    coco['categories'] = coco['categories'][:1]
+    with open('other.json', 'w') as f:
+        json.dump(coco, f)
+    with pytest.raises(ValueError):
+        merge_coco(['output.shard0of2.json', 'other.json'], 'merged.json')
+    assert not os.path.exists('merged.json')
+    assert not os.path.exists('merged.json.tmp')
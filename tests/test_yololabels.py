@@ -0,0 +1,108 @@
+import os
+import numpy as np
+import pytest
+from annotation_converter.yololabels import parse_labels, iter_label_files, format_labels
+from annotation_converter.pipeline import write_file
+
+def parse_lines(text):
+    """
+        parse_labels of the text, line by line as the scripts used to.
+    """
+    classes, boxes, confidences = [], [], []
+    for line in text.splitlines():
+        values = line.split()
+        if values:
+            classes.append(int(values[0]))
+            boxes.append([float(value) for value in values[1:5]])
+            confidences.append(float(values[5]) if len(values) == 6 else np.nan)
+    return classes, boxes, confidences
+
+LABELS = {
+    'plain': "0 0.5 0.5 0.2 0.3\n12 0.1 0.2 0.3 0.4\n",
+    'no final newline': "0 0.5 0.5 0.2 0.3\n12 0.1 0.2 0.3 0.4",
+    'blank lines': "\n0 0.5 0.5 0.2 0.3\n\n   \n12 0.1 0.2 0.3 0.4\n\n",
+    'whitespace': "  0\t0.5 0.5   0.2 0.3 \r\n12 0.1 0.2 0.3 0.4\r\n",
+    'confidence': "0 0.5 0.5 0.2 0.3 0.9\n12 0.1 0.2 0.3 0.4 0.25\n",
+    'some confidences': "0 0.5 0.5 0.2 0.3\n12 0.1 0.2 0.3 0.4 0.25\n",
+    'exponent': "3 5e-01 1E-1 .2 1.\n",
+    'empty': "",
+}
+
+@pytest.mark.parametrize('labels', sorted(LABELS))
+def test_parse_labels(labels):
+    text = LABELS[labels]
+    classes, boxes, confidences = parse_labels(text)
+    assert parse_labels(text.encode('utf-8'))[0].tolist() == classes.tolist()
+    expected_classes, expected_boxes, expected_confidences = parse_lines(text)
+    assert classes.dtype == np.int64
+    assert classes.tolist() == expected_classes
+    assert boxes.shape == (len(expected_classes), 4)
+    assert boxes.tolist() == expected_boxes
+    if np.isnan(expected_confidences).all():
+        assert confidences is None
+    else:
+        np.testing.assert_array_equal(confidences, expected_confidences)
+
+@pytest.mark.parametrize('text, message', [
+    ("0 0.5 0.5 0.2 0.3\n1 0.5 0.5 0.2\n", "a.txt line 2 has 4 values"),
+    ("\n\n0 0.5 0.5 0.2 0.3 0.9 1\n", "a.txt line 3 has 7 values"),
+    ("0.5 0.5 0.5 0.2 0.3\n", "a.txt line 1 has a class index that is not an integer: 0.5"),
+    ("0 0.5 x 0.2 0.3\n", "a.txt: could not convert string"),
+])
+def test_parse_labels_errors(text, message):
+    with pytest.raises(ValueError, match=message):
+        parse_labels(text, 'a.txt')
+
+def test_iter_label_files(tmp_path):
+    texts = [LABELS[name] for name in sorted(LABELS)] + [None, LABELS['confidence']]
+    paths = []
+    for index, text in enumerate(texts):
+        path = str(tmp_path / ('%d.txt' % index))
+        if text is not None:
+            with open(path, 'w', newline='') as f:
+                f.write(text)
+        paths.append(path)
+    # Files (batches) joined without a final newline keep their rows apart
+    for batch in (1, 2, 3, len(paths)):
+        results = list(iter_label_files(paths, batch))
+        assert len(results) == len(paths)
+        for path, text, (classes, boxes, confidences) in zip(paths, texts, results):
+            expected = parse_labels(text or "", path)
+            assert classes.tolist() == expected[0].tolist()
+            assert boxes.tolist() == expected[1].tolist()
+            assert (confidences is None) == (expected[2] is None)
+            if confidences is not None:
+                np.testing.assert_array_equal(confidences, expected[2])
+
+def test_iter_label_files_error_names_the_file(tmp_path):
+    paths = [str(tmp_path / name) for name in ('a.txt', 'b.txt')]
+    for path, text in zip(paths, ("0 0.5 0.5 0.2 0.3\n", "0 0.5 0.5 0.2 0.3\n1 0.5\n")):
+        with open(path, 'w') as f:
+            f.write(text)
+    with pytest.raises(ValueError, match="b.txt line 2 has 2 values"):
+        list(iter_label_files(paths))
+
+def test_format_labels():
+    classes = np.array([0, 12, 3])
+    boxes = [[0.5, 0.25, 0.2, 0.3], [0.1234567, 1e-7, 1.0, 0.0], [1 / 3, 2 / 3, 0.999999, 0.0000005]]
+    # One line per box, as the scripts used to write them
+    expected = "".join("%d %.6f %.6f %.6f %.6f\n" % ((category,) + tuple(box)) for category, box in zip(classes.tolist(), boxes))
+    assert format_labels(classes, boxes) == expected
+    assert format_labels(classes, boxes, "%r") == "".join("%d %r %r %r %r\n" % ((category,) + tuple(box)) for category, box in zip(classes.tolist(), boxes))
+    assert format_labels([], np.zeros((0, 4))) == ""
+    parsed = parse_labels(format_labels(classes, boxes, "%r"))
+    assert parsed[0].tolist() == classes.tolist()
+    assert parsed[1].tolist() == boxes
+
+def test_write_file_replaces_the_file_at_once(tmp_path):
+    path = str(tmp_path / 'a.txt')
+    write_file(path, "0 0.5 0.5 0.2 0.2\n")
+    write_file(path, b"1 0.5 0.5 0.2 0.2\n")
+    with open(path, 'rb') as f:
+        assert f.read() == b"1 0.5 0.5 0.2 0.2\n"
+    # A failed write keeps the previous file and leaves no temporary file
+    with pytest.raises(UnicodeEncodeError):
+        write_file(path, "2 0.5 0.5 0.2 0.2\n\udc80")
+    with open(path, 'rb') as f:
+        assert f.read() == b"1 0.5 0.5 0.2 0.2\n"
+    assert os.listdir(str(tmp_path)) == ['a.txt']
@@ -1,125 +1,168 @@
-import json
-import cv2
 import os
 import time
 import argparse
-
-def create_image_annotation(file_name, width, height, image_id):
-    file_name = file_name.split('/')[-1]
-    images = {
-        'file_name': file_name,
-        'height': height,
-        'width': width,
-        'id': image_id
-    }
-    return images
-    
-def create_annotation_yolo_format(min_x, min_y, width, height, image_id, category_id, annotation_id):
-    bbox = (min_x, min_y, width, height)
-    area = round(width * height,2)
-
-    annotation = {
-        'id': annotation_id,
-        'image_id': image_id,
-        'bbox': bbox,
-        'area': area,
-        'iscrowd': 0,
-        'category_id': category_id,
-        'segmentation': []
-    }
-
-    return annotation
-
-coco_format = {
-    "images": [
-        {
-        }
-    ],
-    "categories": [
-
-    ],
-    "annotations": [
-        {
-        }
-    ]
-}
-
-def images_annotations_info(yolo_path):
-
-    path = []
-
-    for subdir, dirs, files in os.walk(yolo_path):
-        for file in files:
-            if file.endswith(".jpg") or file.endswith(".png"):
-                filepath = subdir+"/"+file
-                path.append(filepath)
-
-    annotations = []
-    images = []
-
+from functools import partial
+from annotation_converter.imagesize import get_image_size, set_image_cache
+from annotation_converter.parallel import parallel_imap
+from annotation_converter.pipeline import pipeline_imap
+from annotation_converter.cocoio import CocoJsonWriter, create_image_annotation, create_annotations, create_categories, update_cocojson
+from annotation_converter.manifest import MANIFEST_NAME
+from annotation_converter.labelmap import LabelMap
+from annotation_converter.shard import parse_shard, select_shard, shard_name
+from annotation_converter.bbox import yolo_to_coco
+from annotation_converter.yololabels import parse_labels
+from annotation_converter.records import CocoBoxes
+from annotation_converter.scan import scan, walk_path, warn_orphans
+from annotation_converter import instrument
+from annotation_converter.instrument import stage, count
+
+def load_yolofile(line):
+    """
+        The I/O of read_yolofile: the image size and the lines of the txt file.
+    """
+    line = line.replace('\n', '')
+    imgSize = get_image_size(line)
+
+    # read a label file, an image without one has no objects
+    label_path = label_file_path(line)
+    with stage('read'):
+        try:
+            with open(label_path, "r") as label_file:
+                label_read_line = label_file.readlines()
+        except FileNotFoundError:
+            label_read_line = []
+    count('bytes_read', sum(len(label_line) for label_line in label_read_line))
+    return line, imgSize, label_read_line
+
+def parse_yolofile(loaded, labelmap=None):
+    """
+        Return (image path, width, height, boxes) from the result of
+        load_yolofile, boxes being a records.CocoBoxes. Class indices are
+        checked against labelmap when it is given.
+    """
+    line, (h, w, _), label_read_line = loaded
+
+    # yolo format - (class_id, x_center, y_center, width, height)
+    # coco format - (annotation_id, x_upper_left, y_upper_left, width, height)
+    with stage('parse'):
+        classes, values, _ = parse_labels("".join(label_read_line), label_file_path(line))
+        if labelmap is not None:
+            labelmap.getNames(classes)
+    count('boxes', len(classes))
+
+    with stage('convert'):
+        boxes = CocoBoxes(classes + 1, yolo_to_coco(values, w, h))    # you start with annotation id with '1'
+    return line, w, h, boxes
+
+def read_yolofile(line, labelmap=None):
+    """
+        Return (image path, width, height, boxes) for an image and its YOLO
+        txt file, see parse_yolofile.
+    """
+    return parse_yolofile(load_yolofile(line), labelmap)
+
+def read_yolofiles(path, workers=1, labelmap=None, io_threads=0):
+    """
+        Yield read_yolofile(line) for every image path in order. With
+        io_threads the files are read by threads ahead of the parsing.
+    """
+    if io_threads:
+        return pipeline_imap(load_yolofile, partial(parse_yolofile, labelmap=labelmap), path, workers, io_threads)
+    return parallel_imap(partial(read_yolofile, labelmap=labelmap), path, workers)
+
+def label_file_path(line):
+    return os.path.splitext(line)[0] + ".txt"
+
+def list_images(yolo_path):
+    """
+        Paths of the images under yolo_path, in os.walk order.
+    """
+    index = scan(yolo_path, ('image', 'label'), recursive=True)
+    warn_orphans(index.orphans('label', 'image'), "txt files have no image")
+    return [walk_path(yolo_path, sample.image) for sample in index.ordered('image')]
+
+def iter_images_boxes(yolo_path, workers=1, labelmap=None, io_threads=0, shard=None):
+    """
+        Yield (image, boxes, id of the first annotation) in COCO format for
+        every image file, boxes being a records.CocoBoxes.
+    """
+    path = select_shard(list_images(yolo_path), shard)
+    results = read_yolofiles(path, workers, labelmap, io_threads)
+
+    # ids are assigned in file order, the same as a serial run
     image_id = 0
     annotation_id = 1   # In COCO dataset format, you must start annotation id with '1'
 
-    for line in path:
-
-        line = line.replace('\n', '')
-        img_file = cv2.imread(line)
-
-        # read a label file
-        label_path = line[:-3]+"txt"
-        label_file = open(label_path,"r")
-        label_read_line = label_file.readlines()
-        label_file.close()
-
-        h, w, _ = img_file.shape
-
+    for line, w, h, boxes in results:
         # Create image annotation
         image = create_image_annotation(line, w, h, image_id)
-        images.append(image)
-
-        # yolo format - (class_id, x_center, y_center, width, height)
-        # coco format - (annotation_id, x_upper_left, y_upper_left, width, height)
-        for line1 in label_read_line:
-            label_line = line1
-            category_id = int(label_line.split()[0]) + 1    # you start with annotation id with '1'
-            x_center = float(img_file.shape[1])*float(label_line.split()[1])
-            y_center = float(img_file.shape[0])*float(label_line.split()[2])
-            width = float(img_file.shape[1])*float(label_line.split()[3])
-            height = float(img_file.shape[0])*float(label_line.split()[4])
-
-            min_x = round(x_center-width/2,2)
-            min_y = round(y_center-height/2,2)
-            width = round(width,2)
-            height = round(height,2)
-
-            annotation = create_annotation_yolo_format(min_x, min_y, width, height, image_id, category_id, annotation_id)
-            annotations.append(annotation)
-            annotation_id += 1
 
+        yield image, boxes, annotation_id
+        annotation_id += len(boxes)
         image_id += 1  # if you finished annotation work, updates the image id.
 
+def iter_images_annotations(yolo_path, workers=1, labelmap=None, io_threads=0, shard=None):
+    """
+        Yield (image, annotations) in COCO format for every image file.
+    """
+    for image, boxes, annotation_id in iter_images_boxes(yolo_path, workers, labelmap, io_threads, shard):
+        yield image, create_annotations(boxes, image['id'], annotation_id)
+
+def images_annotations_info(yolo_path, workers=1):
+    annotations = []
+    images = []
+    for image, image_annotations in iter_images_annotations(yolo_path, workers):
+        images.append(image)
+        annotations.extend(image_annotations)
+
     return images, annotations
 
-def create_cocofromyolo(yolo_path, labels_path, output_name):
+def yolofile_dependencies(line, labels_path):
+    # An image without a txt file is converted again once it gets one
+    label_path = label_file_path(line)
+    inputs = [label_path, labels_path] if os.path.exists(label_path) else [labels_path]
+    return {'key': line, 'inputs': inputs, 'images': [line]}
+
+def update_cocofromyolo(yolo_path, labels_path, output_name, workers=1, io_threads=0, shard=None):
+    """
+        Update output_name.json in place, only the images (or txt files)
+        added, changed or removed since the last update patch their images
+        and annotations.
+    """
+    labelmap = LabelMap.load(labels_path)
+    path = select_shard(list_images(yolo_path), shard)
+    dependencies = partial(yolofile_dependencies, labels_path=labels_path)
+    read_sources = lambda changed: read_yolofiles(changed, workers, labelmap, io_threads)
+    converted, removed = update_cocojson(output_name + '.json', create_categories(labelmap), path, dependencies,
+                                         read_sources, output_name + MANIFEST_NAME % 'yolo2coco')
+    print("%d of %d files converted, %d images removed" % (converted, len(path), removed))
+
+def create_cocofromyolo(yolo_path, labels_path, output_name, workers=1, update=False, io_threads=0, shard=None):
+    output_name = shard_name(output_name, shard)
+    if update:
+        update_cocofromyolo(yolo_path, labels_path, output_name, workers, io_threads, shard)
+        return
+
     output_path = output_name + '.json'
-    coco_format['images'], coco_format['annotations'] = images_annotations_info(yolo_path)
-    classes = open(label_path).read().strip().split("\n")
-    for index, label in enumerate(classes):
-        ann = {
-            "supercategory": "detection_objects",
-            "id": index + 1,  # Index starts with '1' .
-            "name": label
-        }
-        coco_format['categories'].append(ann)
-
-    with open(output_path, 'w') as outfile:
-        json.dump(coco_format, outfile)
+    labelmap = LabelMap.load(labels_path)
+
+    # images and annotations are written out as each file is converted
+    with CocoJsonWriter(output_path, create_categories(labelmap)) as writer:
+        for image, boxes, annotation_id in iter_images_boxes(yolo_path, workers, labelmap, io_threads, shard):
+            writer.addImage(image)
+            writer.addBoxes(image['id'], annotation_id, boxes)
 
 def get_args():
     parser = argparse.ArgumentParser('Yolo annotations to COCO annotation converter helper')
     parser.add_argument('-p', '--path', type=str, required=True, help='(Absolute) path for folder containing image files and yolo annotated txt files')
     parser.add_argument('-l', '--labels', type=str, required=True ,help='(Absolute) path to file containing objection detection category names')
     parser.add_argument('-o', '--output', default="output", type=str, help='Name of the output json file')
+    parser.add_argument('--image-cache', type=str, help='Path to an image size cache file (created if missing), images are only read when not cached or changed')
+    parser.add_argument('-w', '--workers', default=1, type=int, help='Number of worker processes used for the conversion')
+    parser.add_argument('-t', '--io-threads', default=0, type=int, help='Read the image and txt files with N threads ahead of the conversion (for network storage)')
+    parser.add_argument('-u', '--update', action='store_true', help='Update the existing output json, only converting the files changed since the last update and keeping image ids stable')
+    parser.add_argument('--shard', type=parse_shard, help='Only convert shard i/N of the inputs (selected by a hash of the file name) to OUTPUT.shardIofN.json, merged with mergecoco.py')
+    instrument.add_arguments(parser)
 
     args = parser.parse_args()
     return args
@@ -127,9 +170,12 @@ def get_args():
 if __name__ == '__main__':
     start = time.time()
     opt = get_args()
+    if opt.image_cache:
+        set_image_cache(opt.image_cache)
     yolo_path = opt.path
     label_path = opt.labels
     output_name = opt.output
-    create_cocofromyolo(yolo_path, label_path, output_name)
-    print("YOLO annotation converted to COCO annotations in: " + output_name+".json")
+    with instrument.Run(opt):
+        create_cocofromyolo(yolo_path, label_path, output_name, opt.workers, opt.update, opt.io_threads, opt.shard)
+    print("YOLO annotation converted to COCO annotations in: " + shard_name(output_name, opt.shard)+".json")
     print("Conversion processed in " + str(float(time.time()-start)) + " seconds")
\ No newline at end of file
@@ -1,212 +1,175 @@
-import cv2
-import sys
 import os
 import argparse
-from xml.etree import ElementTree
-from xml.etree.ElementTree import Element, SubElement
-from lxml import etree
-import codecs
 import time
+import numpy as np
+from functools import partial
+from annotation_converter.imagesize import get_image_size, set_image_cache
+from annotation_converter.pascalvoc import PascalVocWriter
+from annotation_converter.parallel import parallel_map
+from annotation_converter.pipeline import pipeline_write
+from annotation_converter.manifest import Manifest, MANIFEST_NAME
+from annotation_converter.labelmap import LabelMap
+from annotation_converter.shard import parse_shard, in_shard, shard_name
+from annotation_converter.bbox import yolo_to_xyxy, yolo_clipped
+from annotation_converter.yololabels import parse_labels
+from annotation_converter.records import BoxList
+from annotation_converter.scan import scan, warn_orphans
+from annotation_converter import instrument
+from annotation_converter.instrument import stage, count
 
 TXT_EXT = '.txt'
 XML_EXT = '.xml'
 ENCODE_METHOD = 'utf-8'
 
-class PascalVocWriter:
-
-    def __init__(self, foldername, filename, imgSize,databaseSrc='detection_objects', localImgPath=None):
-        self.foldername = foldername
-        self.filename = filename
-        self.databaseSrc = databaseSrc
-        self.imgSize = imgSize
-        self.boxlist = []
-        self.localImgPath = localImgPath
-        self.verified = False
-
-    def prettify(self, elem):
-        """
-            Return a pretty-printed XML string for the Element.
-        """
-        rough_string = ElementTree.tostring(elem, 'utf8')
-        root = etree.fromstring(rough_string)
-        return etree.tostring(root, pretty_print=True, encoding=ENCODE_METHOD).replace("  ".encode(), "\t".encode())
-
-    def genXML(self):
-        """
-            Return XML root
-        """
-        # Check conditions
-        if self.filename is None or \
-                self.foldername is None or \
-                self.imgSize is None:
-            return None
-
-        top = Element('annotation')
-        if self.verified:
-            top.set('verified', 'yes')
-
-        folder = SubElement(top, 'folder')
-        folder.text = self.foldername
-
-        filename = SubElement(top, 'filename')
-        filename.text = self.filename
-
-        if self.localImgPath is not None:
-            localImgPath = SubElement(top, 'path')
-            localImgPath.text = self.localImgPath
-
-        source = SubElement(top, 'source')
-        database = SubElement(source, 'database')
-        database.text = self.databaseSrc
-
-        size_part = SubElement(top, 'size')
-        width = SubElement(size_part, 'width')
-        height = SubElement(size_part, 'height')
-        depth = SubElement(size_part, 'depth')
-        width.text = str(self.imgSize[1])
-        height.text = str(self.imgSize[0])
-        if len(self.imgSize) == 3:
-            depth.text = str(self.imgSize[2])
-        else:
-            depth.text = '1'
-
-        segmented = SubElement(top, 'segmented')
-        segmented.text = '0'
-        return top
-
-    def addBndBox(self, xmin, ymin, xmax, ymax, name, difficult):
-        bndbox = {'xmin': xmin, 'ymin': ymin, 'xmax': xmax, 'ymax': ymax}
-        bndbox['name'] = name
-        bndbox['difficult'] = difficult
-        self.boxlist.append(bndbox)
-
-    def appendObjects(self, top):
-        for each_object in self.boxlist:
-            object_item = SubElement(top, 'object')
-            name = SubElement(object_item, 'name')
-            name.text = each_object['name']
-            pose = SubElement(object_item, 'pose')
-            pose.text = "Unspecified"
-            truncated = SubElement(object_item, 'truncated')
-            if int(each_object['ymax']) == int(self.imgSize[0]) or (int(each_object['ymin'])== 1):
-                truncated.text = "1" # max == height or min
-            elif (int(each_object['xmax'])==int(self.imgSize[1])) or (int(each_object['xmin'])== 1):
-                truncated.text = "1" # max == width or min
-            else:
-                truncated.text = "0"
-            difficult = SubElement(object_item, 'difficult')
-            difficult.text = str( bool(each_object['difficult']) & 1 )
-            bndbox = SubElement(object_item, 'bndbox')
-            xmin = SubElement(bndbox, 'xmin')
-            xmin.text = str(each_object['xmin'])
-            ymin = SubElement(bndbox, 'ymin')
-            ymin.text = str(each_object['ymin'])
-            xmax = SubElement(bndbox, 'xmax')
-            xmax.text = str(each_object['xmax'])
-            ymax = SubElement(bndbox, 'ymax')
-            ymax.text = str(each_object['ymax'])
-
-    def save(self, targetFile=None):
-        root = self.genXML()
-        self.appendObjects(root)
-        out_file = None
-        if targetFile is None:
-            out_file = codecs.open(
-                self.filename + XML_EXT, 'w', encoding=ENCODE_METHOD)
-        else:
-            out_file = codecs.open(targetFile, 'w', encoding=ENCODE_METHOD)
-
-        prettifyResult = self.prettify(root)
-        out_file.write(prettifyResult.decode('utf8'))
-        out_file.close()
+def read_lines(filepath):
+    with stage('read'):
+        bndBoxFile = open(filepath, 'r')
+        lines = bndBoxFile.readlines()
+        bndBoxFile.close()
+    count('bytes_read', sum(len(line) for line in lines))
+    return lines
 
 class YoloReader:
-
-    def __init__(self, filepath, image, classListPath):
-        # shapes type:
-        # [labbel, [(x1,y1), (x2,y2), (x3,y3), (x4,y4)], color, color, difficult]
-        self.shapes = []
+    """
+        Read a YOLO txt file into arrays, as PascalVocReader:
+            labels    list of N label names
+            boxes     N x 4 float array of xmin, ymin, xmax, ymax
+            difficult N bool array
+            integral  N x 4 bool array, the coordinates clipped to the image
+    """
+
+    def __init__(self, filepath, imgSize, labelmap, lines=None):
+        self.labels = []
+        self.boxes = None
+        self.difficult = None
+        self.integral = None
         self.filepath = filepath
-        self.classListPath = classListPath
+        self.labelmap = labelmap
+        # Content of the file when it has already been read
+        self.lines = lines
 
-        classesFile = open(self.classListPath, 'r')
-        self.classes = classesFile.read().strip('\n').split('\n')
-
-        imgSize = image.shape
         self.imgSize = imgSize
         self.verified = False
         self.parseYoloFormat()
 
     def getShapes(self):
-        return self.shapes
-
-    def addShape(self, label, xmin, ymin, xmax, ymax, difficult):
+        """
+            Return the boxes as [label, [(x1,y1), (x2,y2), (x3,y3), (x4,y4)], color, color, difficult]
+        """
+        shapes = []
+        for xmin, ymin, xmax, ymax, label, difficult in self.boxList():
+            points = [(xmin, ymin), (xmax, ymin), (xmax, ymax), (xmin, ymax)]
+            shapes.append((label, points, None, None, difficult))
+        return shapes
 
-        points = [(xmin, ymin), (xmax, ymin), (xmax, ymax), (xmin, ymax)]
-        self.shapes.append((label, points, None, None, difficult))
+    def boxList(self):
+        boxlist = BoxList()
+        boxlist.extend(self.boxes, self.labels, self.difficult, self.integral)
+        return boxlist
 
     def getLabel(self, classIndex):
-        label = self.classes[int(classIndex)]
+        label = self.labelmap.getName(classIndex)
         return label
 
-    def yoloLine2Shape(self, classIndex, xcen, ycen, w, h):
-        label = self.classes[int(classIndex)]
-
-        xmin = max(float(xcen) - float(w) / 2, 0)
-        xmax = min(float(xcen) + float(w) / 2, 1)
-        ymin = max(float(ycen) - float(h) / 2, 0)
-        ymax = min(float(ycen) + float(h) / 2, 1)
-
-        xmin = round((self.imgSize[1] * xmin),2)
-        xmax = round((self.imgSize[1] * xmax),2)
-        ymin = round((self.imgSize[0] * ymin),2)
-        ymax = round((self.imgSize[0] * ymax),2)
-
-        return label, xmin, ymin, xmax, ymax
-
     def parseYoloFormat(self):
-        bndBoxFile = open(self.filepath, 'r')
-        for bndBox in bndBoxFile:
-            classIndex, xcen, ycen, w, h = bndBox.split(' ')
-            label, xmin, ymin, xmax, ymax = self.yoloLine2Shape(classIndex, xcen, ycen, w, h)
-
-            self.addShape(label, xmin, ymin, xmax, ymax, False)
-
-def create_pascalfromyolo(yolo_path, label_path, output_directory):
+        lines = self.lines
+        if lines is None:
+            lines = read_lines(self.filepath)
+
+        with stage('parse'):
+            classes, boxes, _ = parse_labels("".join(lines), self.filepath)
+        count('boxes', len(classes))
+
+        with stage('convert'):
+            self.boxes = yolo_to_xyxy(boxes, self.imgSize[1], self.imgSize[0])
+            # Coordinates clipped to the border are integers, as in the scalar version
+            self.integral = yolo_clipped(boxes)
+
+        self.labels = self.labelmap.getNames(classes)
+        self.difficult = np.zeros(len(self.labels), dtype=bool)
+
+def yolofile_writer(sample, yolo_path, labelmap, imgSize, lines=None):
+    """
+        Return the PascalVocWriter of the YOLO txt file of a scan.Sample,
+        lines being the content of the file when it has already been read.
+    """
+    imagePath = os.path.join(yolo_path, sample.image)
+
+    imgFolderName = os.path.basename(yolo_path)
+    imgFileName = os.path.basename(imagePath)
+
+    writer = PascalVocWriter(imgFolderName, imgFileName, imgSize, localImgPath=imagePath)
+
+    txtPath = yolo_path + "/" + sample.label
+    YoloParseReader = YoloReader(txtPath, imgSize, labelmap, lines)
+    writer.addBndBoxes(YoloParseReader.boxes, YoloParseReader.labels, None, YoloParseReader.integral)
+
+    return writer
+
+def convert_yolofile(sample, yolo_path, labelmap, output_directory):
+    imgSize = get_image_size(os.path.join(yolo_path, sample.image))
+    writer = yolofile_writer(sample, yolo_path, labelmap, imgSize)
+    writer.save(targetFile= output_directory+ "/" + sample.key + ".xml")
+
+def read_yolofile(sample, yolo_path):
+    """
+        The I/O of convert_yolofile (image size and txt file) for the
+        pipelined mode.
+    """
+    imgSize = get_image_size(os.path.join(yolo_path, sample.image))
+    return sample, imgSize, read_lines(yolo_path + "/" + sample.label)
+
+def compute_yolofile(read_result, yolo_path, labelmap, output_directory):
+    """
+        Return (xml path, xml content) from the result of read_yolofile.
+    """
+    sample, imgSize, lines = read_result
+    writer = yolofile_writer(sample, yolo_path, labelmap, imgSize, lines)
+    return output_directory + "/" + sample.key + ".xml", writer.toBytes()
+
+def yolofile_dependencies(sample, yolo_path, label_path, output_directory):
+    return {'key': sample.label,
+            'inputs': [yolo_path + "/" + sample.label, label_path],
+            'images': [os.path.join(yolo_path, sample.image)],
+            'outputs': [output_directory + "/" + sample.key + ".xml"]}
+
+def create_pascalfromyolo(yolo_path, label_path, output_directory, workers=1, incremental=False, io_threads=0, shard=None):
     os.makedirs(output_directory, exist_ok=True)
 
-    for file in os.listdir(yolo_path):
-        if file.endswith(".txt"):
-            annotation_no_txt = os.path.splitext(file)[0]
-            imagePath = os.path.join(yolo_path, annotation_no_txt + ".jpg")
-
-            image = cv2.imread(imagePath)
-            imgFolderName = os.path.basename(yolo_path)
-            imgFileName = os.path.basename(imagePath)
-
-            writer = PascalVocWriter(imgFolderName, imgFileName, image.shape, localImgPath=imagePath)
-
-            txtPath = yolo_path + "/" + file
-            YoloParseReader = YoloReader(txtPath, image, label_path)
-            shapes = YoloParseReader.getShapes()
-            num_of_box = len(shapes)
-
-            for i in range(num_of_box):
-                label = shapes[i][0]
-                xmin = shapes[i][1][0][0]
-                ymin = shapes[i][1][0][1]
-                x_max = shapes[i][1][2][0]
-                y_max = shapes[i][1][2][1]
-
-                writer.addBndBox(xmin, ymin, x_max, y_max, label, 0)
-
-            writer.save(targetFile= output_directory+ "/" + annotation_no_txt + ".xml")
+    index = scan(yolo_path, ('image', 'label'))
+    warn_orphans(index.orphans('label', 'image'), "txt files have no image")
+    warn_orphans(index.duplicates, "images have the name of another image")
+    files = [sample for sample in index.ordered('label', required=('image',)) if in_shard(sample.label, shard)]
+    labelmap = LabelMap.load(label_path)
+    if io_threads:
+        # Reads, conversion and writes of different files overlap
+        read = partial(read_yolofile, yolo_path=yolo_path)
+        compute = partial(compute_yolofile, yolo_path=yolo_path, labelmap=labelmap, output_directory=output_directory)
+        convert_all = partial(pipeline_write, read, compute, workers=workers, threads=io_threads)
+    else:
+        convert = partial(convert_yolofile, yolo_path=yolo_path, labelmap=labelmap, output_directory=output_directory)
+        convert_all = partial(parallel_map, convert, workers=workers)
+    if not incremental:
+        convert_all(files)
+        return
+
+    # Only convert the txt files changed since the last run
+    manifest = Manifest(os.path.join(output_directory, MANIFEST_NAME % shard_name('yolo2pascal', shard)))
+    dependencies = partial(yolofile_dependencies, yolo_path=yolo_path, label_path=label_path, output_directory=output_directory)
+    converted, removed = manifest.convertChanged(files, dependencies, convert_all)
+    print("%d of %d files converted, %d removed" % (converted, len(files), len(removed)))
 
 def get_args():
     parser = argparse.ArgumentParser('Yolo annotations to ParscalVOC annotation converter helper')
     parser.add_argument('-p', '--path', type=str, required=True, help='(Absolute) path for folder containing image files and yolo annotated txt files')
     parser.add_argument('-l', '--labels', type=str, required=True ,help='(Absolute) path to file containing objection detection category names')
     parser.add_argument('-o', '--output', default="pascal", type=str, help='Name of the directory to store PascalVOC VML files')
+    parser.add_argument('--image-cache', type=str, help='Path to an image size cache file (created if missing), images are only read when not cached or changed')
+    parser.add_argument('-w', '--workers', default=1, type=int, help='Number of worker processes used for the conversion')
+    parser.add_argument('-t', '--io-threads', default=0, type=int, help='Pipeline the conversion with N threads reading and N threads writing files ahead of/behind the conversion (for network storage)')
+    parser.add_argument('-i', '--incremental', action='store_true', help='Only convert the files changed since the last incremental run and remove the outputs of deleted files')
+    parser.add_argument('--shard', type=parse_shard, help='Only convert shard i/N of the inputs (selected by a hash of the file name), for distributing a conversion over N jobs')
+    instrument.add_arguments(parser)
 
     args = parser.parse_args()
     return args
@@ -214,9 +177,12 @@ def get_args():
 if __name__ == '__main__':
     start = time.time()
     opt = get_args()
+    if opt.image_cache:
+        set_image_cache(opt.image_cache)
     yolo_path = opt.path
     label_path = opt.labels
     output_directory = opt.output
-    create_pascalfromyolo(yolo_path, label_path, output_directory)
+    with instrument.Run(opt):
+        create_pascalfromyolo(yolo_path, label_path, output_directory, opt.workers, opt.incremental, opt.io_threads, opt.shard)
     print("YOLO annotation converted to PascalVOC annotations in: " + output_directory+" folder")
     print("Conversion processed in " + str(float(time.time()-start)) + " seconds")
\ No newline at end of file